@@ -0,0 +1,12 @@
+"""
+URL configuration for the ASGI service.
+
+Only the async views are routed here: sync DRF views would run on the one
+thread each ASGI worker keeps for sync code, so they are served by the WSGI
+deployment instead.
+"""
+from django.urls import path, include
+
+urlpatterns = [
+    path('api/', include('user.async_urls')),
+]
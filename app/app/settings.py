@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import json
 import os
 from pathlib import Path
 
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,7 +59,9 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'app.urls'
+# The ASGI service sets DJANGO_ROOT_URLCONF=app.asgi_urls to serve only the
+# async views; everything else is served under WSGI.
+ROOT_URLCONF = os.environ.get('DJANGO_ROOT_URLCONF', 'app.urls')
 
 TEMPLATES = [
     {
@@ -81,16 +85,65 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connections are kept for DB_CONN_MAX_AGE seconds and checked before reuse.
+# Under ASGI, set DB_CONN_MAX_AGE=0 and pool with PgBouncer instead. When
+# PgBouncer runs in transaction mode, set DB_PGBOUNCER_TRANSACTION_MODE=true
+# to disable server-side cursors, which do not survive across transactions.
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
+        'PORT': os.environ.get('DB_PORT', ''),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
-        'PASSWORD': os.environ.get('DB_PASS')
+        'PASSWORD': os.environ.get('DB_PASS'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get(
+            'DB_CONN_HEALTH_CHECKS', 'true'
+        ).lower() == 'true',
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get(
+            'DB_PGBOUNCER_TRANSACTION_MODE', 'false'
+        ).lower() == 'true',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+        },
     }
 }
 
+# DB_ENGINE=sqlite runs against a local SQLite file instead, e.g. for
+# benchmarks and development without Postgres.
+
+if os.environ.get('DB_ENGINE') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME') or BASE_DIR / 'db.sqlite3',
+        }
+    }
+
+# Read replicas, as a comma separated list of hosts sharing the primary's
+# credentials. Safe reads on the views using user.views.ReplicaReadMixin go
+# to a replica, except reads of resources written within REPLICA_PIN_SECONDS.
+# Those pins are kept in the REPLICA_PIN_CACHE_ALIAS cache, which must be
+# shared by every process (e.g. Redis) when replicas are configured.
+
+DATABASE_REPLICAS = []
+for _index, _host in enumerate(
+    host for host in os.environ.get('DB_REPLICA_HOSTS', '').split(',')
+    if host
+):
+    DATABASES[f'replica_{_index}'] = {
+        **DATABASES['default'],
+        'HOST': _host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{_index}')
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+REPLICA_PIN_CACHE_ALIAS = os.environ.get('REPLICA_PIN_CACHE_ALIAS', 'default')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -111,6 +164,69 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing
+# PASSWORD_HASHER picks the hasher for new hashes; the others stay listed so
+# existing hashes verify and are upgraded on the next login. 'argon2' needs
+# the argon2-cffi package. Compare costs with `manage.py benchmark_hashers`.
+
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'pbkdf2')
+
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'core.hashers.TunedPBKDF2PasswordHasher',
+    'scrypt': 'core.hashers.TunedScryptPasswordHasher',
+    'argon2': 'core.hashers.TunedArgon2PasswordHasher',
+}
+
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items()
+    if name != PASSWORD_HASHER
+]
+
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 600000)
+)
+PASSWORD_SCRYPT_WORK_FACTOR = int(
+    os.environ.get('PASSWORD_SCRYPT_WORK_FACTOR', 2 ** 14)
+)
+PASSWORD_ARGON2_TIME_COST = int(
+    os.environ.get('PASSWORD_ARGON2_TIME_COST', 2)
+)
+PASSWORD_ARGON2_MEMORY_COST = int(
+    os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 102400)
+)
+PASSWORD_ARGON2_PARALLELISM = int(
+    os.environ.get('PASSWORD_ARGON2_PARALLELISM', 8)
+)
+
+# Where hashing runs: 'inline' in the request worker, or on a bounded
+# 'thread' or 'process' pool. Requests beyond MAX_PENDING queued hashes,
+# or whose hash is not done within TIMEOUT seconds, get a 503 with
+# Retry-After instead of tying up more workers.
+
+PASSWORD_HASHING_MODE = os.environ.get('PASSWORD_HASHING_MODE', 'inline')
+PASSWORD_HASHING_WORKERS = int(
+    os.environ.get('PASSWORD_HASHING_WORKERS', os.cpu_count() or 1)
+)
+PASSWORD_HASHING_MAX_PENDING = int(
+    os.environ.get('PASSWORD_HASHING_MAX_PENDING', 4 * PASSWORD_HASHING_WORKERS)
+)
+PASSWORD_HASHING_TIMEOUT = float(
+    os.environ.get('PASSWORD_HASHING_TIMEOUT', 10)
+)
+
+# Bulk imports hash on their own PASSWORD_HASHING_BATCH_WORKERS, so logins do
+# not queue behind them. A request to the bulk endpoint gets a 503 when its
+# hashes take longer than PASSWORD_HASHING_BATCH_TIMEOUT seconds, which should
+# stay below the gunicorn worker timeout.
+
+PASSWORD_HASHING_BATCH_WORKERS = int(os.environ.get(
+    'PASSWORD_HASHING_BATCH_WORKERS', max(1, PASSWORD_HASHING_WORKERS // 2)
+))
+PASSWORD_HASHING_BATCH_TIMEOUT = float(
+    os.environ.get('PASSWORD_HASHING_BATCH_TIMEOUT', 25)
+)
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
 
@@ -135,6 +251,108 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'core.User'
 
+AUTHENTICATION_BACKENDS = ['core.backends.EmailOrUsernameBackend']
+
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'user.pagination.IdCursorPagination',
+    'EXCEPTION_HANDLER': 'user.exceptions.exception_handler',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 100)),
 }
+
+# Authorization cache
+# Per-process cache of each user's permission bits and of the permission
+# name index. Writes invalidate it in the process that made them; other
+# processes converge within the TTL.
+
+PERMISSION_CACHE_MAX_SIZE = int(
+    os.environ.get('PERMISSION_CACHE_MAX_SIZE', 10000)
+)
+PERMISSION_CACHE_TTL = int(os.environ.get('PERMISSION_CACHE_TTL', 60))
+
+# Token authentication cache
+# Token to user lookups are kept for TOKEN_CACHE_TTL seconds in the shared
+# cache from CACHES (e.g. Redis) named by TOKEN_CACHE_ALIAS. Without one they
+# are kept per process for TOKEN_CACHE_LOCAL_TTL seconds, which bounds how
+# long other processes accept a deleted token or a deactivated user.
+
+TOKEN_CACHE_MAX_SIZE = int(os.environ.get('TOKEN_CACHE_MAX_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 300))
+TOKEN_CACHE_LOCAL_TTL = int(os.environ.get('TOKEN_CACHE_LOCAL_TTL', 5))
+TOKEN_CACHE_ALIAS = os.environ.get('TOKEN_CACHE_ALIAS') or None
+
+# Login token mode: 'db' issues rest_framework.authtoken tokens, 'signed'
+# issues short-lived HMAC-signed access tokens plus refresh tokens that can
+# be verified without the database using SIGNED_TOKEN_SECRET.
+# SIGNED_TOKEN_PERMISSION_BITS carries permissions as a bitmap indexed by
+# Permission.bit instead of a list of names, keeping tokens small.
+
+AUTH_TOKEN_MODE = os.environ.get('AUTH_TOKEN_MODE', 'db')
+SIGNED_TOKEN_SECRET = os.environ.get('SIGNED_TOKEN_SECRET') or SECRET_KEY
+SIGNED_TOKEN_ACCESS_TTL = int(os.environ.get('SIGNED_TOKEN_ACCESS_TTL', 300))
+SIGNED_TOKEN_REFRESH_TTL = int(
+    os.environ.get('SIGNED_TOKEN_REFRESH_TTL', 86400)
+)
+SIGNED_TOKEN_PERMISSION_BITS = os.environ.get(
+    'SIGNED_TOKEN_PERMISSION_BITS', 'false'
+).lower() == 'true'
+
+# Permission bits
+# New permissions take the lowest free bit, keeping bitmaps as small as the
+# number of permissions. The bit of a deleted permission is reused only after
+# PERMISSION_BIT_REUSE_DELAY seconds, once cached permission bits and signed
+# access tokens from before the delete have expired.
+
+PERMISSION_BIT_REUSE_DELAY = int(os.environ.get(
+    'PERMISSION_BIT_REUSE_DELAY',
+    max(PERMISSION_CACHE_TTL, SIGNED_TOKEN_ACCESS_TTL),
+))
+
+# Role permissions required per view action, enforced by
+# user.permissions.HasRolePermission, e.g.
+# {"RoleViewSet": {"create": "roles.write", "*": "roles.read"}}
+
+REQUIRED_ROLE_PERMISSIONS = json.loads(
+    os.environ.get('REQUIRED_ROLE_PERMISSIONS', '{}')
+)
+
+# Batch authorization checks: maximum checks per request, and the batch size
+# above which results are streamed, resolving that many checks at a time,
+# instead of rendered in one response. Streamed checks are resolved after the
+# view returns, so request metrics do not cover them, and a database error
+# mid-stream ends the JSON document with an "error" member.
+
+AUTHORIZATION_BATCH_MAX_SIZE = int(
+    os.environ.get('AUTHORIZATION_BATCH_MAX_SIZE', 10000)
+)
+AUTHORIZATION_BATCH_STREAM_THRESHOLD = int(
+    os.environ.get('AUTHORIZATION_BATCH_STREAM_THRESHOLD', 1000)
+)
+
+# Bulk user provisioning: records per transaction, and the most records
+# accepted by one request to the bulk endpoint.
+
+PROVISIONING_CHUNK_SIZE = int(os.environ.get('PROVISIONING_CHUNK_SIZE', 1000))
+PROVISIONING_MAX_BATCH_SIZE = int(
+    os.environ.get('PROVISIONING_MAX_BATCH_SIZE', 1000)
+)
+
+# Bulk role assignment: most user ids accepted by one request.
+
+ROLE_ASSIGNMENT_MAX_USERS = int(
+    os.environ.get('ROLE_ASSIGNMENT_MAX_USERS', 50000)
+)
+
+# Request metrics served at /metrics/, which is denied unless METRICS_TOKEN
+# is set and sent as "Authorization: Bearer <token>". Each process adds its
+# totals to the METRICS_CACHE_ALIAS cache every METRICS_FLUSH_INTERVAL
+# seconds; it must be shared by every process (e.g. Redis) for a scrape to
+# cover them all. METRICS_SERVER_TIMING adds Server-Timing headers to
+# responses.
+
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+METRICS_CACHE_ALIAS = os.environ.get('METRICS_CACHE_ALIAS', 'default')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_SERVER_TIMING = os.environ.get(
+    'METRICS_SERVER_TIMING', 'false'
+).lower() == 'true'
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.core import checks
+        from django.db.backends.signals import connection_created
+
+        from core import signals  # noqa: F401
+        from core.metrics import check_metrics_cache, install_query_recorder
+        from core.routers import check_pin_cache
+
+        checks.register(check_pin_cache, checks.Tags.caches)
+        checks.register(check_metrics_cache, checks.Tags.caches, deploy=True)
+        connection_created.connect(
+            install_query_recorder, dispatch_uid='core.install_query_recorder',
+        )
@@ -0,0 +1,66 @@
+"""
+Bulk role assignment.
+"""
+from django.db import transaction
+
+from core.authorization import refresh_effective_permissions
+from core.models import UserRole
+
+
+def assign_roles(users, grant=(), revoke=()):
+    """Grant and revoke roles for every user in a queryset.
+
+    ``grant`` and ``revoke`` are role ids. Changes are applied as a diff
+    with bulk inserts and deletes on the membership table in one
+    transaction, so a user's other roles are left alone. Returns a summary
+    with the number of users matched and memberships granted and revoked.
+    """
+    grant, revoke = set(grant), set(revoke)
+    if grant & revoke:
+        raise ValueError('Cannot grant and revoke the same role.')
+    through = UserRole.roles.through
+
+    with transaction.atomic():
+        user_ids = set(users.values_list('pk', flat=True))
+        if grant:
+            UserRole.objects.bulk_create(
+                [UserRole(user_id=user_id) for user_id in user_ids],
+                ignore_conflicts=True,
+            )
+        user_roles = dict(
+            UserRole.objects.filter(user_id__in=user_ids)
+            .values_list('pk', 'user_id')
+        )
+        memberships = through.objects.filter(userrole_id__in=user_roles)
+
+        changed = set()
+        revoked = 0
+        if revoke:
+            stale = memberships.filter(role_id__in=revoke)
+            changed.update(
+                user_roles[pk]
+                for pk in stale.values_list('userrole_id', flat=True)
+            )
+            revoked = stale.delete()[0]
+
+        granted = 0
+        if grant:
+            existing = set(
+                memberships.filter(role_id__in=grant)
+                .values_list('userrole_id', 'role_id')
+            )
+            missing = [
+                through(userrole_id=user_role_id, role_id=role_id)
+                for user_role_id in user_roles
+                for role_id in grant
+                if (user_role_id, role_id) not in existing
+            ]
+            through.objects.bulk_create(missing, batch_size=5000)
+            changed.update(
+                user_roles[member.userrole_id] for member in missing
+            )
+            granted = len(missing)
+
+        refresh_effective_permissions(changed)
+
+    return {'users': len(user_ids), 'granted': granted, 'revoked': revoked}
@@ -0,0 +1,255 @@
+"""
+Effective permission index for users.
+"""
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import BinaryField, Case, F, Q, Value, When
+from django.utils import timezone
+
+from core.bitsets import PermissionSet
+from core.cache import permission_cache, permission_index_cache
+from core.hierarchy import role_descendants
+from core.models import (
+    EffectivePermission,
+    Permission,
+    Role,
+    User,
+    UserRole,
+)
+
+# Rows written per permission bits UPDATE.
+PERMISSION_BITS_BATCH_SIZE = 1000
+
+
+def users_holding_roles(role_ids):
+    """Return the ids of users holding or inheriting any of the roles."""
+    role_ids = set(role_ids)
+    role_ids |= role_descendants(role_ids)
+    return set(
+        UserRole.objects.filter(roles__in=role_ids)
+        .values_list('user_id', flat=True)
+    )
+
+
+def bump_versions(queryset):
+    """Mark roles or user roles as changed, for conditional reads."""
+    return queryset.update(
+        version=F('version') + 1,
+        modified_at=timezone.now(),
+    )
+
+
+def _permission_sets(keys, granted):
+    """Group (key, permission bit) pairs into a PermissionSet per key."""
+    bits = defaultdict(list)
+    for key, bit in granted:
+        bits[key].append(bit)
+    return {key: PermissionSet.from_positions(bits[key]) for key in keys}
+
+
+def store_permission_bits(queryset, key, sets, **values):
+    """Write the permission bits of many rows with one UPDATE per batch.
+
+    ``sets`` maps values of the ``key`` field to PermissionSets; extra
+    ``values`` are applied to the same rows. Batches hold at most
+    PERMISSION_BITS_BATCH_SIZE rows, since every row evaluates the CASE
+    arm by arm, and rows sharing a set share an arm.
+    """
+    keys = list(sets)
+    batch_size = min(
+        PERMISSION_BITS_BATCH_SIZE,
+        connection.ops.bulk_batch_size([key, key, 'permission_bits'], keys),
+    )
+    for start in range(0, len(keys), batch_size):
+        batch = keys[start:start + batch_size]
+        keys_by_bits = defaultdict(list)
+        for item in batch:
+            keys_by_bits[sets[item].to_bytes()].append(item)
+        queryset.filter(**{f'{key}__in': batch}).update(
+            permission_bits=Case(
+                *[
+                    When(**{f'{key}__in': items}, then=Value(bits))
+                    for bits, items in keys_by_bits.items()
+                ],
+                default=Value(b''),
+                output_field=BinaryField(),
+            ),
+            **values,
+        )
+
+
+def refresh_role_permission_bits(role_ids):
+    """Recompute the permission bits of roles and the roles inheriting
+    from them."""
+    role_ids = set(role_ids)
+    role_ids |= role_descendants(role_ids)
+    if not role_ids:
+        return
+
+    inherited = 'role__descendant_links__descendant_id'
+    granted = set()
+    for role_id, descendant_id, bit in (
+        Role.permissions.through.objects.filter(
+            Q(role_id__in=role_ids) | Q(**{f'{inherited}__in': role_ids})
+        ).values_list('role_id', inherited, 'permission__bit')
+    ):
+        if role_id in role_ids:
+            granted.add((role_id, bit))
+        if descendant_id in role_ids:
+            granted.add((descendant_id, bit))
+    store_permission_bits(
+        Role.objects, 'pk', _permission_sets(role_ids, granted),
+    )
+
+
+def refresh_effective_permissions(user_ids):
+    """Recompute the effective permissions of the given users."""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+
+    grants = Role.permissions.through.objects
+    held = set(
+        grants.filter(role__userrole__user_id__in=user_ids)
+        .values_list('role__userrole__user_id', 'permission_id',
+                     'permission__bit')
+    )
+    inherited = 'role__descendant_links__descendant__userrole__user_id'
+    held |= set(
+        grants.filter(**{f'{inherited}__in': user_ids})
+        .values_list(inherited, 'permission_id', 'permission__bit')
+    )
+    granted = {(user_id, permission_id) for user_id, permission_id, _ in held}
+    current = {
+        (user_id, permission_id): pk
+        for pk, user_id, permission_id in
+        EffectivePermission.objects.filter(user_id__in=user_ids)
+        .values_list('pk', 'user_id', 'permission_id')
+    }
+
+    stale = [pk for key, pk in current.items() if key not in granted]
+    missing = [
+        EffectivePermission(user_id=user_id, permission_id=permission_id)
+        for user_id, permission_id in granted - current.keys()
+    ]
+
+    with transaction.atomic():
+        store_permission_bits(
+            UserRole.objects,
+            'user_id',
+            _permission_sets(
+                user_ids, ((user_id, bit) for user_id, _, bit in held),
+            ),
+            version=F('version') + 1,
+            modified_at=timezone.now(),
+        )
+        if stale:
+            EffectivePermission.objects.filter(pk__in=stale).delete()
+        if missing:
+            EffectivePermission.objects.bulk_create(
+                missing,
+                ignore_conflicts=True,
+            )
+
+    # Drop cached sets now and again on commit, in case a concurrent read
+    # cached the old set before this transaction became visible.
+    permission_cache.delete_many(user_ids)
+    transaction.on_commit(lambda: permission_cache.delete_many(user_ids))
+
+
+def effective_permissions(user_id):
+    """Return the permissions granted to a user through their roles."""
+    return Permission.objects.filter(
+        effective_grants__user_id=user_id,
+    ).order_by('id')
+
+
+def permission_index():
+    """Return the bit of every permission by name, cached."""
+    index = permission_index_cache.get('names')
+    if index is None:
+        index = dict(Permission.objects.values_list('name', 'bit'))
+        permission_index_cache.set('names', index)
+    return index
+
+
+def permission_set(names):
+    """Return the PermissionSet of the named permissions.
+
+    Returns None when a name is not a known permission, since no set can
+    hold it.
+    """
+    index = permission_index()
+    try:
+        return PermissionSet.from_positions(index[name] for name in names)
+    except KeyError:
+        return None
+
+
+def permission_names(permissions):
+    """Return the names of the permissions in a PermissionSet."""
+    return frozenset(
+        name for name, bit in permission_index().items()
+        if bit in permissions
+    )
+
+
+def user_permission_set(user_id):
+    """Return the PermissionSet a user holds, cached."""
+    permissions = permission_cache.get(user_id)
+    if permissions is None:
+        permissions = PermissionSet.from_bytes(
+            UserRole.objects.filter(user_id=user_id)
+            .values_list('permission_bits', flat=True)
+            .first()
+        )
+        permission_cache.set(user_id, permissions)
+    return permissions
+
+
+def user_permission_names(user_id):
+    """Return the names of the permissions a user holds."""
+    return permission_names(user_permission_set(user_id))
+
+
+def user_has_permissions(user_id, names):
+    """Return whether a user holds every named permission."""
+    required = permission_set(names)
+    return required is not None and required <= user_permission_set(user_id)
+
+
+def user_has_permission(user_id, name):
+    """Return whether a user holds the named permission."""
+    return user_has_permissions(user_id, [name])
+
+
+def check_permissions(checks):
+    """Answer many (user id, permission name) checks with two queries.
+
+    Returns a list of booleans in the order of ``checks``.
+    """
+    checks = list(checks)
+    user_ids = {user_id for user_id, _ in checks}
+    names = {name for _, name in checks}
+
+    users = {
+        pk: (is_active, is_superuser)
+        for pk, is_active, is_superuser in
+        User.objects.filter(pk__in=user_ids)
+        .values_list('pk', 'is_active', 'is_superuser')
+    }
+    granted = set(
+        EffectivePermission.objects.filter(
+            user_id__in=user_ids,
+            permission__name__in=names,
+        ).values_list('user_id', 'permission__name')
+    )
+
+    results = []
+    for user_id, name in checks:
+        is_active, is_superuser = users.get(user_id, (False, False))
+        results.append(is_active and (
+            is_superuser or (user_id, name) in granted
+        ))
+    return results
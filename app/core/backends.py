@@ -0,0 +1,58 @@
+"""
+Authentication backends.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Case, Q, When
+
+from core.hashing import hash_password, verify_password
+
+
+class EmailOrUsernameBackend(ModelBackend):
+    """Authenticate with either an email address or a username, resolving
+    the user with one query."""
+
+    def get_user_by_login(self, login):
+        """Return the user whose email or username matches login.
+
+        Email matches come before username matches and exact matches
+        before case-insensitive ones; the first of those tiers with any
+        match decides, and a tier matching several users matches none.
+        """
+        candidates = list(
+            get_user_model()._default_manager.filter(
+                Q(email__iexact=login) | Q(username__iexact=login)
+            ).order_by(
+                Case(When(email__iexact=login, then=0), default=1), 'pk',
+            )[:5]
+        )
+        for matches in (
+            lambda user: user.email == login,
+            lambda user: user.username == login,
+            lambda user: user.email.lower() == login.lower(),
+            lambda user: user.username.lower() == login.lower(),
+        ):
+            tier = [user for user in candidates if matches(user)]
+            if tier:
+                return tier[0] if len(tier) == 1 else None
+        return None
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        user = self.get_user_by_login(username)
+        if user is None:
+            # Run the default password hasher once to reduce the timing
+            # difference between an existing and a nonexistent user.
+            hash_password(password)
+            return None
+        if (
+            verify_password(user, password)
+            and self.user_can_authenticate(user)
+        ):
+            return user
+        return None
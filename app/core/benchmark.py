@@ -0,0 +1,153 @@
+"""
+Helpers for the benchmark management commands.
+"""
+import json
+import random
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import (
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from core.authorization import (
+    refresh_effective_permissions,
+    refresh_role_permission_bits,
+)
+from core.cache import permission_index_cache
+from core.models import Permission, Role, UserRole
+
+
+def percentile(samples, fraction):
+    """Return the sample at the given fraction of the sorted samples."""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Return latency statistics, in milliseconds, for timing samples."""
+    return {
+        'count': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000,
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+    }
+
+
+def time_calls(func, rounds):
+    """Call func rounds times and return the duration of each call."""
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def write_results(stdout, results, as_json):
+    """Write results as JSON or as one aligned line per result."""
+    if as_json:
+        stdout.write(json.dumps(results, indent=2))
+        return
+    for result in results:
+        stdout.write('  '.join(
+            f'{key}={value:.2f}' if isinstance(value, float)
+            else f'{key}={value}'
+            for key, value in result.items()
+        ))
+
+
+@contextmanager
+def benchmark_database():
+    """Run the block against a throwaway test database."""
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(
+        verbosity=0,
+        autoclobber=True,
+        serialize=False,
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+class Population:
+    """Users, roles and permissions created by seed_population."""
+
+    def __init__(self, permissions, roles, users, user_roles):
+        self.permissions = permissions
+        self.roles = roles
+        self.users = users
+        self.user_roles = user_roles
+
+    @property
+    def size(self):
+        return len(self.users)
+
+    @property
+    def user(self):
+        return self.users[0]
+
+    @property
+    def role(self):
+        return self.roles[0]
+
+
+def seed_population(users, roles, permissions, roles_per_user,
+                    permissions_per_role, password='benchmark-password',
+                    seed=0, prefix=''):
+    """Create users holding random roles with random permissions.
+
+    Every user shares one password hash so seeding large populations does
+    not spend its time hashing; pass ``password=None`` to skip hashing
+    altogether. Names start with ``prefix``, so several populations can
+    share a database. Returns the created Population.
+    """
+    rng = random.Random(seed)
+    permission_objs = Permission.objects.bulk_create(
+        Permission(name=f'{prefix}permission-{i}', bit=bit)
+        for i, bit in enumerate(Permission.objects.free_bits(permissions))
+    )
+    role_objs = Role.objects.bulk_create(
+        Role(name=f'{prefix}role-{i}') for i in range(roles)
+    )
+    Role.permissions.through.objects.bulk_create(
+        Role.permissions.through(role=role, permission=permission)
+        for role in role_objs
+        for permission in rng.sample(
+            permission_objs, min(permissions_per_role, permissions),
+        )
+    )
+
+    encoded = make_password(password)
+    user_objs = get_user_model().objects.bulk_create(
+        get_user_model()(
+            username=f'{prefix}user-{i}',
+            email=f'{prefix}user-{i}@example.com',
+            password=encoded,
+        )
+        for i in range(users)
+    )
+    user_roles = UserRole.objects.bulk_create(
+        UserRole(user=user) for user in user_objs
+    )
+    UserRole.roles.through.objects.bulk_create(
+        UserRole.roles.through(userrole=user_role, role=role)
+        for user_role in user_roles
+        for role in rng.sample(role_objs, min(roles_per_user, roles))
+    )
+    # Bulk inserts skip the signals that keep the name index fresh.
+    permission_index_cache.clear()
+    refresh_role_permission_bits(role.pk for role in role_objs)
+    refresh_effective_permissions(user.pk for user in user_objs)
+    return Population(permission_objs, role_objs, user_objs, user_roles)
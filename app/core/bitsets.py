@@ -0,0 +1,103 @@
+"""
+Compact permission sets, stored as bitmaps indexed by permission bit.
+"""
+import base64
+
+
+class PermissionSet:
+    """Immutable set of permissions held as the bits of an integer.
+
+    Bit ``n`` is set when the permission whose ``Permission.bit`` is ``n``
+    is in the set, so membership is a bit test and unions and intersections
+    are single integer operations however many permissions are involved.
+    """
+    __slots__ = ('bits',)
+
+    def __init__(self, bits=0):
+        if bits < 0:
+            raise ValueError('Permission bits cannot be negative.')
+        self.bits = bits
+
+    @classmethod
+    def from_positions(cls, positions):
+        """Return the set of the permissions at the given bit positions."""
+        bits = 0
+        for position in positions:
+            bits |= 1 << position
+        return cls(bits)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Return the set stored in little-endian bytes."""
+        return cls(int.from_bytes(bytes(data or b''), 'little'))
+
+    @classmethod
+    def decode(cls, text):
+        """Return the set encoded by ``encode``.
+
+        Raises ValueError for text that is not valid encoded bits.
+        """
+        try:
+            data = base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+        except (TypeError, ValueError) as error:
+            raise ValueError('Invalid permission bits.') from error
+        return cls.from_bytes(data)
+
+    def to_bytes(self):
+        """Return the bits as little-endian bytes, empty for no bits."""
+        return self.bits.to_bytes((self.bits.bit_length() + 7) // 8, 'little')
+
+    def encode(self):
+        """Return the bits as unpadded URL-safe base64, for tokens."""
+        return base64.urlsafe_b64encode(self.to_bytes()).rstrip(b'=').decode()
+
+    def positions(self):
+        """Return the bit positions in the set, in ascending order."""
+        bits, positions = self.bits, []
+        while bits:
+            low = bits & -bits
+            positions.append(low.bit_length() - 1)
+            bits ^= low
+        return positions
+
+    def issuperset(self, other):
+        """Return whether every permission of other is in this set."""
+        return other.bits & ~self.bits == 0
+
+    def __contains__(self, position):
+        return position >= 0 and bool(self.bits >> position & 1)
+
+    def __iter__(self):
+        return iter(self.positions())
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def __bool__(self):
+        return bool(self.bits)
+
+    def __or__(self, other):
+        return PermissionSet(self.bits | other.bits)
+
+    def __and__(self, other):
+        return PermissionSet(self.bits & other.bits)
+
+    def __sub__(self, other):
+        return PermissionSet(self.bits & ~other.bits)
+
+    def __le__(self, other):
+        return other.issuperset(self)
+
+    def __ge__(self, other):
+        return self.issuperset(other)
+
+    def __eq__(self, other):
+        if not isinstance(other, PermissionSet):
+            return NotImplemented
+        return self.bits == other.bits
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __repr__(self):
+        return f'PermissionSet({self.positions()!r})'
@@ -0,0 +1,137 @@
+"""
+In-process caches.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class LRUCache:
+    """Size-bounded, thread-safe LRU cache with per-entry expiry."""
+
+    def __init__(self, max_size, ttl, timer=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._timer = timer
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > self._timer():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, timeout=None):
+        """Store value under key, evicting the least recently used entry.
+
+        ``timeout`` overrides the cache TTL for this entry.
+        """
+        if self.max_size <= 0:
+            return
+        ttl = self.ttl if timeout is None else timeout
+        with self._lock:
+            self._entries[key] = (value, self._timer() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def aget(self, key, default=None):
+        """Return the cached value for key; never blocks the event loop."""
+        return self.get(key, default)
+
+    async def aset(self, key, value, timeout=None):
+        """Store value under key; never blocks the event loop."""
+        self.set(key, value, timeout)
+
+    def delete_many(self, keys):
+        """Drop the given keys from the cache."""
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit, miss and eviction counters for sizing the cache."""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+# Maps user ids to the PermissionSet they hold. Entries are invalidated by
+# signals in the writing process; other processes rely on TTL.
+permission_cache = LRUCache(
+    max_size=settings.PERMISSION_CACHE_MAX_SIZE,
+    ttl=settings.PERMISSION_CACHE_TTL,
+)
+
+
+# Holds the permission name to bit index.
+permission_index_cache = LRUCache(
+    max_size=1,
+    ttl=settings.PERMISSION_CACHE_TTL,
+)
+
+
+# Maps hashed auth token keys to (user, token) pairs, when no shared cache
+# is configured. Other processes only see revocations once entries expire.
+token_cache = LRUCache(
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.TOKEN_CACHE_LOCAL_TTL,
+)
+
+
+def token_cache_key(key):
+    """Return the cache key for an auth token, without the raw token."""
+    return 'authtoken:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def shared_token_cache():
+    """Return the shared cache backing the token cache, if configured."""
+    alias = settings.TOKEN_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def token_credentials_cache():
+    """Return the cache for token lookups and the TTL to store them with.
+
+    A configured shared cache is used on its own, so deleted tokens and
+    deactivated users are rejected by every process at once.
+    """
+    shared = shared_token_cache()
+    if shared is not None:
+        return shared, settings.TOKEN_CACHE_TTL
+    return token_cache, token_cache.ttl
+
+
+def invalidate_tokens(keys):
+    """Drop cached lookups for the given auth token keys."""
+    cache_keys = [token_cache_key(key) for key in keys]
+    token_cache.delete_many(cache_keys)
+    shared = shared_token_cache()
+    if shared is not None:
+        shared.delete_many(cache_keys)
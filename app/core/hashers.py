@@ -0,0 +1,65 @@
+"""
+Password hashers with costs taken from settings.
+
+The algorithm names match Django's hashers, so existing hashes keep
+verifying and are rehashed on login whenever the configured cost changes.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+)
+
+
+def scrypt_maxmem(work_factor, block_size, parallelism=1):
+    """Return a memory limit scrypt will not exceed for these costs.
+
+    Scrypt needs about 128 * n * r * p bytes; OpenSSL refuses anything over
+    32 MiB unless told otherwise, which rules out larger work factors.
+    """
+    return max(
+        32 * 1024 * 1024,
+        256 * work_factor * block_size * parallelism,
+    )
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 using ``PASSWORD_PBKDF2_ITERATIONS`` iterations."""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """Scrypt using ``PASSWORD_SCRYPT_WORK_FACTOR`` as its cost."""
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR
+
+    @property
+    def maxmem(self):
+        return scrypt_maxmem(
+            self.work_factor, self.block_size, self.parallelism,
+        )
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """Argon2 using the ``PASSWORD_ARGON2_*`` costs.
+
+    Requires the optional ``argon2-cffi`` package.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
@@ -0,0 +1,179 @@
+"""
+Password hashing on a bounded worker pool.
+
+Hashing is pure CPU work; running it on a pool keeps request workers free
+to serve fast reads during login storms. ``hashlib`` releases the GIL while
+hashing, so the thread mode already runs hashes in parallel; the process
+mode also isolates hashers that do not.
+"""
+import multiprocessing
+import threading
+import time
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    TimeoutError,
+)
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class PoolSaturated(Exception):
+    """Raised when too many hashes are pending or a hash timed out."""
+
+
+class HashingPool:
+    """Run password hashing inline, on threads or on processes."""
+
+    def __init__(self, mode, workers, max_pending, timeout):
+        self.mode = mode
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        """Create the executor on first use, after any worker fork."""
+        with self._lock:
+            if self._executor is None:
+                if self.mode == 'process':
+                    self._executor = ProcessPoolExecutor(
+                        self.workers,
+                        mp_context=multiprocessing.get_context('fork'),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        self.workers,
+                        thread_name_prefix='password-hashing',
+                    )
+            return self._executor
+
+    def _submit(self, func, *args, wait=0):
+        """Submit func once a pending slot frees up within wait seconds,
+        holding the slot until the work finishes or is cancelled."""
+        if not self._slots.acquire(timeout=wait):
+            raise PoolSaturated()
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda future: self._slots.release())
+        return future
+
+    def run(self, func, *args):
+        """Run func on the pool and wait for its result.
+
+        Work still queued when the timeout passes is cancelled, so the
+        executor never holds more than ``max_pending`` jobs.
+        """
+        if self.mode == 'inline':
+            return func(*args)
+        future = self._submit(func, *args)
+        try:
+            return future.result(self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise PoolSaturated()
+
+    def map(self, func, items, timeout=None):
+        """Run func over items in parallel and return the results in order.
+
+        Each item takes a pending slot, waiting up to the pool timeout for
+        one, and its result is awaited up to the pool timeout. ``timeout``
+        also bounds the whole batch. When either runs out, unfinished work
+        is cancelled and PoolSaturated raised.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def wait():
+            if deadline is None:
+                return self.timeout
+            return max(0, min(self.timeout, deadline - time.monotonic()))
+
+        if self.mode == 'inline':
+            results = []
+            for item in items:
+                if deadline is not None and not wait():
+                    raise PoolSaturated()
+                results.append(func(item))
+            return results
+
+        futures = []
+        try:
+            for item in items:
+                futures.append(self._submit(func, item, wait=wait()))
+            return [future.result(wait()) for future in futures]
+        except TimeoutError:
+            raise PoolSaturated()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+hashing_pool = HashingPool(
+    mode=settings.PASSWORD_HASHING_MODE,
+    workers=settings.PASSWORD_HASHING_WORKERS,
+    max_pending=settings.PASSWORD_HASHING_MAX_PENDING,
+    timeout=settings.PASSWORD_HASHING_TIMEOUT,
+)
+
+# Bulk imports hash on their own workers, so logins never queue behind them.
+batch_hashing_pool = HashingPool(
+    mode=settings.PASSWORD_HASHING_MODE,
+    workers=settings.PASSWORD_HASHING_BATCH_WORKERS,
+    max_pending=2 * settings.PASSWORD_HASHING_BATCH_WORKERS,
+    timeout=settings.PASSWORD_HASHING_TIMEOUT,
+)
+
+
+def hash_password(password):
+    """Return the encoded hash of a raw password."""
+    if password is None:
+        return make_password(None)
+    return hashing_pool.run(make_password, password)
+
+
+def hash_passwords(passwords, timeout=None):
+    """Return the encoded hashes of many raw passwords, hashed in parallel.
+
+    Raises PoolSaturated when ``timeout`` seconds pass first.
+    """
+    passwords = list(passwords)
+    encoded = iter(batch_hashing_pool.map(
+        make_password,
+        [password for password in passwords if password],
+        timeout=timeout,
+    ))
+    return [
+        next(encoded) if password else make_password(None)
+        for password in passwords
+    ]
+
+
+def _check_password(password, encoded):
+    """Check a password on the pool, returning whether it is correct and
+    whether its hash is outdated.
+
+    The rehash is left to the caller: the setter only records the call,
+    since it may run in a worker process that cannot save the user.
+    """
+    outdated = []
+    is_correct = check_password(password, encoded, setter=outdated.append)
+    return is_correct, bool(outdated)
+
+
+def verify_password(user, password):
+    """Check a user's password, upgrading an outdated hash on success."""
+    encoded = user.password
+    if not encoded or password is None:
+        return False
+    is_correct, outdated = hashing_pool.run(
+        _check_password, password, encoded,
+    )
+    if outdated:
+        user.password = hash_password(password)
+        user.save(update_fields=['password'])
+    return is_correct
@@ -0,0 +1,146 @@
+"""
+Role inheritance, backed by a transitive closure table.
+
+A role inherits the permissions of its parents, their parents and so on.
+RoleClosure holds one row per (role, ancestor) pair so permission lookups
+join through it once whatever the depth of the hierarchy.
+"""
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from core.models import Role, RoleClosure
+
+
+def creates_cycle(role_ids, parent_ids):
+    """Return whether making parent_ids parents of role_ids forms a cycle."""
+    role_ids, parent_ids = set(role_ids), set(parent_ids)
+    if role_ids & parent_ids:
+        return True
+    return RoleClosure.objects.filter(
+        descendant_id__in=parent_ids,
+        ancestor_id__in=role_ids,
+    ).exists()
+
+
+def lock_roles(role_ids):
+    """Lock role rows until the end of the current transaction.
+
+    Rows are locked in id order so concurrent lockers cannot deadlock.
+    """
+    list(
+        Role.objects.select_for_update().filter(pk__in=role_ids)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def ensure_acyclic(role_ids, parent_ids):
+    """Raise ValidationError if the parents would form a cycle.
+
+    Must run in the transaction that adds the parents. The roles, their
+    descendants and the ancestors of the parents are locked before the
+    check, so two changes that together would close a cycle lock a
+    common role and the second one sees the first one's closure rows.
+    """
+    role_ids, parent_ids = set(role_ids), set(parent_ids)
+    lock_roles(
+        role_ids | parent_ids
+        | role_descendants(role_ids) | role_ancestors(parent_ids)
+    )
+    if creates_cycle(role_ids, parent_ids):
+        raise ValidationError(
+            'A role cannot inherit from itself or its descendants.',
+            code='role_cycle',
+        )
+
+
+def role_descendants(role_ids):
+    """Return the ids of roles inheriting from any of the given roles."""
+    return set(
+        RoleClosure.objects.filter(ancestor_id__in=role_ids)
+        .values_list('descendant_id', flat=True)
+    )
+
+
+def role_ancestors(role_ids):
+    """Return the ids of roles any of the given roles inherit from."""
+    return set(
+        RoleClosure.objects.filter(descendant_id__in=role_ids)
+        .values_list('ancestor_id', flat=True)
+    )
+
+
+def _ancestors(parents, inherited, role_id):
+    """Return every ancestor of a role.
+
+    Parent links are followed through the recomputed roles in
+    ``parents``; other roles contribute their closure in ``inherited``.
+    """
+    found = set()
+    pending = list(parents[role_id])
+    while pending:
+        parent_id = pending.pop()
+        if parent_id not in found:
+            found.add(parent_id)
+            if parent_id in inherited:
+                found |= inherited[parent_id]
+            else:
+                pending.extend(parents[parent_id])
+    return found
+
+
+def refresh_role_closure(role_ids, descendants=None):
+    """Recompute the ancestors of roles whose parents changed.
+
+    Roles inheriting from them are recomputed too; pass ``descendants``
+    when they can no longer be read from the closure, e.g. after a role
+    was deleted. Only the parent links of recomputed roles are read;
+    the ancestors of any other parent come from its closure rows, which
+    the change cannot have affected. Returns the ids of every recomputed
+    role.
+    """
+    if descendants is None:
+        descendants = role_descendants(role_ids)
+    affected = set(role_ids) | set(descendants)
+    if not affected:
+        return affected
+
+    parents = defaultdict(set)
+    for role_id, parent_id in Role.parents.through.objects.filter(
+        from_role_id__in=affected,
+    ).values_list('from_role_id', 'to_role_id'):
+        parents[role_id].add(parent_id)
+    inherited = {
+        parent_id: set()
+        for parent_ids in parents.values()
+        for parent_id in parent_ids - affected
+    }
+    for role_id, ancestor_id in RoleClosure.objects.filter(
+        descendant_id__in=list(inherited),
+    ).values_list('descendant_id', 'ancestor_id'):
+        inherited[role_id].add(ancestor_id)
+    wanted = {
+        (role_id, ancestor_id)
+        for role_id in affected
+        for ancestor_id in _ancestors(parents, inherited, role_id)
+    }
+    current = {
+        (descendant_id, ancestor_id): pk
+        for pk, descendant_id, ancestor_id in
+        RoleClosure.objects.filter(descendant_id__in=affected)
+        .values_list('pk', 'descendant_id', 'ancestor_id')
+    }
+
+    with transaction.atomic():
+        stale = [pk for key, pk in current.items() if key not in wanted]
+        if stale:
+            RoleClosure.objects.filter(pk__in=stale).delete()
+        RoleClosure.objects.bulk_create(
+            [
+                RoleClosure(descendant_id=role_id, ancestor_id=ancestor_id)
+                for role_id, ancestor_id in wanted - current.keys()
+            ],
+            ignore_conflicts=True,
+        )
+    return affected
@@ -0,0 +1,172 @@
+"""
+Django command to benchmark the API endpoints against seeded data.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.benchmark import (
+    benchmark_database,
+    seed_population,
+    summarize,
+    write_results,
+)
+
+
+ENDPOINTS = [
+    'login',
+    'signup',
+    'user-roles',
+    'user-permissions',
+    'role-list',
+    'role-permissions',
+    'permission-list',
+    'authorize',
+]
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+def _name_list(value):
+    names = [item for item in value.split(',') if item]
+    unknown = set(names) - set(ENDPOINTS)
+    if unknown:
+        raise ValueError(f'Unknown endpoints: {", ".join(sorted(unknown))}')
+    return names
+
+
+class Command(BaseCommand):
+    """Django command to measure latency, throughput and queries per
+    endpoint as the number of users grows.
+
+    Each population size is seeded into a fresh test database on the
+    configured backend, so it runs against SQLite (DB_ENGINE=sqlite) or a
+    local Postgres.
+    """
+    help = 'Benchmark login, signup and authorization reads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=_int_list, default=[100, 1000])
+        parser.add_argument('--roles', type=int, default=50)
+        parser.add_argument('--permissions', type=int, default=200)
+        parser.add_argument('--roles-per-user', type=int, default=5)
+        parser.add_argument('--permissions-per-role', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument(
+            '--login-requests', type=int, default=10,
+            help='Requests for login and signup, which hash passwords.',
+        )
+        parser.add_argument(
+            '--endpoints', type=_name_list, default=ENDPOINTS,
+            help='Comma separated endpoints, from: ' + ', '.join(ENDPOINTS),
+        )
+        parser.add_argument('--json', action='store_true')
+
+    def get_requests(self, users, password):
+        """Return a function building (method, url, data) per endpoint."""
+        user = users[0]
+        role = user.userrole.roles.first()
+        checks = [
+            {'user': other.pk, 'permission': f'permission-{index}'}
+            for index, other in enumerate(users[:100])
+        ]
+        signups = iter(range(10 ** 9))
+
+        def signup():
+            index = next(signups)
+            return ('post', reverse('user:create'), {
+                'username': f'signup-{index}',
+                'email': f'signup-{index}@example.com',
+                'password': password,
+            })
+
+        return {
+            'login': lambda: ('post', reverse('user:token'), {
+                'username': user.email, 'password': password,
+            }),
+            'signup': signup,
+            'user-roles': lambda: (
+                'get', reverse('user:user-roles', args=[user.pk]), None,
+            ),
+            'user-permissions': lambda: (
+                'get', reverse('user:user-permissions', args=[user.pk]), None,
+            ),
+            'role-list': lambda: ('get', reverse('user:role-list'), None),
+            'role-permissions': lambda: (
+                'get', reverse('user:role-permissions', args=[role.pk]), None,
+            ),
+            'permission-list': lambda: (
+                'get', reverse('user:permission-list'), None,
+            ),
+            'authorize': lambda: (
+                'post', reverse('user:authorize'), {'checks': checks},
+            ),
+        }
+
+    def measure(self, client, make_request, count):
+        """Issue count requests; return timings, query counts and wall."""
+        samples, queries = [], []
+        start = time.perf_counter()
+        for _ in range(count):
+            method, url, data = make_request()
+            with CaptureQueriesContext(connection) as ctx:
+                request_start = time.perf_counter()
+                if method == 'post':
+                    response = client.post(
+                        url, data, content_type='application/json',
+                    )
+                else:
+                    response = client.get(url)
+                samples.append(time.perf_counter() - request_start)
+            if response.status_code >= 400:
+                raise CommandError(f'{url} returned {response.status_code}.')
+            queries.append(len(ctx.captured_queries))
+        return samples, queries, time.perf_counter() - start
+
+    def run_population(self, user_count, options):
+        """Seed one population and benchmark each endpoint against it."""
+        password = 'benchmark-password'
+        users = seed_population(
+            user_count,
+            options['roles'],
+            options['permissions'],
+            options['roles_per_user'],
+            options['permissions_per_role'],
+            password=password,
+        ).users
+        token = Token.objects.create(user=users[0])
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        requests = self.get_requests(users, password)
+
+        results = []
+        for name in options['endpoints']:
+            count = options['requests']
+            if name in ('login', 'signup'):
+                count = options['login_requests']
+            samples, queries, wall = self.measure(
+                client, requests[name], count,
+            )
+            results.append({
+                'endpoint': name,
+                'users': user_count,
+                'requests_per_sec': len(samples) / wall,
+                **summarize(samples),
+                'queries_mean': sum(queries) / len(queries),
+                'queries_max': max(queries),
+            })
+        return results
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        results = []
+        for user_count in options['users']:
+            with benchmark_database():
+                results.extend(self.run_population(user_count, options))
+        write_results(self.stdout, results, options['json'])
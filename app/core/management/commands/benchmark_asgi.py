@@ -0,0 +1,163 @@
+"""
+Django command to compare the WSGI and ASGI read endpoints.
+"""
+import asyncio
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.benchmark import (
+    benchmark_database,
+    seed_population,
+    summarize,
+    write_results,
+)
+
+
+class Command(BaseCommand):
+    """Django command to benchmark sync DRF views against async views.
+
+    Requests go through Django's WSGI and ASGI handlers in-process, with a
+    thread per concurrent client for WSGI and one event loop for ASGI, on a
+    throwaway test database.
+    """
+    help = 'Compare latency and throughput of the WSGI and ASGI reads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--roles', type=int, default=50)
+        parser.add_argument('--permissions', type=int, default=200)
+        parser.add_argument('--roles-per-user', type=int, default=20)
+        parser.add_argument('--permissions-per-role', type=int, default=10)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--json', action='store_true')
+
+    def get_endpoints(self, user, role):
+        """Return (name, WSGI url, ASGI url) for each compared read."""
+        return [
+            (
+                'user roles',
+                reverse('user:user-roles', args=[user.pk]),
+                reverse('user:async-user-roles', args=[user.pk]),
+            ),
+            (
+                'user permissions',
+                reverse('user:user-permissions', args=[user.pk]),
+                reverse('user:async-user-permissions', args=[user.pk]),
+            ),
+            (
+                'role detail',
+                reverse('user:role-detail', args=[role.pk]),
+                reverse('user:async-role-detail', args=[role.pk]),
+            ),
+            (
+                'permission list',
+                reverse('user:permission-list'),
+                reverse('user:async-permission-list'),
+            ),
+        ]
+
+    def run_wsgi(self, url, headers, requests, concurrency):
+        """Issue requests from concurrent threads; return samples, wall."""
+        samples = []
+        lock = threading.Lock()
+
+        def client_thread(count):
+            client = Client(headers=headers)
+            try:
+                for _ in range(count):
+                    start = time.perf_counter()
+                    response = client.get(url)
+                    if response.status_code != 200:
+                        raise CommandError(
+                            f'{url} returned {response.status_code}.'
+                        )
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        samples.append(elapsed)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=client_thread, args=(count,))
+            for count in _split(requests, concurrency)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return samples, time.perf_counter() - start
+
+    async def run_asgi(self, url, headers, requests, concurrency):
+        """Issue requests from concurrent tasks; return samples, wall."""
+        client = AsyncClient()
+        samples = []
+
+        async def client_task(count):
+            for _ in range(count):
+                start = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{url} returned {response.status_code}.'
+                    )
+                samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client_task(count) for count in _split(requests, concurrency)
+        ))
+        return samples, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        results = []
+        with benchmark_database():
+            users = seed_population(
+                options['users'],
+                options['roles'],
+                options['permissions'],
+                options['roles_per_user'],
+                options['permissions_per_role'],
+            ).users
+            token = Token.objects.create(user=users[0])
+            role = users[0].userrole.roles.first()
+            headers = {'Authorization': f'Token {token.key}'}
+            connection.close()
+
+            for name, wsgi_url, asgi_url in self.get_endpoints(
+                users[0], role,
+            ):
+                for mode, run in (
+                    ('wsgi', self.run_wsgi),
+                    ('asgi', lambda *args: asyncio.run(self.run_asgi(*args))),
+                ):
+                    samples, wall = run(
+                        wsgi_url if mode == 'wsgi' else asgi_url,
+                        headers,
+                        options['requests'],
+                        options['concurrency'],
+                    )
+                    results.append({
+                        'endpoint': name,
+                        'mode': mode,
+                        'requests_per_sec': len(samples) / wall,
+                        **summarize(samples),
+                    })
+        write_results(self.stdout, results, options['json'])
+
+
+def _split(total, parts):
+    """Split total into parts near-equal, non-empty counts."""
+    parts = max(1, min(parts, total))
+    return [
+        total // parts + (1 if index < total % parts else 0)
+        for index in range(parts)
+    ]
@@ -0,0 +1,75 @@
+"""
+Django command to benchmark password hasher configurations.
+"""
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+)
+from django.core.management.base import BaseCommand
+
+from core.benchmark import summarize, time_calls, write_results
+from core.hashers import scrypt_maxmem
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(',') if item]
+
+
+class Command(BaseCommand):
+    """Django command to report logins per second per core per hasher."""
+    help = 'Measure password verification cost for hasher settings.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=10)
+        parser.add_argument(
+            '--pbkdf2-iterations', type=_int_list,
+            default=[260000, 600000, 1000000],
+        )
+        parser.add_argument(
+            '--scrypt-work-factors', type=_int_list,
+            default=[2 ** 14, 2 ** 15, 2 ** 16],
+        )
+        parser.add_argument(
+            '--argon2-memory-costs', type=_int_list,
+            default=[65536, 102400],
+        )
+        parser.add_argument('--json', action='store_true')
+
+    def get_configurations(self, options):
+        """Yield (name, hasher) pairs to benchmark."""
+        for iterations in options['pbkdf2_iterations']:
+            hasher = PBKDF2PasswordHasher()
+            hasher.iterations = iterations
+            yield f'pbkdf2 iterations={iterations}', hasher
+        for work_factor in options['scrypt_work_factors']:
+            hasher = ScryptPasswordHasher()
+            hasher.work_factor = work_factor
+            hasher.maxmem = scrypt_maxmem(work_factor, hasher.block_size)
+            yield f'scrypt work_factor={work_factor}', hasher
+        try:
+            Argon2PasswordHasher()._load_library()
+        except ValueError:
+            self.stderr.write('argon2-cffi not installed, skipping argon2.')
+            return
+        for memory_cost in options['argon2_memory_costs']:
+            hasher = Argon2PasswordHasher()
+            hasher.memory_cost = memory_cost
+            yield f'argon2 memory_cost={memory_cost}', hasher
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        results = []
+        for name, hasher in self.get_configurations(options):
+            encoded = hasher.encode('benchmark-password', hasher.salt())
+            samples = time_calls(
+                lambda: hasher.verify('benchmark-password', encoded),
+                options['rounds'],
+            )
+            stats = summarize(samples)
+            results.append({
+                'hasher': name,
+                'logins_per_sec_per_core': 1000 / stats['mean_ms'],
+                **stats,
+            })
+        write_results(self.stdout, results, options['json'])
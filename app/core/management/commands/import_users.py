@@ -0,0 +1,76 @@
+"""
+Django command to import users in bulk from CSV or JSON Lines.
+"""
+import csv
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.provisioning import provision_users
+
+
+class Command(BaseCommand):
+    """Django command to provision users from a file.
+
+    CSV files need ``username`` and ``email`` columns and may have
+    ``password`` and ``roles`` (role names separated by ``;``). JSON Lines
+    files hold one object per line with the same keys, ``roles`` being a
+    list. The file is read as it is imported.
+    """
+    help = 'Import users and their roles from a CSV or JSON Lines file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin.")
+        parser.add_argument(
+            '--format', choices=['csv', 'jsonl'],
+            help='File format, by default taken from the extension.',
+        )
+        parser.add_argument('--chunk-size', type=int)
+
+    def read_records(self, file, file_format):
+        """Yield records from an open file."""
+        if file_format == 'csv':
+            yield from csv.DictReader(file)
+            return
+        for number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                raise CommandError(f'Invalid JSON on line {number}: {exc}')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        path = options['path']
+        file_format = options['format']
+        if file_format is None:
+            if path.endswith('.csv'):
+                file_format = 'csv'
+            elif path.endswith(('.jsonl', '.ndjson')):
+                file_format = 'jsonl'
+            else:
+                raise CommandError('Cannot tell the format, use --format.')
+
+        if path == '-':
+            result = provision_users(
+                self.read_records(sys.stdin, file_format),
+                options['chunk_size'],
+            )
+        else:
+            try:
+                with open(path, newline='', encoding='utf-8') as file:
+                    result = provision_users(
+                        self.read_records(file, file_format),
+                        options['chunk_size'],
+                    )
+            except OSError as exc:
+                raise CommandError(exc)
+
+        for error in result['errors']:
+            self.stderr.write(f'Record {error["record"]}: {error["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result["created"]} users, '
+            f'skipped {len(result["errors"])}.'
+        ))
@@ -6,22 +6,41 @@ import time
 from psycopg2 import OperationalError as Psycopg2OpError
 
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
 
 class Command(BaseCommand):
     """Django command to wait for databse."""
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeout', type=float, default=60,
+            help='Seconds to wait before giving up.',
+        )
+        parser.add_argument(
+            '--max-delay', type=float, default=5,
+            help='Longest pause between attempts, in seconds.',
+        )
+
     def handle(self, *args, **options):
         """Entrypoint for command."""
         self.stdout.write('Waiting for databse...')
-        db_up = False
-        while db_up is False:
+        deadline = time.monotonic() + options['timeout']
+        delay = 0.5
+        while True:
             try:
                 self.check(databases=['default'])
-                db_up = True
-            except (Psycopg2OpError, OperationalError):
-                self.stdout.write('Database unavailable, waiting 1 second...')
-                time.sleep(1)
+                break
+            except (Psycopg2OpError, OperationalError) as exc:
+                if time.monotonic() >= deadline:
+                    raise CommandError(
+                        f'Database unavailable after {options["timeout"]}'
+                        f' seconds: {exc}'
+                    )
+                self.stdout.write(
+                    f'Database unavailable, waiting {delay:g} seconds...'
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, options['max_delay'])
 
         self.stdout.write(self.style.SUCCESS('Database available!'))
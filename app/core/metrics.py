@@ -0,0 +1,307 @@
+"""
+Per-view request metrics, exported in the Prometheus text format.
+
+Request totals are summed across processes in the METRICS_CACHE_ALIAS
+cache, so any worker can answer a scrape for all of them. Cache stats
+are those of the process answering.
+"""
+import hmac
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseForbidden
+
+from core.cache import (
+    permission_cache,
+    permission_index_cache,
+    token_cache,
+)
+from core.routers import PROCESS_LOCAL_CACHES
+
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+COUNTERS = ('requests', 'queries')
+TIMERS = ('db_seconds', 'render_seconds', 'duration_seconds')
+
+
+class RequestStats:
+    """Measurements for the request being handled."""
+
+    def __init__(self):
+        self.view = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_start = None
+        self.render_time = 0.0
+
+    def start_render(self, response):
+        """Time the rendering of a template or DRF response."""
+        self.render_start = time.perf_counter()
+        response.add_post_render_callback(self._end_render)
+
+    def _end_render(self, response):
+        self.render_time = time.perf_counter() - self.render_start
+
+
+current_request_stats = ContextVar('current_request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting queries of measured requests."""
+    stats = current_request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """Count the queries of requests measured by the metrics middleware."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def check_metrics_cache(app_configs, **kwargs):
+    """Warn when request totals are kept in a cache local to each process,
+    since a scrape would then only see the process answering it."""
+    alias = settings.METRICS_CACHE_ALIAS
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [checks.Warning(
+            f'The {alias!r} cache holding request metrics is local to each '
+            'process, so /metrics/ only reports the worker answering it.',
+            hint='Point METRICS_CACHE_ALIAS at a shared cache such as Redis.',
+            id='core.W001',
+        )]
+    return []
+
+
+def _incr(cache, key, delta):
+    """Add delta to a counter in the cache, creating it if missing."""
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        if not cache.add(key, delta, timeout=None):
+            cache.incr(key, delta)
+
+
+class MetricsRegistry:
+    """Per-view totals and a request duration histogram, shared by every
+    process through a cache.
+
+    Requests are added to totals local to the process, which are added
+    to the cache at most every ``flush_interval`` seconds and before
+    each snapshot, so recording a request costs no round trip. Seconds
+    are stored as integer microseconds so every backend can increment
+    them.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS, prefix='metrics',
+                 cache_alias=None, flush_interval=None):
+        self.buckets = buckets
+        self.prefix = prefix
+        self.cache_alias = cache_alias
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._views = set()
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias or settings.METRICS_CACHE_ALIAS]
+
+    def _empty(self):
+        return {
+            'requests': 0,
+            'queries': 0,
+            'db_seconds': 0.0,
+            'render_seconds': 0.0,
+            'duration_seconds': 0.0,
+            'buckets': [0] * len(self.buckets),
+        }
+
+    def _key(self, view, field):
+        return f'{self.prefix}:{view}:{field}'
+
+    def _fields(self):
+        return (
+            COUNTERS + TIMERS
+            + tuple(f'le={bound}' for bound in self.buckets)
+        )
+
+    def record(self, view, stats, duration):
+        """Add one finished request to the totals of its view."""
+        if self.flush_interval is None:
+            interval = settings.METRICS_FLUSH_INTERVAL
+        else:
+            interval = self.flush_interval
+        with self._lock:
+            totals = self._pending.setdefault(view, self._empty())
+            totals['requests'] += 1
+            totals['queries'] += stats.queries
+            totals['db_seconds'] += stats.db_time
+            totals['render_seconds'] += stats.render_time
+            totals['duration_seconds'] += duration
+            for index, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    totals['buckets'][index] += 1
+            due = time.monotonic() - self._flushed_at >= interval
+        if due:
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not flush request metrics.')
+
+    def flush(self):
+        """Add the totals recorded since the last flush to the cache."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+            self._views |= pending.keys()
+            views = set(self._views)
+        if not pending:
+            return
+        cache = self.cache
+        # The view list is rewritten without a lock, so a concurrent flush
+        # may drop a view; every flush re-adds the ones this process saw.
+        listed = cache.get(self._key('views', 'all'), set())
+        if not views <= listed:
+            cache.set(self._key('views', 'all'), listed | views, None)
+        for view, totals in pending.items():
+            values = [totals[field] for field in COUNTERS]
+            values += [round(totals[field] * 1e6) for field in TIMERS]
+            values += totals['buckets']
+            for field, value in zip(self._fields(), values):
+                if value:
+                    _incr(cache, self._key(view, field), value)
+
+    def clear(self):
+        """Drop every recorded total."""
+        with self._lock:
+            self._pending.clear()
+            self._views.clear()
+        cache = self.cache
+        views = cache.get(self._key('views', 'all'), set())
+        cache.delete_many([self._key('views', 'all')] + [
+            self._key(view, field)
+            for view in views for field in self._fields()
+        ])
+
+    def snapshot(self):
+        """Return the per-view totals of every process."""
+        self.flush()
+        cache = self.cache
+        views = cache.get(self._key('views', 'all'), set())
+        fields = self._fields()
+        stored = cache.get_many([
+            self._key(view, field) for view in views for field in fields
+        ])
+        snapshot = {}
+        for view in views:
+            values = [stored.get(self._key(view, field), 0)
+                      for field in fields]
+            totals = dict(zip(COUNTERS, values))
+            totals.update(
+                (field, value / 1e6)
+                for field, value in zip(TIMERS, values[len(COUNTERS):])
+            )
+            totals['buckets'] = values[len(COUNTERS) + len(TIMERS):]
+            snapshot[view] = totals
+        return snapshot
+
+    def render(self, caches):
+        """Return the metrics and cache stats in Prometheus text format."""
+        views = sorted(self.snapshot().items())
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        for key, name, help_text in (
+            ('requests', 'http_requests_total', 'Requests handled.'),
+            ('queries', 'http_request_queries_total', 'SQL queries run.'),
+            ('db_seconds', 'http_request_db_seconds_total',
+             'Time spent in SQL queries.'),
+            ('render_seconds', 'http_request_render_seconds_total',
+             'Time spent rendering responses.'),
+        ):
+            family(name, 'counter', help_text, [
+                f'{name}{{view="{view}"}} {totals[key]}'
+                for view, totals in views
+            ])
+
+        samples = []
+        for view, totals in views:
+            for bound, count in zip(self.buckets, totals['buckets']):
+                samples.append(
+                    'http_request_duration_seconds_bucket'
+                    f'{{view="{view}",le="{bound}"}} {count}'
+                )
+            samples.append(
+                'http_request_duration_seconds_bucket'
+                f'{{view="{view}",le="+Inf"}} {totals["requests"]}'
+            )
+            samples.append(
+                'http_request_duration_seconds_sum'
+                f'{{view="{view}"}} {totals["duration_seconds"]}'
+            )
+            samples.append(
+                'http_request_duration_seconds_count'
+                f'{{view="{view}"}} {totals["requests"]}'
+            )
+        family('http_request_duration_seconds', 'histogram',
+               'Wall time per request.', samples)
+
+        stats = sorted(
+            (name, cache.stats()) for name, cache in caches.items()
+        )
+        for key, name, kind in (
+            ('hits', 'cache_hits_total', 'counter'),
+            ('misses', 'cache_misses_total', 'counter'),
+            ('evictions', 'cache_evictions_total', 'counter'),
+            ('size', 'cache_size', 'gauge'),
+            ('max_size', 'cache_max_size', 'gauge'),
+        ):
+            family(name, kind, f'In-process cache {key.replace("_", " ")}.', [
+                f'{name}{{cache="{cache}"}} {values[key]}'
+                for cache, values in stats
+            ])
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+def metrics_view(request):
+    """Serve the metrics of every process to Prometheus.
+
+    Denied unless METRICS_TOKEN is set and sent as a bearer token.
+    """
+    token = settings.METRICS_TOKEN
+    if not token or not hmac.compare_digest(
+        request.headers.get('Authorization', ''), f'Bearer {token}',
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        registry.render({
+            'permission': permission_cache,
+            'permission_index': permission_index_cache,
+            'token': token_cache,
+        }),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
@@ -0,0 +1,79 @@
+"""
+Middleware recording per-view request metrics.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from core.metrics import RequestStats, current_request_stats, registry
+
+
+def view_label(view_func, method):
+    """Return a label such as ``RoleViewSet.list`` for a resolved view."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method.lower(), method.lower())}'
+
+
+class RequestMetricsMiddleware:
+    """Record query count, database, render and wall time per view.
+
+    With ``METRICS_SERVER_TIMING`` the timings are also sent back in a
+    ``Server-Timing`` header.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        return self.finish(response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        return self.finish(response, stats, time.perf_counter() - start)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.view = view_label(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        stats = current_request_stats.get()
+        if stats is not None:
+            stats.start_render(response)
+        return response
+
+    def finish(self, response, stats, duration):
+        """Record the request and add the Server-Timing header."""
+        registry.record(stats.view or 'unresolved', stats, duration)
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join([
+                f'db;dur={stats.db_time * 1000:.1f};'
+                f'desc="{stats.queries} queries"',
+                f'render;dur={stats.render_time * 1000:.1f}',
+                f'total;dur={duration * 1000:.1f}',
+            ])
+        return response
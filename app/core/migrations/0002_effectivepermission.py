@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_effective_permissions(apps, schema_editor):
+    EffectivePermission = apps.get_model('core', 'EffectivePermission')
+    Role = apps.get_model('core', 'Role')
+    granted = set(
+        Role.permissions.through.objects
+        .values_list('role__userrole__user_id', 'permission_id')
+        .filter(role__userrole__isnull=False)
+    )
+    EffectivePermission.objects.bulk_create(
+        [
+            EffectivePermission(user_id=user_id, permission_id=permission_id)
+            for user_id, permission_id in granted
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EffectivePermission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('permission', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_grants', to='core.permission')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='effective_permissions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='effectivepermission',
+            constraint=models.UniqueConstraint(fields=('user', 'permission'), name='core_effectivepermission_unique'),
+        ),
+        migrations.RunPython(
+            backfill_effective_permissions,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def merge_duplicate_user_roles(apps, schema_editor):
+    UserRole = apps.get_model('core', 'UserRole')
+    duplicated = (
+        UserRole.objects.values('user')
+        .annotate(count=models.Count('id'))
+        .filter(count__gt=1)
+        .values_list('user', flat=True)
+    )
+    for user_id in duplicated:
+        keep, *extra = UserRole.objects.filter(user_id=user_id).order_by('id')
+        keep.roles.add(*UserRole.roles.through.objects.filter(
+            userrole__in=extra,
+        ).values_list('role_id', flat=True))
+        UserRole.objects.filter(pk__in=[user_role.pk for user_role in extra]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_effectivepermission'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_user_roles,
+            migrations.RunPython.noop,
+        ),
+        migrations.AlterField(
+            model_name='userrole',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        # The through tables are unique on (from, to); add the reverse
+        # direction so lookups by role or by permission are index-only.
+        migrations.RunSQL(
+            'CREATE INDEX core_role_permissions_perm_role_idx '
+            'ON core_role_permissions (permission_id, role_id)',
+            'DROP INDEX core_role_permissions_perm_role_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_userrole_roles_role_userrole_idx '
+            'ON core_userrole_roles (role_id, userrole_id)',
+            'DROP INDEX core_userrole_roles_role_userrole_idx',
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:36
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_user_login_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='role',
+            name='modified_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='role',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userrole',
+            name='modified_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userrole',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_role_userrole_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='role',
+            name='parents',
+            field=models.ManyToManyField(blank=True, related_name='children', to='core.role'),
+        ),
+        migrations.CreateModel(
+            name='RoleClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='core.role')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='core.role')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='roleclosure',
+            constraint=models.UniqueConstraint(fields=('descendant', 'ancestor'), name='core_roleclosure_unique'),
+        ),
+    ]
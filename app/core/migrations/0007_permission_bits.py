@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:02
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def _to_bytes(ids):
+    bits = 0
+    for permission_id in ids:
+        bits |= 1 << permission_id
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+def _store_bits(model, key, ids_by_key):
+    """Write each row's bits from ids_by_key, in batched UPDATEs."""
+    changed = []
+    for obj in model.objects.only('pk', key).iterator(chunk_size=BATCH_SIZE):
+        ids = ids_by_key.get(getattr(obj, key))
+        if ids:
+            obj.permission_bits = _to_bytes(ids)
+            changed.append(obj)
+    model.objects.bulk_update(
+        changed, ['permission_bits'], batch_size=BATCH_SIZE,
+    )
+
+
+def backfill_permission_bits(apps, schema_editor):
+    EffectivePermission = apps.get_model('core', 'EffectivePermission')
+    Role = apps.get_model('core', 'Role')
+    UserRole = apps.get_model('core', 'UserRole')
+
+    user_ids = defaultdict(set)
+    for user_id, permission_id in EffectivePermission.objects.values_list(
+        'user_id', 'permission_id',
+    ):
+        user_ids[user_id].add(permission_id)
+    _store_bits(UserRole, 'user_id', user_ids)
+
+    role_ids = defaultdict(set)
+    grants = Role.permissions.through.objects
+    for role_id, permission_id in grants.values_list(
+        'role_id', 'permission_id',
+    ):
+        role_ids[role_id].add(permission_id)
+    inherited = 'role__descendant_links__descendant_id'
+    for role_id, permission_id in grants.filter(
+        **{f'{inherited}__isnull': False}
+    ).values_list(inherited, 'permission_id'):
+        role_ids[role_id].add(permission_id)
+    _store_bits(Role, 'pk', role_ids)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_role_hierarchy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='role',
+            name='permission_bits',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.AddField(
+            model_name='userrole',
+            name='permission_bits',
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.RunPython(
+            backfill_permission_bits,
+            migrations.RunPython.noop,
+        ),
+    ]
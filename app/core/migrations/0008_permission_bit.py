@@ -0,0 +1,94 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:12
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.utils.timezone
+
+BATCH_SIZE = 1000
+
+
+def _to_bytes(bits):
+    value = 0
+    for bit in bits:
+        value |= 1 << bit
+    return value.to_bytes((value.bit_length() + 7) // 8, 'little')
+
+
+def _store_bits(model, key, bits_by_key):
+    """Write each row's bits from bits_by_key, in batched UPDATEs."""
+    changed = []
+    for obj in model.objects.only('pk', key).iterator(chunk_size=BATCH_SIZE):
+        obj.permission_bits = _to_bytes(bits_by_key.get(getattr(obj, key), ()))
+        changed.append(obj)
+    model.objects.bulk_update(
+        changed, ['permission_bits'], batch_size=BATCH_SIZE,
+    )
+
+
+def assign_permission_bits(apps, schema_editor):
+    """Number permissions densely by id and rewrite every bitmap."""
+    EffectivePermission = apps.get_model('core', 'EffectivePermission')
+    Permission = apps.get_model('core', 'Permission')
+    Role = apps.get_model('core', 'Role')
+    UserRole = apps.get_model('core', 'UserRole')
+
+    permissions = list(Permission.objects.only('pk').order_by('pk'))
+    for bit, permission in enumerate(permissions):
+        permission.bit = bit
+    Permission.objects.bulk_update(
+        permissions, ['bit'], batch_size=BATCH_SIZE,
+    )
+    bit_of = {permission.pk: permission.bit for permission in permissions}
+
+    user_bits = defaultdict(set)
+    for user_id, permission_id in EffectivePermission.objects.values_list(
+        'user_id', 'permission_id',
+    ):
+        user_bits[user_id].add(bit_of[permission_id])
+    _store_bits(UserRole, 'user_id', user_bits)
+
+    role_bits = defaultdict(set)
+    grants = Role.permissions.through.objects
+    for role_id, permission_id in grants.values_list(
+        'role_id', 'permission_id',
+    ):
+        role_bits[role_id].add(bit_of[permission_id])
+    inherited = 'role__descendant_links__descendant_id'
+    for role_id, permission_id in grants.filter(
+        **{f'{inherited}__isnull': False}
+    ).values_list(inherited, 'permission_id'):
+        role_bits[role_id].add(bit_of[permission_id])
+    _store_bits(Role, 'pk', role_bits)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_permission_bits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetiredPermissionBit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bit', models.PositiveIntegerField()),
+                ('retired_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='permission',
+            name='bit',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            assign_permission_bits,
+            migrations.RunPython.noop,
+        ),
+        migrations.AlterField(
+            model_name='permission',
+            name='bit',
+            field=models.PositiveIntegerField(editable=False, unique=True),
+        ),
+    ]
@@ -1,14 +1,21 @@
 """
 Database models.
 """
+from datetime import timedelta
+
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Upper
+from django.utils import timezone
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
     PermissionsMixin,
 )
 
+from core.bitsets import PermissionSet
+from core.hashing import hash_password
+
 
 class UserManager(BaseUserManager):
     """Manager for users."""
@@ -24,7 +31,7 @@ class UserManager(BaseUserManager):
             email=self.normalize_email(email),
             **extra_fields
         )
-        user.set_password(password)
+        user.password = hash_password(password)
         user.save(using=self.db)
 
         return user
@@ -51,31 +58,222 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta:
+        indexes = [
+            models.Index(Upper('email'), name='core_user_email_upper_idx'),
+            models.Index(
+                Upper('username'),
+                name='core_user_username_upper_idx',
+            ),
+        ]
+
+    def has_role_permission(self, name):
+        """Return whether the user holds a permission through a role."""
+        return self.has_role_permissions([name])
+
+    def has_role_permissions(self, names):
+        """Return whether the user holds every named permission."""
+        from core.authorization import user_has_permissions
+
+        if not self.is_active:
+            return False
+        if self.is_superuser:
+            return True
+        return user_has_permissions(self.pk, names)
+
+
+class IndexedModel(models.Model):
+    """Model with columns maintained by queryset updates.
 
-class UserRole(models.Model):
+    Saving a loaded row leaves those columns out, so a stale instance does
+    not overwrite values stored since it was loaded.
+    """
+    managed_fields = ('permission_bits', 'version', 'modified_at')
+
+    permission_bits = models.BinaryField(default=bytes, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.attname not in deferred
+                and field.name not in self.managed_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class UserRole(IndexedModel):
     """User-Role object."""
-    user = models.ForeignKey(
+    user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
     roles = models.ManyToManyField('Role', blank=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    modified_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    @property
+    def permission_set(self):
+        """Return the user's effective permissions as a PermissionSet."""
+        return PermissionSet.from_bytes(self.permission_bits)
 
     def __str__(self):
         return str(self.user)
 
 
-class Role(models.Model):
+class Role(IndexedModel):
     """Role object."""
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
     permissions = models.ManyToManyField('Permission', blank=True)
+    parents = models.ManyToManyField(
+        'self',
+        symmetrical=False,
+        related_name='children',
+        blank=True,
+    )
+    version = models.PositiveIntegerField(default=1, editable=False)
+    modified_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    @property
+    def permission_set(self):
+        """Return the role's own and inherited permissions as a
+        PermissionSet."""
+        return PermissionSet.from_bytes(self.permission_bits)
 
     def __str__(self):
         return self.name
 
 
+class RoleClosure(models.Model):
+    """Role inheriting the permissions of an ancestor, at any depth."""
+    descendant = models.ForeignKey(
+        'Role',
+        on_delete=models.CASCADE,
+        related_name='ancestor_links',
+    )
+    ancestor = models.ForeignKey(
+        'Role',
+        on_delete=models.CASCADE,
+        related_name='descendant_links',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['descendant', 'ancestor'],
+                name='core_roleclosure_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.descendant} < {self.ancestor}'
+
+
+class PermissionManager(models.Manager):
+    """Manager for permissions."""
+
+    def free_bits(self, count=1):
+        """Return the lowest count bits free for new permissions."""
+        taken = set(self.values_list('bit', flat=True).union(
+            RetiredPermissionBit.objects.held().values_list('bit', flat=True)
+        ))
+        bits = []
+        bit = 0
+        while len(bits) < count:
+            if bit not in taken:
+                bits.append(bit)
+            bit += 1
+        return bits
+
+
 class Permission(models.Model):
-    """Permission object."""
-    name = models.CharField(max_length=255)
+    """Permission object.
+
+    ``bit`` is the permission's position in permission bitmaps, assigned
+    on creation from the lowest free bits.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    bit = models.PositiveIntegerField(unique=True, editable=False)
+
+    objects = PermissionManager()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding or self.bit is not None:
+            super().save(*args, **kwargs)
+            return
+        while True:
+            self.bit = Permission.objects.free_bits()[0]
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                # Retry only when a concurrent create took the same bit.
+                taken = Permission.objects.filter(bit=self.bit).exists()
+                self.bit = None
+                if not taken:
+                    raise
+
+    def __str__(self):
+        return self.name
+
+
+class RetiredPermissionBitManager(models.Manager):
+    """Manager for the bits of deleted permissions."""
+
+    def _cutoff(self):
+        return timezone.now() - timedelta(
+            seconds=settings.PERMISSION_BIT_REUSE_DELAY,
+        )
+
+    def held(self):
+        """Return the bits retired in the last PERMISSION_BIT_REUSE_DELAY
+        seconds, which no new permission may take yet."""
+        return self.filter(retired_at__gt=self._cutoff())
+
+    def retire(self, bit):
+        """Hold a bit back from reuse, forgetting bits free again."""
+        self.filter(retired_at__lte=self._cutoff()).delete()
+        return self.create(bit=bit)
+
+
+class RetiredPermissionBit(models.Model):
+    """Bit of a deleted permission, held back from reuse until cached
+    bitmaps and signed tokens still reading it have expired."""
+    bit = models.PositiveIntegerField()
+    retired_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    objects = RetiredPermissionBitManager()
+
+    def __str__(self):
+        return str(self.bit)
+
+
+class EffectivePermission(models.Model):
+    """Denormalized permission granted to a user through their roles."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='effective_permissions',
+    )
+    permission = models.ForeignKey(
+        'Permission',
+        on_delete=models.CASCADE,
+        related_name='effective_grants',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'permission'],
+                name='core_effectivepermission_unique',
+            ),
+        ]
 
     def __str__(self):
-        return self.role
+        return f'{self.user}: {self.permission}'
@@ -0,0 +1,191 @@
+"""
+Bulk user provisioning.
+"""
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Upper
+
+from core.authorization import refresh_effective_permissions
+from core.hashing import hash_passwords
+from core.models import Role, User, UserRole
+
+
+def clean_record(record):
+    """Return a normalized copy of a user record, or raise ValueError.
+
+    ``roles`` may be a list of role names or a ``;`` separated string.
+    """
+    if not isinstance(record, dict):
+        raise ValueError('Expected an object.')
+    username = (record.get('username') or '').strip()
+    email = User.objects.normalize_email((record.get('email') or '').strip())
+    if not username:
+        raise ValueError('User must have an username.')
+    if not email:
+        raise ValueError('User must have an email address.')
+    try:
+        validate_email(email)
+    except ValidationError:
+        raise ValueError('Enter a valid email address.')
+
+    roles = record.get('roles') or []
+    if isinstance(roles, str):
+        roles = roles.split(';')
+    return {
+        'username': username,
+        'email': email,
+        'password': record.get('password') or None,
+        'roles': sorted({name.strip() for name in roles if name.strip()}),
+    }
+
+
+def provision_users(records, chunk_size=None, hash_timeout=None):
+    """Create users, their UserRole rows and initial roles in bulk.
+
+    ``records`` may be any iterable, so large imports can be streamed; it is
+    consumed ``chunk_size`` records at a time, each chunk in one transaction.
+    Invalid records, taken or repeated usernames and emails, and unknown
+    role names are skipped. Returns ``{'created': n, 'errors': [...]}``
+    where each error names the 1-based position of its record.
+
+    Raises PoolSaturated when hashing passwords takes more than
+    ``hash_timeout`` seconds in total; chunks created before then stay.
+    """
+    chunk_size = chunk_size or settings.PROVISIONING_CHUNK_SIZE
+    deadline = None
+    if hash_timeout is not None:
+        deadline = time.monotonic() + hash_timeout
+    result = {'created': 0, 'errors': []}
+    seen = {'username': set(), 'email': set()}
+    numbered = enumerate(records, start=1)
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            return result
+        result['created'] += _provision_chunk(
+            chunk, seen, result['errors'], deadline,
+        )
+
+
+def _taken(records):
+    """Return the upper-cased usernames and emails of records that
+    existing users hold.
+
+    Usernames and emails are compared case-insensitively, through the
+    Upper() functional indexes that serve logins.
+    """
+    records = list(records)
+    usernames = {record['username'].upper() for record in records}
+    emails = {record['email'].upper() for record in records}
+    taken = {'username': set(), 'email': set()}
+    for username, email in User.objects.annotate(
+        username_upper=Upper('username'), email_upper=Upper('email'),
+    ).filter(
+        Q(username_upper__in=usernames) | Q(email_upper__in=emails)
+    ).values_list('username_upper', 'email_upper'):
+        taken['username'].add(username)
+        taken['email'].add(email)
+    return taken
+
+
+def _duplicate_error(record, *taken_sets):
+    """Return the error for a record whose username or email is in any of
+    the sets, or None."""
+    for field in ('username', 'email'):
+        value = record[field].upper()
+        if any(value in taken[field] for taken in taken_sets):
+            return f'A user with that {field} already exists.'
+    return None
+
+
+def _provision_chunk(chunk, seen, errors, deadline=None):
+    """Create the valid users of one chunk; return how many were created."""
+    cleaned = []
+    for number, record in chunk:
+        try:
+            cleaned.append((number, clean_record(record)))
+        except ValueError as exc:
+            errors.append({'record': number, 'error': str(exc)})
+
+    taken = _taken(record for _, record in cleaned)
+    role_names = {name for _, record in cleaned for name in record['roles']}
+    role_ids = dict(
+        Role.objects.filter(name__in=role_names).values_list('name', 'pk')
+    )
+
+    accepted = []
+    for number, record in cleaned:
+        error = _duplicate_error(record, taken, seen)
+        unknown = [name for name in record['roles'] if name not in role_ids]
+        if error is None and unknown:
+            error = f'Unknown roles: {", ".join(unknown)}.'
+        if error is not None:
+            errors.append({'record': number, 'error': error})
+            continue
+        seen['username'].add(record['username'].upper())
+        seen['email'].add(record['email'].upper())
+        accepted.append((number, record))
+    if not accepted:
+        return 0
+
+    timeout = None
+    if deadline is not None:
+        timeout = max(0, deadline - time.monotonic())
+    encoded = hash_passwords(
+        (record['password'] for _, record in accepted), timeout=timeout,
+    )
+    accepted = [
+        (number, record, password)
+        for (number, record), password in zip(accepted, encoded)
+    ]
+    while True:
+        try:
+            return _create_users(accepted, role_ids)
+        except IntegrityError:
+            # A concurrent import or signup took some of the usernames or
+            # emails since they were checked; skip those and retry.
+            taken = _taken(record for _, record, _ in accepted)
+            remaining = []
+            for number, record, password in accepted:
+                error = _duplicate_error(record, taken)
+                if error is None:
+                    remaining.append((number, record, password))
+                else:
+                    errors.append({'record': number, 'error': error})
+            if len(remaining) == len(accepted):
+                raise
+            if not remaining:
+                return 0
+            accepted = remaining
+
+
+def _create_users(accepted, role_ids):
+    """Create users from (number, record, password) triples in one
+    transaction; return how many were created."""
+    with transaction.atomic():
+        users = User.objects.bulk_create(
+            User(
+                username=record['username'],
+                email=record['email'],
+                password=password,
+            )
+            for _, record, password in accepted
+        )
+        user_roles = UserRole.objects.bulk_create(
+            UserRole(user=user) for user in users
+        )
+        UserRole.roles.through.objects.bulk_create(
+            UserRole.roles.through(
+                userrole=user_role, role_id=role_ids[name],
+            )
+            for user_role, (_, record, _) in zip(user_roles, accepted)
+            for name in record['roles']
+        )
+        refresh_effective_permissions(user.pk for user in users)
+    return len(users)
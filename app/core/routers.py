@@ -0,0 +1,92 @@
+"""
+Database router sending opted-in reads to replicas.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def read_from_replicas():
+    """Route reads made inside the block to a replica, if any."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _pin_cache():
+    return caches[settings.REPLICA_PIN_CACHE_ALIAS]
+
+
+def _pin_key(resource):
+    return f'primary-pin:{resource}'
+
+
+def pin_to_primary(resources):
+    """Keep reads of the named resources on the primary while replicas
+    catch up with a write to them."""
+    if settings.DATABASE_REPLICAS and settings.REPLICA_PIN_SECONDS > 0:
+        _pin_cache().set_many(
+            {_pin_key(resource): True for resource in resources},
+            settings.REPLICA_PIN_SECONDS,
+        )
+
+
+def is_pinned_to_primary(resources):
+    """Return whether any of the resources was written recently enough to
+    be read from the primary."""
+    return bool(settings.DATABASE_REPLICAS) and bool(
+        _pin_cache().get_many([_pin_key(resource) for resource in resources])
+    )
+
+
+def check_pin_cache(app_configs, **kwargs):
+    """Require a cache shared by every process for pins when replicas are
+    configured, since a pin set by one process must route the others."""
+    if not settings.DATABASE_REPLICAS:
+        return []
+    alias = settings.REPLICA_PIN_CACHE_ALIAS
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHES:
+        return [checks.Error(
+            f'The {alias!r} cache holding replica pins is local to each '
+            'process, so other processes would read writes from lagging '
+            'replicas.',
+            hint='Point REPLICA_PIN_CACHE_ALIAS at a shared cache such as '
+                 'Redis.',
+            id='core.E001',
+        )]
+    return []
+
+
+class ReplicaRouter:
+    """Route reads inside read_from_replicas() to a random replica."""
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
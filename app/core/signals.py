@@ -0,0 +1,231 @@
+"""
+Signal handlers keeping the effective permission index and caches up to date.
+"""
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core.authorization import (
+    bump_versions,
+    refresh_effective_permissions,
+    refresh_role_permission_bits,
+    users_holding_roles,
+)
+from core.cache import (
+    invalidate_tokens,
+    permission_cache,
+    permission_index_cache,
+)
+from core.hierarchy import (
+    ensure_acyclic,
+    refresh_role_closure,
+    role_descendants,
+)
+from core.models import (
+    Permission,
+    RetiredPermissionBit,
+    Role,
+    User,
+    UserRole,
+)
+
+
+REFRESH_ACTIONS = ('post_add', 'post_remove', 'post_clear')
+
+
+def _affected_user_ids(instance, reverse, pk_set, through):
+    """Return the users whose effective permissions a change touches."""
+    if through is UserRole.roles.through:
+        if not reverse:
+            return {instance.user_id}
+        if pk_set is None:
+            return users_holding_roles([instance.pk])
+        return set(
+            UserRole.objects.filter(pk__in=pk_set)
+            .values_list('user_id', flat=True)
+        )
+
+    if not reverse:
+        return users_holding_roles([instance.pk])
+    if pk_set is None:
+        pk_set = instance.role_set.values_list('pk', flat=True)
+    return users_holding_roles(pk_set)
+
+
+@receiver(m2m_changed, sender=UserRole.roles.through)
+@receiver(m2m_changed, sender=Role.permissions.through)
+def refresh_on_membership_change(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    """Refresh effective permissions when roles or permissions change."""
+    if action == 'pre_clear' and reverse:
+        instance._affected_user_ids = _affected_user_ids(
+            instance, reverse, None, sender,
+        )
+        if sender is Role.permissions.through:
+            instance._affected_role_ids = set(
+                instance.role_set.values_list('pk', flat=True)
+            )
+        return
+    if action not in REFRESH_ACTIONS:
+        return
+    if action != 'post_clear' and not pk_set:
+        return
+
+    if action == 'post_clear' and reverse:
+        user_ids = instance.__dict__.pop('_affected_user_ids', set())
+    else:
+        user_ids = _affected_user_ids(instance, reverse, pk_set, sender)
+    if sender is Role.permissions.through:
+        if not reverse:
+            role_ids = {instance.pk}
+        elif pk_set is not None:
+            role_ids = pk_set
+        else:
+            role_ids = instance.__dict__.pop('_affected_role_ids', set())
+        bump_versions(Role.objects.filter(pk__in=role_ids))
+        refresh_role_permission_bits(role_ids)
+    refresh_effective_permissions(user_ids)
+
+
+@receiver(m2m_changed, sender=Role.parents.through)
+def refresh_on_hierarchy_change(sender, instance, action, reverse, pk_set,
+                                **kwargs):
+    """Reject cycles and refresh inherited permissions as parents change."""
+    if action == 'pre_add':
+        if reverse:
+            ensure_acyclic(pk_set, [instance.pk])
+        else:
+            ensure_acyclic([instance.pk], pk_set)
+        return
+    if action == 'pre_clear' and reverse:
+        instance._affected_role_ids = set(
+            instance.children.values_list('pk', flat=True)
+        )
+        return
+    if action not in REFRESH_ACTIONS:
+        return
+    if action != 'post_clear' and not pk_set:
+        return
+
+    if not reverse:
+        role_ids = {instance.pk}
+    elif pk_set is not None:
+        role_ids = pk_set
+    else:
+        role_ids = instance.__dict__.pop('_affected_role_ids', set())
+    bump_versions(Role.objects.filter(pk__in=role_ids))
+    affected = refresh_role_closure(role_ids)
+    refresh_role_permission_bits(affected)
+    refresh_effective_permissions(
+        UserRole.objects.filter(roles__in=affected)
+        .values_list('user_id', flat=True)
+    )
+
+
+@receiver(pre_delete, sender=Role)
+def collect_role_holders(sender, instance, **kwargs):
+    """Remember who held or inherited a role before it is deleted."""
+    instance._affected_user_ids = users_holding_roles([instance.pk])
+    instance._affected_role_ids = role_descendants([instance.pk])
+
+
+@receiver(post_delete, sender=Role)
+def refresh_on_role_delete(sender, instance, **kwargs):
+    """Refresh roles and users that held or inherited a deleted role."""
+    descendants = instance.__dict__.pop('_affected_role_ids', set())
+    bump_versions(Role.objects.filter(pk__in=descendants))
+    refresh_role_closure(descendants, descendants=descendants)
+    refresh_role_permission_bits(descendants)
+    refresh_effective_permissions(
+        instance.__dict__.pop('_affected_user_ids', set())
+    )
+
+
+@receiver(post_delete, sender=UserRole)
+def refresh_on_user_role_delete(sender, instance, **kwargs):
+    """Drop effective permissions of a user whose roles were removed."""
+    refresh_effective_permissions([instance.user_id])
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_save, sender=UserRole)
+def bump_on_save(sender, instance, created, **kwargs):
+    """Bump the version of a saved row in SQL, so a stale or partially
+    loaded instance cannot skip or overwrite the bump."""
+    if not created:
+        bump_versions(sender.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Role)
+def bump_on_role_save(sender, instance, created, **kwargs):
+    """Mark the role lists of a saved role's holders and children as
+    changed."""
+    if not created:
+        bump_versions(UserRole.objects.filter(roles=instance))
+        bump_versions(Role.objects.filter(parents=instance))
+
+
+@receiver(pre_delete, sender=Permission)
+def collect_permission_holders(sender, instance, **kwargs):
+    """Remember which roles and users held a permission being deleted."""
+    instance._affected_role_ids = set(
+        instance.role_set.values_list('pk', flat=True)
+    )
+    instance._affected_user_ids = set(
+        instance.effective_grants.values_list('user_id', flat=True)
+    )
+
+
+@receiver(pre_delete, sender=Permission)
+def retire_permission_bit(sender, instance, **kwargs):
+    """Hold the bit of a permission being deleted back from reuse."""
+    RetiredPermissionBit.objects.retire(instance.bit)
+
+
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_on_permission_change(sender, **kwargs):
+    """Drop cached checks when a permission is renamed or removed."""
+    permission_cache.clear()
+    permission_index_cache.clear()
+
+
+@receiver(post_save, sender=Permission)
+def bump_on_permission_save(sender, instance, created, **kwargs):
+    """Mark roles and users holding a renamed permission as changed."""
+    if not created:
+        bump_versions(Role.objects.filter(permissions=instance))
+        bump_versions(UserRole.objects.filter(
+            user__effective_permissions__permission=instance,
+        ))
+
+
+@receiver(post_delete, sender=Permission)
+def refresh_on_permission_delete(sender, instance, **kwargs):
+    """Refresh the roles and users that held a deleted permission."""
+    role_ids = instance.__dict__.pop('_affected_role_ids', set())
+    bump_versions(Role.objects.filter(pk__in=role_ids))
+    refresh_role_permission_bits(role_ids)
+    refresh_effective_permissions(
+        instance.__dict__.pop('_affected_user_ids', set())
+    )
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Stop accepting a deleted token from the cache."""
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Drop cached tokens so changes such as deactivation apply at once."""
+    if not created:
+        invalidate_tokens(
+            Token.objects.filter(user=instance).values_list('key', flat=True)
+        )
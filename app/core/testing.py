@@ -0,0 +1,56 @@
+"""
+Test helpers for creating users and holding API endpoints to query budgets.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.benchmark import seed_population
+
+
+def create_user(username='user', **params):
+    """Create and return a user with a username-based email."""
+    return get_user_model().objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='testpass123',
+        **params,
+    )
+
+
+class QueryBudgetMixin:
+    """TestCase mixin checking that requests stay within a query budget.
+
+    The request is made against a small and a large population and must
+    run the same number of queries, no more than the budget, at both.
+    Every user of a population holds every role, and every role holds
+    every permission.
+    """
+    budget_sizes = (2, 20)
+
+    def assertQueryBudget(self, budget, request, status_code=None):
+        """Call request(population) at each size and check its queries."""
+        counts = []
+        for size in self.budget_sizes:
+            population = seed_population(
+                size, size, size, size, size,
+                password=None,
+                prefix=f'budget{size}-',
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                response = request(population)
+            if status_code is not None:
+                self.assertEqual(response.status_code, status_code)
+            queries = '\n'.join(
+                query['sql'] for query in ctx.captured_queries
+            )
+            self.assertLessEqual(
+                len(ctx), budget,
+                f'{len(ctx)} queries at size {size}, budget is {budget}:\n'
+                f'{queries}',
+            )
+            counts.append(len(ctx))
+        self.assertEqual(
+            len(set(counts)), 1,
+            f'Query count grows with fixture size: {counts}',
+        )
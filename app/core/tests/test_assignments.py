@@ -0,0 +1,107 @@
+"""
+Tests for bulk role assignment.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.assignments import assign_roles
+from core.authorization import effective_permissions
+from core.models import Permission, Role, UserRole
+from core.testing import create_user
+
+
+def create_users(count, prefix='user'):
+    """Create and return users, each with a UserRole."""
+    users = [create_user(f'{prefix}{i}') for i in range(count)]
+    for user in users:
+        UserRole.objects.create(user=user)
+    return users
+
+
+class AssignRolesTests(TestCase):
+    """Test granting and revoking roles in bulk."""
+
+    def setUp(self):
+        self.read = Permission.objects.create(name='read')
+        self.write = Permission.objects.create(name='write')
+        self.reader = Role.objects.create(name='Reader')
+        self.reader.permissions.add(self.read)
+        self.writer = Role.objects.create(name='Writer')
+        self.writer.permissions.add(self.write)
+
+    def test_grant_and_revoke(self):
+        """Test roles are granted and revoked as a diff."""
+        users = create_users(3)
+        users[0].userrole.roles.add(self.reader, self.writer)
+        users[1].userrole.roles.add(self.writer)
+
+        summary = assign_roles(
+            get_user_model().objects.filter(pk__in=[u.pk for u in users]),
+            grant=[self.reader.pk],
+            revoke=[self.writer.pk],
+        )
+
+        self.assertEqual(summary, {'users': 3, 'granted': 2, 'revoked': 2})
+        for user in users:
+            self.assertEqual(
+                list(user.userrole.roles.all()), [self.reader],
+            )
+            self.assertEqual(
+                list(effective_permissions(user.pk)), [self.read],
+            )
+
+    def test_grant_creates_missing_user_roles(self):
+        """Test users without a UserRole get one."""
+        user = create_user('bare')
+
+        assign_roles(
+            get_user_model().objects.filter(pk=user.pk),
+            grant=[self.reader.pk],
+        )
+
+        self.assertEqual(list(user.userrole.roles.all()), [self.reader])
+
+    def test_revoke_by_role_filter(self):
+        """Test revoking a role from the users selected by holding it."""
+        users = create_users(2)
+        users[0].userrole.roles.add(self.reader)
+
+        summary = assign_roles(
+            get_user_model().objects.filter(userrole__roles=self.reader),
+            grant=[self.writer.pk],
+            revoke=[self.reader.pk],
+        )
+
+        self.assertEqual(summary, {'users': 1, 'granted': 1, 'revoked': 1})
+        self.assertEqual(
+            list(users[0].userrole.roles.all()), [self.writer],
+        )
+        self.assertFalse(users[1].userrole.roles.exists())
+
+    def test_overlapping_roles_rejected(self):
+        """Test granting and revoking the same role is an error."""
+        with self.assertRaises(ValueError):
+            assign_roles(
+                get_user_model().objects.all(),
+                grant=[self.reader.pk],
+                revoke=[self.reader.pk],
+            )
+
+    def test_query_count_independent_of_users(self):
+        """Test the number of queries does not grow with the users."""
+        small = create_users(2, prefix='small')
+        large = create_users(20, prefix='large')
+
+        def run(users):
+            with CaptureQueriesContext(connection) as queries:
+                assign_roles(
+                    get_user_model().objects.filter(
+                        pk__in=[user.pk for user in users],
+                    ),
+                    grant=[self.reader.pk],
+                )
+            return len(queries)
+
+        self.assertEqual(run(small), run(large))
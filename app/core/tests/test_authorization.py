@@ -0,0 +1,262 @@
+"""
+Tests for the effective permission index.
+"""
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.authorization import (
+    effective_permissions,
+    refresh_effective_permissions,
+    permission_set,
+    user_has_permissions,
+    user_permission_names,
+    user_permission_set,
+)
+from core.bitsets import PermissionSet
+from core.cache import permission_cache
+from core.models import Permission, Role, UserRole
+from core.testing import create_user
+
+
+def permission_names(user):
+    """Return the effective permission names of a user."""
+    return set(effective_permissions(user.id).values_list('name', flat=True))
+
+
+class EffectivePermissionTests(TestCase):
+    """Test maintaining the effective permission index."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.user_role = UserRole.objects.create(user=self.user)
+        self.read = Permission.objects.create(name='read')
+        self.write = Permission.objects.create(name='write')
+        self.reader = Role.objects.create(name='reader')
+        self.writer = Role.objects.create(name='writer')
+        self.reader.permissions.add(self.read)
+        self.writer.permissions.add(self.read, self.write)
+
+    def test_assigning_roles_grants_permissions(self):
+        """Test adding roles to a user indexes their permissions."""
+        self.user_role.roles.add(self.reader, self.writer)
+
+        self.assertEqual(permission_names(self.user), {'read', 'write'})
+        self.assertEqual(self.user.effective_permissions.count(), 2)
+
+    def test_removing_role_keeps_permissions_from_other_roles(self):
+        """Test permissions granted by another role survive removal."""
+        self.user_role.roles.add(self.reader, self.writer)
+
+        self.user_role.roles.remove(self.writer)
+
+        self.assertEqual(permission_names(self.user), {'read'})
+
+    def test_role_permission_changes_reach_holders(self):
+        """Test changing a role's permissions updates its holders."""
+        other = create_user('other')
+        UserRole.objects.create(user=other).roles.add(self.reader)
+        self.user_role.roles.add(self.reader)
+
+        self.reader.permissions.add(self.write)
+        self.assertEqual(permission_names(self.user), {'read', 'write'})
+        self.assertEqual(permission_names(other), {'read', 'write'})
+
+        self.reader.permissions.clear()
+        self.assertEqual(permission_names(self.user), set())
+        self.assertEqual(permission_names(other), set())
+
+    def test_reverse_clear_updates_holders(self):
+        """Test clearing a permission from every role updates holders."""
+        self.user_role.roles.add(self.writer)
+
+        self.write.role_set.clear()
+
+        self.assertEqual(permission_names(self.user), {'read'})
+
+    def test_deleting_role_revokes_permissions(self):
+        """Test deleting a role removes the permissions it granted."""
+        self.user_role.roles.add(self.writer)
+
+        self.writer.delete()
+
+        self.assertEqual(permission_names(self.user), set())
+
+
+class VersionTests(TestCase):
+    """Test version counters used for conditional reads."""
+
+    def setUp(self):
+        self.user = create_user()
+        self.user_role = UserRole.objects.create(user=self.user)
+        self.read = Permission.objects.create(name='read')
+        self.role = Role.objects.create(name='reader')
+        self.other_role = Role.objects.create(name='other')
+
+    def versions(self):
+        """Return the current user role and role versions."""
+        self.user_role.refresh_from_db()
+        self.role.refresh_from_db()
+        return self.user_role.version, self.role.version
+
+    def test_user_role_changes_bump_user_version(self):
+        """Test changing a user's roles bumps only their version."""
+        self.user_role.roles.add(self.role)
+
+        self.assertEqual(self.versions(), (2, 1))
+
+    def test_role_permission_changes_bump_role_and_holders(self):
+        """Test changing role permissions bumps the role and its holders."""
+        self.user_role.roles.add(self.role)
+
+        self.role.permissions.add(self.read)
+
+        self.assertEqual(self.versions(), (3, 2))
+        self.other_role.refresh_from_db()
+        self.assertEqual(self.other_role.version, 1)
+
+    def test_reverse_clear_bumps_roles(self):
+        """Test clearing a permission's roles bumps those roles."""
+        self.role.permissions.add(self.read)
+
+        self.read.role_set.clear()
+
+        self.assertEqual(self.versions()[1], 3)
+
+    def test_rename_bumps_versions(self):
+        """Test renaming roles and permissions bumps their dependents."""
+        self.role.permissions.add(self.read)
+        self.user_role.roles.add(self.role)
+        before = self.versions()
+
+        self.read.name = 'view'
+        self.read.save()
+        self.role.name = 'viewer'
+        self.role.save()
+
+        after = self.versions()
+        self.assertEqual(after, (before[0] + 2, before[1] + 2))
+
+    def test_permission_delete_bumps_versions(self):
+        """Test deleting a permission bumps roles and users holding it."""
+        self.role.permissions.add(self.read)
+        self.user_role.roles.add(self.role)
+        before = self.versions()
+
+        self.read.delete()
+
+        self.assertEqual(self.versions(), (before[0] + 1, before[1] + 1))
+
+
+class PermissionBitsTests(TestCase):
+    """Test the permission bits kept for users and roles."""
+
+    def setUp(self):
+        permission_cache.clear()
+        self.user = create_user()
+        self.user_role = UserRole.objects.create(user=self.user)
+        self.read = Permission.objects.create(name='read')
+        self.write = Permission.objects.create(name='write')
+        self.reader = Role.objects.create(name='reader')
+        self.editor = Role.objects.create(name='editor')
+        self.reader.permissions.add(self.read)
+        self.editor.permissions.add(self.write)
+        self.editor.parents.add(self.reader)
+
+    def bits(self, obj):
+        """Return the stored permission bits of a user role or role."""
+        obj.refresh_from_db()
+        return set(obj.permission_set)
+
+    def test_role_bits_include_inherited_permissions(self):
+        """Test a role's bits cover its own and inherited permissions."""
+        self.assertEqual(self.bits(self.reader), {self.read.bit})
+        self.assertEqual(self.bits(self.editor),
+                         {self.read.bit, self.write.bit})
+
+        self.editor.parents.remove(self.reader)
+
+        self.assertEqual(self.bits(self.editor), {self.write.bit})
+
+    def test_user_bits_follow_roles(self):
+        """Test a user's bits track the permissions of their roles."""
+        self.user_role.roles.add(self.editor)
+        self.assertEqual(self.bits(self.user_role),
+                         {self.read.bit, self.write.bit})
+
+        self.reader.permissions.remove(self.read)
+
+        self.assertEqual(self.bits(self.user_role), {self.write.bit})
+        self.assertEqual(self.bits(self.editor), {self.write.bit})
+
+    def test_permission_delete_clears_bits(self):
+        """Test deleting a permission drops its bit everywhere."""
+        self.user_role.roles.add(self.editor)
+
+        self.read.delete()
+
+        self.assertEqual(self.bits(self.user_role), {self.write.bit})
+        self.assertEqual(self.bits(self.reader), set())
+
+    def test_bits_are_dense(self):
+        """Test new permissions take the lowest free bit, and a deleted
+        permission's bit is free again only after the reuse delay."""
+        self.assertEqual([self.read.bit, self.write.bit], [0, 1])
+
+        self.read.delete()
+
+        self.assertEqual(Permission.objects.create(name='new').bit, 2)
+        with override_settings(PERMISSION_BIT_REUSE_DELAY=0):
+            self.assertEqual(Permission.objects.create(name='newer').bit, 0)
+
+    def test_checks_use_bits(self):
+        """Test checks and names are answered from the user's bits."""
+        self.user_role.roles.add(self.reader)
+
+        self.assertEqual(user_permission_set(self.user.id),
+                         PermissionSet.from_positions([self.read.bit]))
+        self.assertEqual(user_permission_names(self.user.id), {'read'})
+        self.assertTrue(user_has_permissions(self.user.id, ['read']))
+        self.assertFalse(user_has_permissions(self.user.id, ['write']))
+        self.assertFalse(user_has_permissions(self.user.id, ['missing']))
+        self.assertEqual(permission_set(['read', 'write']),
+                         PermissionSet.from_positions([self.read.bit,
+                                                       self.write.bit]))
+
+    def test_stale_save_keeps_bits(self):
+        """Test saving an instance loaded before a change keeps new bits."""
+        stale_user_role = UserRole.objects.get(pk=self.user_role.pk)
+        stale_role = Role.objects.get(pk=self.editor.pk)
+        self.user_role.roles.add(self.editor)
+        self.editor.parents.remove(self.reader)
+
+        stale_user_role.save()
+        stale_role.save()
+
+        self.assertEqual(self.bits(self.user_role), {self.write.bit})
+        self.assertEqual(self.bits(self.editor), {self.write.bit})
+
+    @mock.patch('core.authorization.PERMISSION_BITS_BATCH_SIZE', 2)
+    def test_bits_written_in_bounded_batches(self):
+        """Test bits for many users are written a fixed batch at a time."""
+        users = [create_user(f'user{index}') for index in range(5)]
+        for user in users[:3]:
+            UserRole.objects.create(user=user).roles.add(self.reader)
+        for user in users[3:]:
+            UserRole.objects.create(user=user).roles.add(self.editor)
+
+        with CaptureQueriesContext(connection) as queries:
+            refresh_effective_permissions(user.pk for user in users)
+
+        updates = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('UPDATE "core_userrole"')
+        ]
+        self.assertEqual(len(updates), 3)
+        for user in users[:3]:
+            self.assertEqual(self.bits(user.userrole), {self.read.bit})
+        for user in users[3:]:
+            self.assertEqual(self.bits(user.userrole),
+                             {self.read.bit, self.write.bit})
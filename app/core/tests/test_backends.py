@@ -0,0 +1,100 @@
+"""
+Tests for the authentication backends.
+"""
+from django.contrib.auth import authenticate, get_user_model
+from django.test import TestCase, override_settings
+
+
+class EmailOrUsernameBackendTests(TestCase):
+    """Test authenticating with an email or a username."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='test',
+            email='test@example.com',
+            password='testpass123',
+        )
+
+    def test_authenticate_with_email_or_username(self):
+        """Test both the email and the username authenticate."""
+        for login in ['test@example.com', 'test', 'TEST@example.com']:
+            with self.subTest(login=login), self.assertNumQueries(1):
+                user = authenticate(username=login, password='testpass123')
+            self.assertEqual(user, self.user)
+
+    def test_wrong_password(self):
+        """Test a wrong password does not authenticate."""
+        self.assertIsNone(authenticate(username='test', password='wrong'))
+
+    def test_unknown_login(self):
+        """Test an unknown login does not authenticate."""
+        self.assertIsNone(
+            authenticate(username='missing', password='testpass123')
+        )
+
+    def test_exact_match_preferred(self):
+        """Test an exact username match wins over a case-insensitive one."""
+        other = get_user_model().objects.create_user(
+            username='Test',
+            email='other@example.com',
+            password='otherpass123',
+        )
+
+        user = authenticate(username='Test', password='otherpass123')
+
+        self.assertEqual(user, other)
+
+    def test_email_match_preferred_over_username(self):
+        """Test a login that is one user's email and another's username
+        resolves to the email owner."""
+        get_user_model().objects.create_user(
+            username='shared@example.com',
+            email='squatter@example.com',
+            password='squatpass123',
+        )
+        owner = get_user_model().objects.create_user(
+            username='owner',
+            email='shared@example.com',
+            password='ownerpass123',
+        )
+
+        for login in ['shared@example.com', 'SHARED@example.com']:
+            with self.subTest(login=login):
+                self.assertEqual(
+                    authenticate(username=login, password='ownerpass123'),
+                    owner,
+                )
+                self.assertIsNone(
+                    authenticate(username=login, password='squatpass123')
+                )
+
+    def test_inactive_user(self):
+        """Test inactive users cannot authenticate."""
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertIsNone(
+            authenticate(username='test', password='testpass123')
+        )
+
+    @override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+    def test_outdated_hash_rehashed_on_login(self):
+        """Test logging in upgrades a hash made with an older cost."""
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$600000$'))
+
+        authenticate(username='test', password='testpass123')
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+    @override_settings(PASSWORD_HASHERS=[
+        'core.hashers.TunedScryptPasswordHasher',
+        'core.hashers.TunedPBKDF2PasswordHasher',
+    ], PASSWORD_SCRYPT_WORK_FACTOR=2 ** 10)
+    def test_hash_upgraded_to_preferred_hasher(self):
+        """Test logging in moves a hash to the preferred hasher."""
+        authenticate(username='test', password='testpass123')
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('scrypt$1024$'))
+        self.assertTrue(self.user.check_password('testpass123'))
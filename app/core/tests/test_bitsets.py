@@ -0,0 +1,51 @@
+"""
+Tests for permission sets.
+"""
+from django.test import SimpleTestCase
+
+from core.bitsets import PermissionSet
+
+
+class PermissionSetTests(SimpleTestCase):
+    """Test the bitmap permission set."""
+
+    def test_membership(self):
+        """Test positions are tested by their bits."""
+        permissions = PermissionSet.from_positions([1, 5, 200])
+
+        self.assertIn(5, permissions)
+        self.assertIn(200, permissions)
+        self.assertNotIn(2, permissions)
+        self.assertNotIn(-1, permissions)
+        self.assertEqual(permissions.positions(), [1, 5, 200])
+        self.assertEqual(len(permissions), 3)
+
+    def test_set_operations(self):
+        """Test union, intersection, difference and subsets."""
+        a = PermissionSet.from_positions([1, 2, 3])
+        b = PermissionSet.from_positions([3, 4])
+
+        self.assertEqual((a | b).positions(), [1, 2, 3, 4])
+        self.assertEqual((a & b).positions(), [3])
+        self.assertEqual((a - b).positions(), [1, 2])
+        self.assertTrue(PermissionSet.from_positions([1, 3]) <= a)
+        self.assertFalse(b <= a)
+        self.assertTrue(PermissionSet() <= b)
+
+    def test_encoding_round_trips(self):
+        """Test sets survive bytes and text encodings."""
+        for positions in ([], [1], [7, 8, 64, 1000]):
+            permissions = PermissionSet.from_positions(positions)
+
+            self.assertEqual(
+                PermissionSet.from_bytes(permissions.to_bytes()), permissions,
+            )
+            self.assertEqual(
+                PermissionSet.decode(permissions.encode()), permissions,
+            )
+        self.assertEqual(PermissionSet().to_bytes(), b'')
+
+    def test_decode_rejects_invalid_text(self):
+        """Test text that is not encoded bits raises ValueError."""
+        with self.assertRaises(ValueError):
+            PermissionSet.decode('a')
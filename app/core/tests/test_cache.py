@@ -0,0 +1,122 @@
+"""
+Tests for the in-process caches.
+"""
+from django.test import SimpleTestCase, TestCase
+from django.contrib.auth import get_user_model
+
+from core.authorization import user_has_permission
+from core.cache import LRUCache, permission_cache
+from core.models import Permission, Role, UserRole
+
+
+class FakeTimer:
+    """Manually advanced clock."""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class LRUCacheTests(SimpleTestCase):
+    """Test the LRU cache."""
+
+    def test_get_and_set(self):
+        """Test cached values are returned and counted as hits."""
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_least_recently_used_is_evicted(self):
+        """Test the least recently used entry is evicted when full."""
+        cache = LRUCache(max_size=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_entries_expire(self):
+        """Test entries older than the TTL are treated as misses."""
+        timer = FakeTimer()
+        cache = LRUCache(max_size=2, ttl=10, timer=timer)
+        cache.set('a', 1)
+
+        timer.now = 11
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_entry_timeout_overrides_ttl(self):
+        """Test a per-entry timeout replaces the cache TTL."""
+        timer = FakeTimer()
+        cache = LRUCache(max_size=2, ttl=10, timer=timer)
+        cache.set('a', 1, timeout=2)
+        cache.set('b', 2)
+
+        timer.now = 3
+
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('b'), 2)
+
+
+class PermissionCacheTests(TestCase):
+    """Test cached permission checks."""
+
+    def setUp(self):
+        permission_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='user',
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.user_role = UserRole.objects.create(user=self.user)
+        self.role = Role.objects.create(name='reader')
+        self.permission = Permission.objects.create(name='read')
+        self.role.permissions.add(self.permission)
+
+    def test_repeated_checks_hit_cache(self):
+        """Test a repeated check is answered without a query."""
+        self.user_role.roles.add(self.role)
+        self.assertTrue(user_has_permission(self.user.id, 'read'))
+
+        with self.assertNumQueries(0):
+            self.assertTrue(user_has_permission(self.user.id, 'read'))
+            self.assertFalse(user_has_permission(self.user.id, 'write'))
+
+    def test_role_assignment_invalidates(self):
+        """Test assigning a role invalidates the user's cached checks."""
+        self.assertFalse(user_has_permission(self.user.id, 'read'))
+
+        self.user_role.roles.add(self.role)
+
+        self.assertTrue(user_has_permission(self.user.id, 'read'))
+
+    def test_role_permission_change_invalidates(self):
+        """Test changing a role's permissions invalidates its holders."""
+        self.user_role.roles.add(self.role)
+        self.assertTrue(user_has_permission(self.user.id, 'read'))
+
+        self.role.permissions.remove(self.permission)
+
+        self.assertFalse(user_has_permission(self.user.id, 'read'))
+
+    def test_permission_rename_invalidates(self):
+        """Test renaming a permission invalidates cached checks."""
+        self.user_role.roles.add(self.role)
+        self.assertTrue(user_has_permission(self.user.id, 'read'))
+
+        self.permission.name = 'view'
+        self.permission.save()
+
+        self.assertFalse(user_has_permission(self.user.id, 'read'))
+        self.assertTrue(user_has_permission(self.user.id, 'view'))
@@ -1,13 +1,25 @@
 """
 Test custom Django management commads.
 """
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.management.commands.benchmark_api import (
+    ENDPOINTS,
+    Command as BenchmarkApiCommand,
+)
+from core.models import Role
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -32,3 +44,128 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+        self.assertEqual(
+            [call.args[0] for call in patched_sleep.call_args_list],
+            [0.5, 1, 2, 4, 5],
+        )
+
+    @patch('time.monotonic')
+    @patch('time.sleep')
+    def test_wait_for_db_timeout(self, patched_sleep, patched_monotonic,
+                                 patched_check):
+        """Test giving up once the timeout has passed."""
+        patched_check.side_effect = OperationalError
+        patched_monotonic.side_effect = [0, 1, 2, 11]
+
+        with self.assertRaises(CommandError):
+            call_command('wait_for_db', '--timeout=10', stdout=StringIO())
+
+        self.assertEqual(patched_check.call_count, 3)
+
+
+class BenchmarkHashersTests(SimpleTestCase):
+    """Test the hasher benchmark command."""
+
+    def test_benchmark_hashers_json(self):
+        """Test the benchmark reports throughput per configuration."""
+        out = StringIO()
+
+        call_command(
+            'benchmark_hashers',
+            '--rounds=2',
+            '--pbkdf2-iterations=1000',
+            '--scrypt-work-factors=2',
+            '--argon2-memory-costs=8',
+            '--json',
+            stdout=out,
+            stderr=StringIO(),
+        )
+
+        results = json.loads(out.getvalue())
+        self.assertEqual(results[0]['hasher'], 'pbkdf2 iterations=1000')
+        self.assertEqual(results[1]['hasher'], 'scrypt work_factor=2')
+        self.assertGreater(results[0]['logins_per_sec_per_core'], 0)
+
+
+class ImportUsersTests(TestCase):
+    """Test importing users from files."""
+
+    def import_file(self, suffix, content):
+        """Write content to a temporary file and import it."""
+        with tempfile.NamedTemporaryFile(
+            'w', suffix=suffix, delete=False,
+        ) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_users', file.name, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_csv(self):
+        """Test importing users and roles from CSV."""
+        Role.objects.create(name='Admin')
+        Role.objects.create(name='Editor')
+
+        stdout, stderr = self.import_file('.csv', (
+            'username,email,password,roles\n'
+            'ann,ann@example.com,secret123,Admin;Editor\n'
+            'bob,bob@example.com,,\n'
+        ))
+
+        self.assertIn('Created 2 users, skipped 0.', stdout)
+        ann = get_user_model().objects.get(username='ann')
+        self.assertEqual(
+            sorted(ann.userrole.roles.values_list('name', flat=True)),
+            ['Admin', 'Editor'],
+        )
+
+    def test_import_jsonl_reports_errors(self):
+        """Test skipped JSON Lines records are reported."""
+        stdout, stderr = self.import_file('.jsonl', (
+            '{"username": "ann", "email": "ann@example.com"}\n'
+            '\n'
+            '{"username": "ann", "email": "other@example.com"}\n'
+        ))
+
+        self.assertIn('Created 1 users, skipped 1.', stdout)
+        self.assertIn('Record 2:', stderr)
+
+    def test_unknown_format(self):
+        """Test a file without a known extension needs --format."""
+        with self.assertRaises(CommandError):
+            call_command('import_users', 'users.txt')
+
+
+@override_settings(PASSWORD_HASHERS=[
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+])
+class BenchmarkApiTests(TestCase):
+    """Test the API benchmark command."""
+
+    def test_run_population(self):
+        """Test each endpoint reports latency and query counts."""
+        command = BenchmarkApiCommand()
+        parser = command.create_parser('manage.py', 'benchmark_api')
+        options = vars(parser.parse_args([
+            '--roles=3',
+            '--permissions=5',
+            '--roles-per-user=2',
+            '--permissions-per-role=2',
+            '--requests=2',
+            '--login-requests=1',
+        ]))
+
+        results = command.run_population(5, options)
+
+        self.assertEqual(
+            [result['endpoint'] for result in results], ENDPOINTS,
+        )
+        for result in results:
+            self.assertEqual(result['users'], 5)
+            self.assertGreater(result['queries_max'], 0)
+            self.assertGreater(result['p95_ms'], 0)
+
+    def test_unknown_endpoint(self):
+        """Test unknown endpoint names are rejected."""
+        with self.assertRaises(CommandError):
+            call_command('benchmark_api', '--endpoints=login,missing')
@@ -0,0 +1,132 @@
+"""
+Tests for password hashing on a worker pool.
+"""
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.hashing import HashingPool, PoolSaturated, hash_password
+
+
+class HashingPoolTests(SimpleTestCase):
+    """Test the bounded hashing pool."""
+
+    def test_thread_pool_runs_hashing(self):
+        """Test hashes made on the pool verify."""
+        pool = HashingPool('thread', workers=2, max_pending=2, timeout=10)
+
+        encoded = pool.run(hash_password, 'testpass123')
+
+        self.assertTrue(pool.run(check_password, 'testpass123', encoded))
+
+    def test_saturated_pool_rejects_work(self):
+        """Test work beyond the pending limit is rejected."""
+        pool = HashingPool('thread', workers=1, max_pending=1, timeout=10)
+        started = threading.Event()
+        release = threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        worker = threading.Thread(target=pool.run, args=(block,))
+        worker.start()
+        started.wait(5)
+        try:
+            with self.assertRaises(PoolSaturated):
+                pool.run(hash_password, 'testpass123')
+        finally:
+            release.set()
+            worker.join()
+
+        self.assertTrue(pool.run(lambda: True))
+
+    def test_timed_out_work_is_cancelled(self):
+        """Test queued work is dropped once its caller times out."""
+        pool = HashingPool('thread', workers=1, max_pending=2, timeout=0.1)
+        release = threading.Event()
+        calls = []
+
+        def block():
+            calls.append(1)
+            release.wait(5)
+
+        for _ in range(4):
+            with self.assertRaises(PoolSaturated):
+                pool.run(block)
+        release.set()
+        pool._get_executor().shutdown(wait=True)
+
+        self.assertEqual(len(calls), 1)
+
+    def test_map_takes_slots_and_times_out(self):
+        """Test batches wait for pending slots and give up, cancelling
+        their queued work, once their timeout passes."""
+        pool = HashingPool('thread', workers=1, max_pending=3, timeout=10)
+        release = threading.Event()
+        calls = []
+
+        def block(item):
+            calls.append(item)
+            release.wait(5)
+
+        with self.assertRaises(PoolSaturated):
+            pool.map(block, range(3), timeout=0.1)
+        with self.assertRaises(PoolSaturated):
+            pool.map(block, range(4), timeout=0.1)
+        release.set()
+
+        self.assertEqual(pool.map(str, range(3)), ['0', '1', '2'])
+        self.assertEqual(calls, [0])
+
+    def test_inline_map_runs_in_caller(self):
+        """Test inline pools hash batches in the calling thread."""
+        pool = HashingPool('inline', workers=1, max_pending=1, timeout=10)
+
+        threads = pool.map(lambda item: threading.current_thread(), [1, 2])
+
+        self.assertEqual(threads, [threading.current_thread()] * 2)
+
+
+class HashingPoolApiTests(TestCase):
+    """Test API behaviour when the hashing pool is saturated."""
+
+    def test_login_returns_503_when_saturated(self):
+        """Test login asks clients to retry when the pool is full."""
+        get_user_model().objects.create_user(
+            username='test',
+            email='test@example.com',
+            password='testpass123',
+        )
+        payload = {'username': 'test', 'password': 'testpass123'}
+
+        with patch('core.hashing.hashing_pool.run',
+                   side_effect=PoolSaturated):
+            res = APIClient().post(reverse('user:token'), payload)
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(res['Retry-After'], '1')
+
+    def test_bulk_create_returns_503_when_hashing_times_out(self):
+        """Test imports whose hashing runs out of time ask to retry."""
+        admin = get_user_model().objects.create_superuser(
+            'admin', 'admin@example.com', 'testpass123',
+        )
+        client = APIClient()
+        client.force_authenticate(admin)
+        payload = {'users': [{'username': 'ann', 'email': 'ann@example.com',
+                              'password': 'secret123'}]}
+
+        with patch('core.hashing.batch_hashing_pool.map',
+                   side_effect=PoolSaturated):
+            res = client.post(reverse('user:bulk-create'), payload,
+                              format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
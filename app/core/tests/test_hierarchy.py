@@ -0,0 +1,142 @@
+"""
+Tests for role inheritance.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.authorization import effective_permissions
+from core.hierarchy import ensure_acyclic, refresh_role_closure
+from core.models import Permission, Role, RoleClosure, UserRole
+
+
+def ancestor_names(role):
+    """Return the names of every role a role inherits from."""
+    return set(
+        RoleClosure.objects.filter(descendant=role)
+        .values_list('ancestor__name', flat=True)
+    )
+
+
+class RoleHierarchyTests(TestCase):
+    """Test the role closure and inherited permissions."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username='user',
+            email='user@example.com',
+            password='testpass123',
+        )
+        self.admin = Role.objects.create(name='admin')
+        self.editor = Role.objects.create(name='editor')
+        self.viewer = Role.objects.create(name='viewer')
+        self.admin.parents.add(self.editor)
+        self.editor.parents.add(self.viewer)
+        self.read = Permission.objects.create(name='read')
+        self.viewer.permissions.add(self.read)
+        self.user_role = UserRole.objects.create(user=self.user)
+        self.user_role.roles.add(self.admin)
+
+    def permission_names(self):
+        return set(
+            effective_permissions(self.user.id)
+            .values_list('name', flat=True)
+        )
+
+    def test_closure_spans_every_level(self):
+        """Test a role's closure holds its transitive ancestors."""
+        self.assertEqual(ancestor_names(self.admin), {'editor', 'viewer'})
+        self.assertEqual(ancestor_names(self.editor), {'viewer'})
+        self.assertEqual(ancestor_names(self.viewer), set())
+
+    def test_permissions_inherited_from_ancestors(self):
+        """Test holders of a role get permissions of its ancestors."""
+        self.assertEqual(self.permission_names(), {'read'})
+
+        self.viewer.permissions.add(Permission.objects.create(name='list'))
+
+        self.assertEqual(self.permission_names(), {'read', 'list'})
+
+    def test_removing_parent_drops_inherited_permissions(self):
+        """Test removing a parent updates descendants and holders."""
+        self.editor.parents.remove(self.viewer)
+
+        self.assertEqual(ancestor_names(self.admin), {'editor'})
+        self.assertEqual(self.permission_names(), set())
+
+    def test_reverse_changes_refresh_closure(self):
+        """Test changes made from the parent side refresh the closure."""
+        self.viewer.children.clear()
+
+        self.assertEqual(ancestor_names(self.admin), {'editor'})
+        self.assertEqual(self.permission_names(), set())
+
+    def test_cycles_rejected(self):
+        """Test a role cannot inherit from itself or a descendant."""
+        for manager, role in (
+            (self.viewer.parents, self.admin),
+            (self.admin.children, self.viewer),
+            (self.viewer.parents, self.viewer),
+        ):
+            with self.assertRaises(ValidationError), transaction.atomic():
+                manager.add(role)
+
+        self.assertFalse(self.viewer.parents.exists())
+
+    def test_deleting_middle_role_repairs_closure(self):
+        """Test deleting a role drops it from its descendants' closure."""
+        self.editor.delete()
+
+        self.assertEqual(ancestor_names(self.admin), set())
+        self.assertEqual(self.permission_names(), set())
+
+    def test_refresh_rebuilds_missing_rows(self):
+        """Test refreshing recomputes the closure from parent links."""
+        RoleClosure.objects.all().delete()
+
+        affected = refresh_role_closure([self.viewer.pk, self.editor.pk,
+                                         self.admin.pk])
+
+        self.assertEqual(affected, {self.viewer.pk, self.editor.pk,
+                                    self.admin.pk})
+        self.assertEqual(ancestor_names(self.admin), {'editor', 'viewer'})
+
+    def test_cycle_check_locks_roles_linked_through_closure(self):
+        """Test the cycle check locks every role a new link connects."""
+        other = Role.objects.create(name='other')
+        child = Role.objects.create(name='child')
+        child.parents.add(other)
+
+        with patch('core.hierarchy.lock_roles') as lock_roles:
+            ensure_acyclic([other.pk], [self.editor.pk])
+
+        lock_roles.assert_called_once_with({
+            other.pk, child.pk, self.editor.pk, self.viewer.pk,
+        })
+
+    def test_refresh_reads_only_affected_parent_links(self):
+        """Test refreshing ignores parent links of unrelated roles."""
+        unrelated = Role.objects.create(name='unrelated')
+        unrelated.parents.add(Role.objects.create(name='base'))
+        auditor = Role.objects.create(name='auditor')
+        auditor.parents.add(Role.objects.create(name='reader'))
+        links = Role.parents.through._meta.db_table
+
+        with CaptureQueriesContext(connection) as queries:
+            self.editor.parents.add(auditor)
+
+        link_reads = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and links in query['sql']
+        ]
+        self.assertTrue(link_reads)
+        for sql in link_reads:
+            self.assertIn('WHERE', sql)
+        self.assertEqual(
+            ancestor_names(self.admin),
+            {'editor', 'viewer', 'auditor', 'reader'},
+        )
@@ -0,0 +1,171 @@
+"""
+Tests for request metrics.
+"""
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.cache import LRUCache
+from core.metrics import MetricsRegistry, RequestStats, registry
+from core.models import Permission, Role, UserRole
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    """Test aggregating and exporting metrics."""
+
+    def test_render_prometheus_text(self):
+        """Test totals, histogram buckets and cache stats are exported."""
+        metrics = MetricsRegistry(buckets=(0.1, 1), prefix='test-metrics')
+        metrics.clear()
+        stats = RequestStats()
+        stats.queries = 3
+        stats.db_time = 0.02
+        metrics.record('RoleViewSet.list', stats, 0.5)
+        metrics.record('RoleViewSet.list', stats, 0.05)
+        cache = LRUCache(max_size=10, ttl=60)
+        cache.get('missing')
+
+        text = metrics.render({'permission': cache})
+
+        self.assertIn('http_requests_total{view="RoleViewSet.list"} 2', text)
+        self.assertIn(
+            'http_request_queries_total{view="RoleViewSet.list"} 6', text,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_bucket'
+            '{view="RoleViewSet.list",le="0.1"} 1',
+            text,
+        )
+        self.assertIn(
+            'http_request_duration_seconds_bucket'
+            '{view="RoleViewSet.list",le="1"} 2',
+            text,
+        )
+        self.assertIn('cache_misses_total{cache="permission"} 1', text)
+
+    def test_totals_shared_across_processes(self):
+        """Test a snapshot sums the totals flushed by every process."""
+        workers = [
+            MetricsRegistry(prefix='test-metrics', flush_interval=60)
+            for _ in range(2)
+        ]
+        workers[0].clear()
+        stats = RequestStats()
+        stats.queries = 2
+        stats.db_time = 0.25
+        for worker in workers:
+            worker.record('RoleViewSet.list', stats, 0.5)
+
+        workers[1].flush()
+        self.assertEqual(
+            workers[1].snapshot()['RoleViewSet.list']['requests'], 1,
+        )
+        totals = workers[0].snapshot()['RoleViewSet.list']
+
+        self.assertEqual(totals['requests'], 2)
+        self.assertEqual(totals['queries'], 4)
+        self.assertEqual(totals['db_seconds'], 0.5)
+        self.assertEqual(totals['duration_seconds'], 1.0)
+
+    def test_flushes_after_interval(self):
+        """Test recording adds totals to the cache once the interval ends."""
+        worker = MetricsRegistry(prefix='test-metrics', flush_interval=0)
+        worker.clear()
+        reader = MetricsRegistry(prefix='test-metrics')
+
+        worker.record('RoleViewSet.list', RequestStats(), 0.5)
+
+        self.assertEqual(
+            reader.snapshot()['RoleViewSet.list']['requests'], 1,
+        )
+
+
+class RequestMetricsMiddlewareTests(TestCase):
+    """Test recording metrics per view."""
+
+    def setUp(self):
+        registry.clear()
+        self.user = get_user_model().objects.create_user(
+            username='test',
+            email='test@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        role = Role.objects.create(name='reader')
+        role.permissions.add(Permission.objects.create(name='read'))
+        UserRole.objects.create(user=self.user).roles.add(role)
+
+    def test_records_view_action(self):
+        """Test queries and render time are recorded per view action."""
+        self.client.get(reverse('user:role-list'))
+        self.client.get(reverse('user:user-permissions',
+                                args=[self.user.pk]))
+
+        views = registry.snapshot()
+        self.assertEqual(views['RoleViewSet.list']['requests'], 1)
+        self.assertEqual(views['RoleViewSet.list']['queries'], 3)
+        self.assertGreater(views['RoleViewSet.list']['render_seconds'], 0)
+        self.assertIn('ManageUserView.permissions', views)
+
+    @override_settings(METRICS_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        """Test timings are sent back when enabled."""
+        res = self.client.get(reverse('user:role-list'))
+
+        self.assertIn('db;dur=', res['Server-Timing'])
+        self.assertIn('desc="3 queries"', res['Server-Timing'])
+
+    def test_no_server_timing_by_default(self):
+        """Test the Server-Timing header is off by default."""
+        res = self.client.get(reverse('user:role-list'))
+
+        self.assertNotIn('Server-Timing', res)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint(self):
+        """Test the metrics endpoint exports recorded views."""
+        self.client.get(reverse('user:role-list'))
+
+        res = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret',
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(
+            b'http_requests_total{view="RoleViewSet.list"} 1', res.content,
+        )
+        self.assertIn(b'cache_size{cache="token"}', res.content)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_token(self):
+        """Test the metrics endpoint requires the bearer token."""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        res = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong',
+        )
+
+        self.assertEqual(res.status_code, 403)
+
+    def test_metrics_endpoint_denied_without_token(self):
+        """Test the metrics endpoint is closed when no token is set."""
+        res = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer ',
+        )
+
+        self.assertEqual(res.status_code, 403)
+
+    async def test_records_async_view_queries(self):
+        """Test queries made by async views are counted."""
+        token = await Token.objects.acreate(user=self.user)
+
+        await self.async_client.get(
+            reverse('user:async-user-roles', args=[self.user.pk]),
+            headers={'AUTHORIZATION': f'Token {token.key}'},
+        )
+
+        totals = registry.snapshot()['user.async_views.user_roles']
+        self.assertGreater(totals['queries'], 0)
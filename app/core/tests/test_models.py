@@ -1,9 +1,14 @@
 """
 Tests for models.
 """
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 
+from core.authorization import permission_index
+from core.cache import permission_cache
+from core.models import Permission, Role, UserRole
+
 
 class ModelTests(TestCase):
     """Test models."""
@@ -56,3 +61,33 @@ class ModelTests(TestCase):
 
         self.assertTrue(user.is_superuser)
         self.assertTrue(user.is_staff)
+
+    def test_has_role_permission(self):
+        """Test checking role permissions with a single query per user."""
+        permission_cache.clear()
+        user = get_user_model().objects.create_user(
+            'test', 'test@example.com', 'test123')
+        role = Role.objects.create(name='reader')
+        role.permissions.add(Permission.objects.create(name='read'))
+        UserRole.objects.create(user=user).roles.add(role)
+        permission_index()
+
+        with self.assertNumQueries(1):
+            self.assertTrue(user.has_role_permission('read'))
+            self.assertFalse(user.has_role_permissions(['read', 'write']))
+
+    def test_inactive_user_has_no_role_permissions(self):
+        """Test inactive users hold no role permissions."""
+        user = get_user_model().objects.create_user(
+            'test', 'test@example.com', 'test123', is_active=False)
+
+        self.assertFalse(user.has_role_permission('read'))
+
+    def test_user_has_single_user_role(self):
+        """Test a user cannot get a second user-role row."""
+        user = get_user_model().objects.create_user(
+            'test', 'test@example.com', 'test123')
+        UserRole.objects.create(user=user)
+
+        with self.assertRaises(IntegrityError):
+            UserRole.objects.create(user=user)
@@ -0,0 +1,138 @@
+"""
+Tests for bulk user provisioning.
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from core.authorization import user_permission_names
+from core.cache import permission_cache
+from core.hashing import hash_passwords
+from core.models import Permission, Role, UserRole
+from core.provisioning import clean_record, provision_users
+
+
+class ProvisioningTests(TestCase):
+    """Test creating users in bulk."""
+
+    def setUp(self):
+        permission_cache.clear()
+        self.permission = Permission.objects.create(name='reports.read')
+        self.role = Role.objects.create(name='Analyst')
+        self.role.permissions.add(self.permission)
+
+    def test_provision_users(self):
+        """Test users, their UserRoles and roles are created."""
+        result = provision_users([
+            {
+                'username': 'ann',
+                'email': 'ann@EXAMPLE.com',
+                'password': 'secret123',
+                'roles': ['Analyst'],
+            },
+            {'username': 'bob', 'email': 'bob@example.com'},
+        ], chunk_size=1)
+
+        self.assertEqual(result, {'created': 2, 'errors': []})
+        ann = get_user_model().objects.get(username='ann')
+        self.assertEqual(ann.email, 'ann@example.com')
+        self.assertTrue(ann.check_password('secret123'))
+        self.assertEqual(list(ann.userrole.roles.all()), [self.role])
+        self.assertEqual(user_permission_names(ann.pk), {'reports.read'})
+        bob = get_user_model().objects.get(username='bob')
+        self.assertFalse(bob.has_usable_password())
+        self.assertTrue(UserRole.objects.filter(user=bob).exists())
+
+    def test_skips_conflicting_and_invalid_records(self):
+        """Test bad records are reported without stopping the import."""
+        get_user_model().objects.create_user(
+            username='taken', email='taken@example.com', password='pass123',
+        )
+
+        result = provision_users([
+            {'username': 'taken', 'email': 'new@example.com'},
+            {'username': 'ann', 'email': 'ann@example.com'},
+            {'username': 'ann', 'email': 'other@example.com'},
+            {'username': 'cat', 'email': 'cat@example.com',
+             'roles': ['Missing']},
+            {'username': 'dan', 'email': 'not-an-email'},
+            {'username': '', 'email': 'eve@example.com'},
+            {'username': 'TAKEN', 'email': 'fay@example.com'},
+            {'username': 'gus', 'email': 'Taken@example.com'},
+            {'username': 'Ann', 'email': 'hal@example.com'},
+            {'username': 'ivy', 'email': 'ANN@example.com'},
+        ], chunk_size=2)
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(
+            [error['record'] for error in result['errors']],
+            [1, 3, 4, 5, 6, 7, 8, 9, 10],
+        )
+        self.assertFalse(
+            get_user_model().objects.filter(email='new@example.com').exists()
+        )
+
+    def test_concurrently_taken_records_reported(self):
+        """Test a user created between the duplicate check and the insert
+        is reported as a duplicate and the rest of the chunk is created."""
+        def hash_during_signup(passwords, timeout=None):
+            get_user_model().objects.create_user(
+                username='ann', email='race@example.com',
+            )
+            return hash_passwords(passwords, timeout)
+
+        with patch('core.provisioning.hash_passwords',
+                   side_effect=hash_during_signup):
+            result = provision_users([
+                {'username': 'ann', 'email': 'ann@example.com'},
+                {'username': 'bob', 'email': 'bob@example.com'},
+            ])
+
+        self.assertEqual(result, {'created': 1, 'errors': [
+            {'record': 1, 'error': 'A user with that username already '
+                                   'exists.'},
+        ]})
+        self.assertTrue(
+            get_user_model().objects.filter(username='bob').exists()
+        )
+
+    def test_query_count_independent_of_chunk_size(self):
+        """Test a chunk is created with a fixed number of queries."""
+        def records(prefix, count):
+            return [
+                {
+                    'username': f'{prefix}{i}',
+                    'email': f'{prefix}{i}@example.com',
+                    'roles': ['Analyst'],
+                }
+                for i in range(count)
+            ]
+
+        with CaptureQueriesContext(connection) as small:
+            provision_users(records('small', 2), chunk_size=50)
+        with CaptureQueriesContext(connection) as large:
+            provision_users(records('large', 50), chunk_size=50)
+
+        self.assertEqual(len(small), len(large))
+
+    def test_clean_record_splits_role_string(self):
+        """Test CSV role lists are split on semicolons."""
+        record = clean_record({
+            'username': ' ann ',
+            'email': 'ann@example.com',
+            'roles': 'b;a;;b',
+        })
+
+        self.assertEqual(record['username'], 'ann')
+        self.assertEqual(record['roles'], ['a', 'b'])
+
+    def test_hash_passwords_keeps_order(self):
+        """Test hashes line up with their passwords."""
+        encoded = hash_passwords(['first', None, 'second'])
+
+        user = get_user_model()(password=encoded[2])
+        self.assertTrue(user.check_password('second'))
+        self.assertTrue(encoded[1].startswith('!'))
@@ -0,0 +1,72 @@
+"""
+Tests for the replica database router.
+"""
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from core.models import Role
+from core.routers import (
+    ReplicaRouter,
+    check_pin_cache,
+    is_pinned_to_primary,
+    pin_to_primary,
+    read_from_replicas,
+)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'])
+class ReplicaRouterTests(SimpleTestCase):
+    """Test routing reads between the primary and replicas."""
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        cache.clear()
+
+    def test_reads_use_default_outside_replica_block(self):
+        """Test reads are not routed unless opted in."""
+        self.assertIsNone(self.router.db_for_read(Role))
+
+    def test_reads_use_replica_inside_block(self):
+        """Test reads inside read_from_replicas() go to a replica."""
+        with read_from_replicas():
+            self.assertIn(
+                self.router.db_for_read(Role), ['replica_0', 'replica_1'],
+            )
+        self.assertIsNone(self.router.db_for_read(Role))
+
+    def test_writes_use_default(self):
+        """Test writes always go to the primary."""
+        with read_from_replicas():
+            self.assertEqual(self.router.db_for_write(Role), 'default')
+
+    def test_migrations_only_on_default(self):
+        """Test replicas are not migrated."""
+        self.assertTrue(self.router.allow_migrate('default', 'core'))
+        self.assertFalse(self.router.allow_migrate('replica_0', 'core'))
+
+    def test_pin_to_primary(self):
+        """Test pinning the resources a write changed."""
+        self.assertFalse(is_pinned_to_primary(['user:1']))
+        pin_to_primary(['user:1'])
+        self.assertTrue(is_pinned_to_primary(['user:1']))
+        self.assertTrue(is_pinned_to_primary(['roles', 'user:1']))
+        self.assertFalse(is_pinned_to_primary(['user:2']))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_pin_without_replicas(self):
+        """Test pinning is a no-op without replicas."""
+        pin_to_primary(['user:1'])
+        self.assertFalse(is_pinned_to_primary(['user:1']))
+
+    def test_pin_cache_must_be_shared(self):
+        """Test replicas with a process-local pin cache fail the checks."""
+        self.assertEqual(
+            [error.id for error in check_pin_cache(None)], ['core.E001'],
+        )
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': 'redis://cache:6379',
+        }}):
+            self.assertEqual(check_pin_cache(None), [])
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(check_pin_cache(None), [])
@@ -0,0 +1,29 @@
+"""
+Tests for the query budget test helpers.
+"""
+from django.test import TestCase
+
+from core.models import Role
+from core.testing import QueryBudgetMixin
+
+
+class QueryBudgetMixinTests(QueryBudgetMixin, TestCase):
+    """Test the query budget assertion."""
+
+    def test_within_budget(self):
+        """Test a fixed number of queries passes."""
+        self.assertQueryBudget(1, lambda pop: list(Role.objects.all()))
+
+    def test_over_budget(self):
+        """Test exceeding the budget fails."""
+        with self.assertRaises(AssertionError):
+            self.assertQueryBudget(0, lambda pop: list(Role.objects.all()))
+
+    def test_per_row_queries(self):
+        """Test queries growing with the fixture size fail."""
+        def request(pop):
+            for role in Role.objects.filter(pk__in=[r.pk for r in pop.roles]):
+                list(role.permissions.all())
+
+        with self.assertRaises(AssertionError):
+            self.assertQueryBudget(100, request)
@@ -0,0 +1,88 @@
+"""
+Signed, stateless access and refresh tokens.
+"""
+from django.conf import settings
+from django.core import signing
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from core.authorization import permission_names, user_permission_set
+
+
+ACCESS_SALT = 'core.tokens.access'
+REFRESH_SALT = 'core.tokens.refresh'
+
+
+def issue_access_token(user):
+    """Return a signed access token carrying the user's permissions.
+
+    Permissions are a list of names under ``perms``, or encoded permission
+    bits under ``pbits`` when ``SIGNED_TOKEN_PERMISSION_BITS`` is set.
+    """
+    permissions = user_permission_set(user.pk)
+    payload = {'uid': user.pk, 'su': user.is_superuser}
+    if settings.SIGNED_TOKEN_PERMISSION_BITS:
+        payload['pbits'] = permissions.encode()
+    else:
+        payload['perms'] = sorted(permission_names(permissions))
+    return signing.dumps(
+        payload,
+        key=settings.SIGNED_TOKEN_SECRET,
+        salt=ACCESS_SALT,
+        compress=True,
+    )
+
+
+def _password_fragment(user):
+    """Return a short value that changes whenever the user's password does,
+    without exposing the hash itself."""
+    return salted_hmac(
+        REFRESH_SALT,
+        user.password,
+        secret=settings.SIGNED_TOKEN_SECRET,
+        algorithm='sha256',
+    ).hexdigest()[:16]
+
+
+def issue_refresh_token(user):
+    """Return a signed refresh token for the user.
+
+    The token is bound to the user's password hash, so changing or
+    resetting the password revokes every refresh token issued before.
+    """
+    return signing.dumps(
+        {'uid': user.pk, 'pwd': _password_fragment(user)},
+        key=settings.SIGNED_TOKEN_SECRET,
+        salt=REFRESH_SALT,
+    )
+
+
+def refresh_token_matches(payload, user):
+    """Return whether a refresh token was issued for the user's current
+    password."""
+    return constant_time_compare(
+        payload.get('pwd', ''), _password_fragment(user),
+    )
+
+
+def read_access_token(token):
+    """Return the payload of a valid access token.
+
+    Raises ``signing.BadSignature`` (or its ``SignatureExpired`` subclass)
+    when the token is forged or older than ``SIGNED_TOKEN_ACCESS_TTL``.
+    """
+    return signing.loads(
+        token,
+        key=settings.SIGNED_TOKEN_SECRET,
+        salt=ACCESS_SALT,
+        max_age=settings.SIGNED_TOKEN_ACCESS_TTL,
+    )
+
+
+def read_refresh_token(token):
+    """Return the payload of a valid refresh token."""
+    return signing.loads(
+        token,
+        key=settings.SIGNED_TOKEN_SECRET,
+        salt=REFRESH_SALT,
+        max_age=settings.SIGNED_TOKEN_REFRESH_TTL,
+    )
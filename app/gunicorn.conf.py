@@ -0,0 +1,24 @@
+"""
+Gunicorn configuration for serving the app.
+
+WSGI with threaded workers is the default:
+    gunicorn app.wsgi:application -c gunicorn.conf.py
+The ASGI service sets GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker
+and DJANGO_ROOT_URLCONF=app.asgi_urls to serve only the async views:
+    gunicorn app.asgi:application -c gunicorn.conf.py
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+workers = int(
+    os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
+)
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+accesslog = '-'
@@ -0,0 +1,33 @@
+"""
+URL mapping for the async user API, served on its own by the ASGI service.
+"""
+from django.urls import path
+
+from user import async_views
+
+
+app_name = 'user'
+
+
+urlpatterns = [
+    path(
+        'async/users/<int:pk>/roles/',
+        async_views.user_roles,
+        name='async-user-roles',
+    ),
+    path(
+        'async/users/<int:pk>/permissions/',
+        async_views.user_permissions,
+        name='async-user-permissions',
+    ),
+    path(
+        'async/roles/<int:pk>/',
+        async_views.role_detail,
+        name='async-role-detail',
+    ),
+    path(
+        'async/permissions/',
+        async_views.permission_list,
+        name='async-permission-list',
+    ),
+]
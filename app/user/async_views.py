@@ -0,0 +1,121 @@
+"""
+Async views for the hot authorization reads, served under ASGI.
+
+DRF views are synchronous, so these are plain Django async views using the
+async ORM. They accept the same credentials and honour the same
+``REQUIRED_ROLE_PERMISSIONS`` entries as their DRF counterparts.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotAllowed, JsonResponse
+
+from core.authorization import effective_permissions
+from core.models import Permission, Role, UserRole
+from user.authentication import aauthenticate
+from user.permissions import holds_role_permission, required_role_permission
+
+
+def async_api_view(view_name, action):
+    """Authenticate and authorize a request like the DRF view action
+    ``view_name.action`` before calling the wrapped async view."""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return HttpResponseNotAllowed(['GET'])
+            credentials = await aauthenticate(request)
+            if credentials is None:
+                return JsonResponse(
+                    {'detail': 'Authentication credentials were not '
+                               'provided or are invalid.'},
+                    status=401,
+                )
+            user, auth = credentials
+            required = required_role_permission(view_name, action)
+            if required is not None and not await sync_to_async(
+                holds_role_permission
+            )(user, auth, required):
+                return JsonResponse(
+                    {'detail': 'You do not have permission to perform '
+                               'this action.'},
+                    status=403,
+                )
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _not_found():
+    return JsonResponse({'detail': 'Not found.'}, status=404)
+
+
+@async_api_view('ManageUserView', 'roles')
+async def user_roles(request, pk):
+    """List the roles of a user."""
+    roles = [
+        role async for role in
+        Role.objects.filter(userrole__user=pk)
+        .values('id', 'name').order_by('id')
+    ]
+    if not roles and not await UserRole.objects.filter(user=pk).aexists():
+        return _not_found()
+    return JsonResponse(roles, safe=False)
+
+
+@async_api_view('ManageUserView', 'permissions')
+async def user_permissions(request, pk):
+    """List the effective permissions of a user."""
+    permissions = [
+        permission async for permission in
+        effective_permissions(pk).values('id', 'name', 'bit')
+    ]
+    if (
+        not permissions
+        and not await UserRole.objects.filter(user=pk).aexists()
+    ):
+        return _not_found()
+    return JsonResponse(permissions, safe=False)
+
+
+@async_api_view('RoleViewSet', 'retrieve')
+async def role_detail(request, pk):
+    """Return a role with its permissions."""
+    try:
+        role = await Role.objects.only('id', 'name').aget(pk=pk)
+    except Role.DoesNotExist:
+        return _not_found()
+    permissions = [
+        permission async for permission in
+        role.permissions.values('id', 'name', 'bit').order_by('id')
+    ]
+    return JsonResponse({
+        'id': role.id,
+        'name': role.name,
+        'permissions': permissions,
+    })
+
+
+@async_api_view('PermissionViewSet', 'list')
+async def permission_list(request):
+    """List permissions in pages keyed by id, using ``?after=<id>``."""
+    try:
+        after = int(request.GET.get('after', 0))
+        page_size = int(request.GET.get(
+            'page_size', settings.REST_FRAMEWORK['PAGE_SIZE'],
+        ))
+        page_size = max(1, min(page_size, 1000))
+    except ValueError:
+        return JsonResponse({'detail': 'Invalid page.'}, status=400)
+
+    results = [
+        permission async for permission in
+        Permission.objects.filter(id__gt=after)
+        .values('id', 'name', 'bit').order_by('id')[:page_size + 1]
+    ]
+    next_after = None
+    if len(results) > page_size:
+        results = results[:page_size]
+        next_after = results[-1]['id']
+    return JsonResponse({'next_after': next_after, 'results': results})
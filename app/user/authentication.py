@@ -0,0 +1,126 @@
+"""
+Authentication classes for the user API.
+"""
+import copy
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.utils.translation import gettext as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+from rest_framework.authtoken.models import Token
+
+from core.cache import token_cache_key, token_credentials_cache
+from core.tokens import read_access_token
+
+
+def _own_credentials(credentials):
+    """Return copies of cached credentials for one request.
+
+    The in-memory cache hands every request the same instances, which a
+    view may modify; each request gets its own user and token instead.
+    """
+    user, token = credentials
+    user = copy.copy(user)
+    token = copy.copy(token)
+    token.user = user
+    return (user, token)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that caches token lookups in a shared cache
+    when configured, otherwise briefly in memory."""
+
+    def authenticate_credentials(self, key):
+        cache, ttl = token_credentials_cache()
+        cache_key = token_cache_key(key)
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            cache.set(cache_key, credentials, ttl)
+        return _own_credentials(credentials)
+
+
+def signed_token_user(payload):
+    """Return an unsaved user standing in for a signed token's subject."""
+    return get_user_model()(
+        pk=payload['uid'],
+        is_active=True,
+        is_superuser=payload['su'],
+    )
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """Authenticate signed access tokens without touching the database.
+
+    Clients send ``Authorization: Bearer <token>``. Only active when
+    ``AUTH_TOKEN_MODE`` is ``'signed'``. The token payload is returned as
+    ``request.auth`` so permission checks can use its permission set.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        if settings.AUTH_TOKEN_MODE != 'signed':
+            return None
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            msg = _('Invalid token header.')
+            raise exceptions.AuthenticationFailed(msg)
+
+        try:
+            payload = read_access_token(auth[1].decode())
+        except signing.SignatureExpired:
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        except (signing.BadSignature, UnicodeError):
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        return (signed_token_user(payload), payload)
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+
+async def aauthenticate(request):
+    """Authenticate a plain Django request for the async views.
+
+    Accepts the same credentials as CachedTokenAuthentication and
+    SignedTokenAuthentication. Returns ``(user, auth)``, or None when the
+    credentials are missing or invalid.
+    """
+    auth = request.headers.get('Authorization', '').split()
+    if len(auth) != 2:
+        return None
+    keyword, key = auth[0].lower(), auth[1]
+
+    if keyword == SignedTokenAuthentication.keyword.lower():
+        if settings.AUTH_TOKEN_MODE != 'signed':
+            return None
+        try:
+            payload = read_access_token(key)
+        except signing.BadSignature:
+            return None
+        return (signed_token_user(payload), payload)
+
+    if keyword != CachedTokenAuthentication.keyword.lower():
+        return None
+    cache, ttl = token_credentials_cache()
+    cache_key = token_cache_key(key)
+    credentials = await cache.aget(cache_key)
+    if credentials is None:
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            return None
+        if not token.user.is_active:
+            return None
+        credentials = (token.user, token)
+        await cache.aset(cache_key, credentials, ttl)
+    return _own_credentials(credentials)
@@ -0,0 +1,24 @@
+"""
+Exceptions and exception handling for the user API.
+"""
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework.exceptions import APIException
+from rest_framework.views import exception_handler as drf_exception_handler
+
+from core.hashing import PoolSaturated
+
+
+class HashingPoolSaturated(APIException):
+    """Raised when the password hashing pool cannot take more work."""
+    status_code = 503
+    default_detail = _('Too many concurrent password checks, retry shortly.')
+    default_code = 'hashing_pool_saturated'
+    wait = 1
+
+
+def exception_handler(exc, context):
+    """Turn core errors into API errors before DRF's default handling."""
+    if isinstance(exc, PoolSaturated):
+        exc = HashingPoolSaturated()
+    return drf_exception_handler(exc, context)
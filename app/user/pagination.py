@@ -0,0 +1,11 @@
+"""
+Pagination for the user API.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination over the primary key, stable under inserts."""
+    ordering = 'id'
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
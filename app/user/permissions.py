@@ -0,0 +1,51 @@
+"""
+Permission classes for the user API.
+"""
+from django.conf import settings
+
+from rest_framework.permissions import BasePermission
+
+from core.authorization import permission_set
+from core.bitsets import PermissionSet
+
+
+def required_role_permission(view_name, action):
+    """Return the permission a view action requires, if any."""
+    required = settings.REQUIRED_ROLE_PERMISSIONS.get(view_name, {})
+    return required.get(action, required.get('*'))
+
+
+def holds_role_permission(user, auth, name):
+    """Return whether the authenticated user holds the named permission,
+    reading signed token claims when present."""
+    if isinstance(auth, dict) and 'pbits' in auth:
+        if auth['su']:
+            return True
+        required = permission_set([name])
+        return required is not None and (
+            required <= PermissionSet.decode(auth['pbits'])
+        )
+    if isinstance(auth, dict) and 'perms' in auth:
+        return auth['su'] or name in auth['perms']
+    return bool(
+        user and user.is_authenticated
+        and user.has_role_permission(name)
+    )
+
+
+class HasRolePermission(BasePermission):
+    """Allow requests when the user holds the role permission an action
+    requires, as configured in ``REQUIRED_ROLE_PERMISSIONS``."""
+
+    def get_required_permission(self, view):
+        """Return the permission name the view action requires, if any."""
+        return required_role_permission(
+            view.__class__.__name__,
+            getattr(view, 'action', None),
+        )
+
+    def has_permission(self, request, view):
+        required = self.get_required_permission(view)
+        if required is None:
+            return True
+        return holds_role_permission(request.user, request.auth, required)
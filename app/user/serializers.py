@@ -1,18 +1,36 @@
 """
 Serializers for the user API View.
 """
+from django.conf import settings
 from django.contrib.auth import (
     get_user_model,
     authenticate,
 )
+from django.core import signing
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from django.utils.translation import gettext as _
 
 from rest_framework import serializers
 
-from core.models import User, Role, UserRole, Permission
+from core.hashing import hash_password
+from core.hierarchy import ensure_acyclic
+from core.models import Role, UserRole, Permission
+from core.tokens import read_refresh_token, refresh_token_matches
 
 
-class UserSerializer(serializers.ModelSerializer):
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """ModelSerializer taking a ``fields`` argument to limit its output."""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class UserSerializer(DynamicFieldsModelSerializer):
     """Serializer for the user objects."""
 
     class Meta:
@@ -33,7 +51,7 @@ class UserSerializer(serializers.ModelSerializer):
         user = super().update(instance, validated_data)
 
         if password:
-            user.set_password(password)
+            user.password = hash_password(password)
             user.save()
 
         return user
@@ -49,17 +67,10 @@ class AuthTokenSerializer(serializers.Serializer):
 
     def validate(self, attrs):
         """Validate and authenticate the user."""
-        password = attrs.get('password')
-
-        username = User.objects.filter(email=attrs.get("username")).first()
-        email = User.objects.filter(username=attrs.get("username")).first()
-
-        user_obj = username or email
-
         user = authenticate(
             request=self.context.get('request'),
-            username=user_obj.email,
-            password=password,
+            username=attrs.get('username'),
+            password=attrs.get('password'),
         )
         if not user:
             msg = _('Unable to authenticate with provided credentials.')
@@ -69,74 +80,317 @@ class AuthTokenSerializer(serializers.Serializer):
         return attrs
 
 
-class PermissionsSerializer(serializers.ModelSerializer):
+class RefreshTokenSerializer(serializers.Serializer):
+    """Serializer for exchanging a refresh token for an access token."""
+    refresh = serializers.CharField(trim_whitespace=False)
+
+    def validate(self, attrs):
+        """Validate the refresh token and load its active user, rejecting
+        tokens issued before the user's password changed."""
+        msg = _('Invalid or expired refresh token.')
+        try:
+            payload = read_refresh_token(attrs['refresh'])
+        except signing.BadSignature:
+            raise serializers.ValidationError(msg, code='authorization')
+
+        user = get_user_model().objects.filter(
+            pk=payload['uid'],
+            is_active=True,
+        ).first()
+        if user is None or not refresh_token_matches(payload, user):
+            raise serializers.ValidationError(msg, code='authorization')
+
+        attrs['user'] = user
+        return attrs
+
+
+class PermissionsSerializer(DynamicFieldsModelSerializer):
     """Serializer for Permission."""
 
     class Meta:
         model = Permission
+        fields = ['id', 'name', 'bit']
+        read_only_fields = ['id', 'bit']
+
+
+def _get_ids_by_name(model, items):
+    """Map the names in items to object ids with one query."""
+    names = {item['name'] for item in items}
+    found = dict(
+        model.objects.filter(name__in=names).values_list('name', 'pk')
+    )
+    missing = names - found.keys()
+    if missing:
+        msg = _('Unknown names: %(names)s.') % {
+            'names': ', '.join(sorted(missing)),
+        }
+        raise serializers.ValidationError(msg)
+    return found
+
+
+def _get_by_name(model, items):
+    """Return the ids of the objects named in items with one query."""
+    return set(_get_ids_by_name(model, items).values())
+
+
+def _set_members(manager, pks):
+    """Diff a many-to-many relation against pks, touching changed rows."""
+    current = set(manager.values_list('pk', flat=True))
+    if current - pks:
+        manager.remove(*(current - pks))
+    if pks - current:
+        manager.add(*(pks - current))
+
+
+@transaction.atomic
+def patch_members(manager, model, operations):
+    """Apply add and remove operations to a many-to-many relation in order.
+
+    Only the rows named by the operations are inserted or deleted.
+    """
+    ids = _get_ids_by_name(model, [op['value'] for op in operations])
+    added, removed = set(), set()
+    for operation in operations:
+        pk = ids[operation['value']['name']]
+        if operation['op'] == 'add':
+            added.add(pk)
+            removed.discard(pk)
+        else:
+            removed.add(pk)
+            added.discard(pk)
+    if removed:
+        manager.remove(*removed)
+    if added:
+        manager.add(*added)
+
+
+class NameReferenceSerializer(serializers.Serializer):
+    """Serializer for an object referenced by name."""
+    name = serializers.CharField(max_length=255)
+
+
+class MembershipOperationSerializer(serializers.Serializer):
+    """Serializer for a JSON Patch style membership change."""
+    op = serializers.ChoiceField(choices=['add', 'remove'])
+    value = NameReferenceSerializer()
+
+
+class PermissionReferenceSerializer(PermissionsSerializer):
+    """Serializer for an existing permission referenced by name."""
+
+    class Meta(PermissionsSerializer.Meta):
+        extra_kwargs = {'name': {'validators': []}}
+
+
+class RoleSummarySerializer(serializers.ModelSerializer):
+    """Serializer for a role without its permissions."""
+
+    class Meta:
+        model = Role
         fields = ['id', 'name']
         read_only_fields = ['id']
 
 
-class RoleSerializer(serializers.ModelSerializer):
+class ParentRoleSerializer(RoleSummarySerializer):
+    """Serializer for an existing parent role referenced by name."""
+
+    class Meta(RoleSummarySerializer.Meta):
+        extra_kwargs = {'name': {'validators': []}}
+
+
+def _set_parents(role, parents):
+    """Set the parents of a role, reporting cycles as validation errors."""
+    parent_ids = _get_by_name(Role, parents)
+    try:
+        ensure_acyclic([role.pk], parent_ids)
+    except DjangoValidationError as error:
+        raise serializers.ValidationError({'parents': error.messages})
+    _set_members(role.parents, parent_ids)
+
+
+class RoleSerializer(DynamicFieldsModelSerializer):
     """Serializers for Role."""
-    permissions = PermissionsSerializer(many=True, required=False)
+    permissions = PermissionReferenceSerializer(many=True, required=False)
+    parents = ParentRoleSerializer(many=True, required=False)
 
     class Meta:
         model = Role
-        fields = ['id', 'name', 'permissions']
+        fields = ['id', 'name', 'permissions', 'parents']
         read_only_fields = ['id']
 
-    def _get_permissions(self, permissions, role):
-        """Handle getting permission as needed."""
-        for permission in permissions:
-            permission_obj = Permission.objects.get(
-                **permission,
-            )
-            role.permissions.add(permission_obj)
+    def _get_permissions(self, permissions):
+        """Handle getting permissions by name as needed."""
+        return _get_by_name(Permission, permissions)
 
+    @transaction.atomic
     def create(self, validated_data):
         """Create a role."""
         permissions = validated_data.pop('permissions', [])
+        parents = validated_data.pop('parents', [])
+        permission_ids = self._get_permissions(permissions)
         role = Role.objects.create(**validated_data)
-        self._get_permissions(permissions, role)
+        if permission_ids:
+            role.permissions.add(*permission_ids)
+        if parents:
+            _set_parents(role, parents)
         return role
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update role."""
         permissions = validated_data.pop('permissions', None)
         if permissions is not None:
-            instance.permissions.clear()
-            self._get_permissions(permissions, instance)
+            _set_members(
+                instance.permissions,
+                self._get_permissions(permissions),
+            )
+        parents = validated_data.pop('parents', None)
+        if parents is not None:
+            _set_parents(instance, parents)
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
+        instance.save()
         return instance
 
 
+class RoleReferenceSerializer(RoleSerializer):
+    """Serializer for an existing role referenced by name."""
+    parents = None
+
+    class Meta(RoleSerializer.Meta):
+        fields = ['id', 'name', 'permissions']
+        extra_kwargs = {'name': {'validators': []}}
+
+
 class UserRoleSerializer(serializers.ModelSerializer):
     """Serializers for user-roles."""
-    roles = RoleSerializer(many=True, required=False)
+    roles = RoleReferenceSerializer(many=True, required=False)
 
     class Meta:
         model = UserRole
         fields = ['id', 'user', 'roles']
         read_only_fields = ['id', 'user']
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Update user-roles."""
         roles = validated_data.pop('roles', None)
         if roles is not None:
-            instance.roles.clear()
-            for role in roles:
-                role_obj = Role.objects.get(
-                    **role
-                )
-                instance.roles.add(role_obj)
+            _set_members(instance.roles, _get_by_name(Role, roles))
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-
-        instance.save()
+        if validated_data:
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save()
         return instance
+
+
+class AuthorizationCheckSerializer(serializers.Serializer):
+    """Serializer for a single (user, permission) check."""
+    user = serializers.IntegerField()
+    permission = serializers.CharField(max_length=255)
+
+
+class BatchAuthorizationSerializer(serializers.Serializer):
+    """Serializer for a batch of authorization checks."""
+    checks = AuthorizationCheckSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=settings.AUTHORIZATION_BATCH_MAX_SIZE,
+    )
+
+
+class ProvisionUserSerializer(serializers.Serializer):
+    """Serializer for a user in a bulk provisioning request."""
+    username = serializers.CharField(max_length=255)
+    email = serializers.EmailField(max_length=255)
+    password = serializers.CharField(
+        min_length=5,
+        required=False,
+        write_only=True,
+        trim_whitespace=False,
+    )
+    roles = serializers.ListField(
+        child=serializers.CharField(max_length=255),
+        required=False,
+    )
+
+
+class BulkProvisionSerializer(serializers.Serializer):
+    """Serializer for a bulk provisioning request."""
+    users = ProvisionUserSerializer(
+        many=True,
+        allow_empty=False,
+        max_length=settings.PROVISIONING_MAX_BATCH_SIZE,
+    )
+
+
+class UserFilterSerializer(serializers.Serializer):
+    """Serializer for selecting users by attributes."""
+    role = serializers.CharField(max_length=255, required=False)
+    is_active = serializers.BooleanField(required=False)
+    email_domain = serializers.CharField(max_length=255, required=False)
+
+    def validate(self, attrs):
+        """Require at least one criterion."""
+        if not attrs:
+            raise serializers.ValidationError(
+                _('Provide at least one filter.')
+            )
+        return attrs
+
+    def get_queryset(self, criteria):
+        """Return the users matching validated filter criteria."""
+        users = get_user_model().objects.all()
+        if 'role' in criteria:
+            users = users.filter(userrole__roles__name=criteria['role'])
+        if 'is_active' in criteria:
+            users = users.filter(is_active=criteria['is_active'])
+        if 'email_domain' in criteria:
+            users = users.filter(
+                email__iendswith='@' + criteria['email_domain'],
+            )
+        return users
+
+
+class BulkRoleAssignmentSerializer(serializers.Serializer):
+    """Serializer for granting and revoking roles for many users."""
+    users = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=False,
+        max_length=settings.ROLE_ASSIGNMENT_MAX_USERS,
+    )
+    filter = UserFilterSerializer(required=False)
+    grant = RoleReferenceSerializer(many=True, required=False)
+    revoke = RoleReferenceSerializer(many=True, required=False)
+
+    def validate(self, attrs):
+        """Resolve role names and check the request is consistent."""
+        if ('users' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError(
+                _('Provide exactly one of users or filter.')
+            )
+        attrs['grant'] = _get_by_name(Role, attrs.get('grant', []))
+        attrs['revoke'] = _get_by_name(Role, attrs.get('revoke', []))
+        if not attrs['grant'] and not attrs['revoke']:
+            raise serializers.ValidationError(
+                _('Provide roles to grant or revoke.')
+            )
+        if attrs['grant'] & attrs['revoke']:
+            raise serializers.ValidationError(
+                _('Cannot grant and revoke the same role.')
+            )
+        return attrs
+
+    def get_users(self):
+        """Return the users the assignment applies to."""
+        if 'users' in self.validated_data:
+            return get_user_model().objects.filter(
+                pk__in=self.validated_data['users'],
+            )
+        return self.fields['filter'].get_queryset(
+            self.validated_data['filter'],
+        )
@@ -0,0 +1,131 @@
+"""
+Tests for the async read views.
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core.cache import permission_cache, token_cache
+from core.models import Permission, Role, UserRole
+
+
+class AsyncReadViewTests(TestCase):
+    """Test the async authorization read endpoints."""
+
+    def setUp(self):
+        token_cache.clear()
+        permission_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='test',
+            email='test@example.com',
+            password='testpass123',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.read = Permission.objects.create(name='read')
+        self.role = Role.objects.create(name='reader')
+        self.role.permissions.add(self.read)
+        UserRole.objects.create(user=self.user).roles.add(self.role)
+        self.headers = {'AUTHORIZATION': f'Token {self.token.key}'}
+
+    async def test_auth_required(self):
+        """Test requests without a token are rejected."""
+        res = await self.async_client.get(
+            reverse('user:async-permission-list')
+        )
+
+        self.assertEqual(res.status_code, 401)
+
+    async def test_user_permissions(self):
+        """Test listing a user's effective permissions."""
+        res = await self.async_client.get(
+            reverse('user:async-user-permissions', args=[self.user.id]),
+            headers=self.headers,
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json(), [
+            {'id': self.read.id, 'name': 'read', 'bit': self.read.bit},
+        ])
+
+    async def test_user_roles(self):
+        """Test listing a user's roles."""
+        res = await self.async_client.get(
+            reverse('user:async-user-roles', args=[self.user.id]),
+            headers=self.headers,
+        )
+
+        self.assertEqual(res.json(), [{'id': self.role.id, 'name': 'reader'}])
+
+    async def test_user_without_roles_not_found(self):
+        """Test a user without a user-role row returns 404."""
+        res = await self.async_client.get(
+            reverse('user:async-user-roles', args=[self.user.id + 1]),
+            headers=self.headers,
+        )
+
+        self.assertEqual(res.status_code, 404)
+
+    async def test_role_detail(self):
+        """Test retrieving a role with its permissions."""
+        res = await self.async_client.get(
+            reverse('user:async-role-detail', args=[self.role.id]),
+            headers=self.headers,
+        )
+
+        self.assertEqual(res.json(), {
+            'id': self.role.id,
+            'name': 'reader',
+            'permissions': [
+                {'id': self.read.id, 'name': 'read', 'bit': self.read.bit},
+            ],
+        })
+
+    async def test_permission_list_pages(self):
+        """Test permissions are paged by id."""
+        write = await Permission.objects.acreate(name='write')
+        url = reverse('user:async-permission-list')
+
+        res = await self.async_client.get(
+            url, {'page_size': 1}, headers=self.headers,
+        )
+        self.assertEqual(res.json()['results'], [
+            {'id': self.read.id, 'name': 'read', 'bit': self.read.bit},
+        ])
+
+        res = await self.async_client.get(
+            url,
+            {'page_size': 1, 'after': res.json()['next_after']},
+            headers=self.headers,
+        )
+        self.assertEqual(res.json(), {
+            'next_after': None,
+            'results': [{'id': write.id, 'name': 'write', 'bit': write.bit}],
+        })
+
+    @override_settings(REQUIRED_ROLE_PERMISSIONS={
+        'RoleViewSet': {'retrieve': 'roles.read'},
+    })
+    async def test_required_permission_enforced(self):
+        """Test the configured role permission is required."""
+        res = await self.async_client.get(
+            reverse('user:async-role-detail', args=[self.role.id]),
+            headers=self.headers,
+        )
+
+        self.assertEqual(res.status_code, 403)
+
+    @override_settings(ROOT_URLCONF='app.asgi_urls')
+    async def test_asgi_urlconf_serves_only_async_views(self):
+        """Test the ASGI URLconf routes the async views and nothing else."""
+        res = await self.async_client.get(
+            f'/api/async/users/{self.user.pk}/permissions/',
+            headers=self.headers,
+        )
+        self.assertEqual(res.status_code, 200)
+
+        res = await self.async_client.get(
+            f'/api/users/{self.user.pk}/permissions/', headers=self.headers,
+        )
+        self.assertEqual(res.status_code, 404)
@@ -0,0 +1,255 @@
+"""
+Tests for the cached token authentication.
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.bitsets import PermissionSet
+from core.cache import permission_cache, token_cache, token_cache_key
+from core.models import Permission, Role, UserRole
+from core.tokens import read_access_token
+from user.authentication import CachedTokenAuthentication, aauthenticate
+
+
+PERMISSION_URL = reverse('user:permission-list')
+ROLE_URL = reverse('user:role-list')
+TOKEN_URL = reverse('user:token')
+REFRESH_URL = reverse('user:token-refresh')
+
+
+@override_settings(TOKEN_CACHE_ALIAS=None)
+class CachedTokenAuthenticationTests(TestCase):
+    """Test authenticating requests with cached tokens."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='test',
+            email='test@example.com',
+            password='testpass123',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_is_cached(self):
+        """Test repeated requests skip the token query."""
+        self.client.get(PERMISSION_URL)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(PERMISSION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_deleted_token_is_rejected(self):
+        """Test a deleted token stops authenticating."""
+        self.client.get(PERMISSION_URL)
+
+        self.token.delete()
+        res = self.client.get(PERMISSION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        """Test a deactivated user's cached token stops authenticating."""
+        self.client.get(PERMISSION_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(PERMISSION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cached_user_not_shared_between_requests(self):
+        """Test each request gets its own copy of the cached user."""
+        auth = CachedTokenAuthentication()
+        first, first_token = auth.authenticate_credentials(self.token.key)
+        first.email = 'changed@example.com'
+
+        second, second_token = auth.authenticate_credentials(self.token.key)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(second.email, 'test@example.com')
+        self.assertIs(second_token.user, second)
+
+    async def test_async_keyword_is_case_insensitive(self):
+        """Test async views accept the token keyword in any case."""
+        request = RequestFactory().get(
+            '/', HTTP_AUTHORIZATION=f'token {self.token.key}',
+        )
+
+        user, token = await aauthenticate(request)
+
+        self.assertEqual(user.pk, self.user.pk)
+
+    @override_settings(TOKEN_CACHE_ALIAS='default')
+    def test_shared_cache_is_used(self):
+        """Test lookups are served from the shared cache."""
+        self.client.get(PERMISSION_URL)
+        token_cache.clear()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(PERMISSION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(TOKEN_CACHE_ALIAS='default')
+    def test_shared_cache_skips_process_cache(self):
+        """Test a revocation seen by the shared cache applies at once."""
+        self.client.get(PERMISSION_URL)
+        self.assertEqual(token_cache.stats()['size'], 0)
+
+        caches['default'].delete(token_cache_key(self.token.key))
+        Token.objects.filter(pk=self.token.pk).delete()
+
+        res = self.client.get(PERMISSION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(AUTH_TOKEN_MODE='signed')
+class SignedTokenAuthenticationTests(TestCase):
+    """Test signed access and refresh tokens."""
+
+    def setUp(self):
+        permission_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='test',
+            email='test@example.com',
+            password='testpass123',
+        )
+        self.client = APIClient()
+        self.credentials = {'username': 'test', 'password': 'testpass123'}
+
+    def login(self):
+        """Log in and authenticate the client with the access token."""
+        res = self.client.post(TOKEN_URL, self.credentials)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {res.data["token"]}'
+        )
+        return res
+
+    def test_login_issues_signed_tokens(self):
+        """Test logging in returns an access and a refresh token."""
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('refresh', res.data)
+        self.assertFalse(Token.objects.filter(user=self.user).exists())
+
+    def test_access_token_skips_database(self):
+        """Test a signed token authenticates without a user query."""
+        self.login()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(PERMISSION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_tampered_token_rejected(self):
+        """Test a modified token is rejected."""
+        res = self.client.post(TOKEN_URL, self.credentials)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {res.data["token"]}x'
+        )
+
+        res = self.client.get(PERMISSION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(SIGNED_TOKEN_ACCESS_TTL=-1)
+    def test_expired_token_rejected(self):
+        """Test an expired access token is rejected."""
+        self.login()
+
+        res = self.client.get(PERMISSION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_issues_access_token(self):
+        """Test a refresh token is exchanged for a working access token."""
+        refresh = self.client.post(TOKEN_URL, self.credentials).data['refresh']
+
+        res = self.client.post(REFRESH_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {res.data["token"]}'
+        )
+        self.assertEqual(self.client.get(PERMISSION_URL).status_code,
+                         status.HTTP_200_OK)
+
+    def test_refresh_rejected_for_inactive_user(self):
+        """Test a deactivated user cannot refresh."""
+        refresh = self.client.post(TOKEN_URL, self.credentials).data['refresh']
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.post(REFRESH_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_refresh_rejected_after_password_change(self):
+        """Test changing the password revokes earlier refresh tokens."""
+        refresh = self.client.post(TOKEN_URL, self.credentials).data['refresh']
+        self.user.set_password('newpass456')
+        self.user.save()
+
+        res = self.client.post(REFRESH_URL, {'refresh': refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(REQUIRED_ROLE_PERMISSIONS={
+        'RoleViewSet': {'list': 'roles.read'},
+    })
+    def test_permissions_checked_from_token(self):
+        """Test role permissions are read from the token payload."""
+        role = Role.objects.create(name='reader')
+        role.permissions.add(Permission.objects.create(name='roles.read'))
+        UserRole.objects.create(user=self.user).roles.add(role)
+        self.login()
+
+        with self.assertNumQueries(3):
+            res = self.client.get(ROLE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(
+        SIGNED_TOKEN_PERMISSION_BITS=True,
+        REQUIRED_ROLE_PERMISSIONS={
+            'RoleViewSet': {'list': 'roles.read', 'retrieve': 'roles.write'},
+        },
+    )
+    def test_permission_bits_checked_from_token(self):
+        """Test permissions can be carried in the token as bits."""
+        read = Permission.objects.create(name='roles.read')
+        Permission.objects.create(name='roles.write')
+        role = Role.objects.create(name='reader')
+        role.permissions.add(read)
+        UserRole.objects.create(user=self.user).roles.add(role)
+
+        payload = read_access_token(self.login().data['token'])
+
+        self.assertNotIn('perms', payload)
+        self.assertEqual(PermissionSet.decode(payload['pbits']),
+                         PermissionSet.from_positions([read.bit]))
+        self.assertEqual(self.client.get(ROLE_URL).status_code,
+                         status.HTTP_200_OK)
+        res = self.client.get(reverse('user:role-detail', args=[role.id]))
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(AUTH_TOKEN_MODE='db')
+    def test_signed_tokens_ignored_in_db_mode(self):
+        """Test bearer tokens are not accepted outside signed mode."""
+        with override_settings(AUTH_TOKEN_MODE='signed'):
+            self.login()
+
+        res = self.client.get(PERMISSION_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
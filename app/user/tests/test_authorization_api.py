@@ -0,0 +1,105 @@
+"""
+Tests for the batch authorization API.
+"""
+import json
+from unittest.mock import patch
+
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Permission, Role, UserRole
+from core.testing import create_user
+
+
+AUTHORIZE_URL = reverse('user:authorize')
+
+
+class PublicAuthorizationApiTests(TestCase):
+    """Test unauthenticated batch authorization requests."""
+
+    def test_auth_required(self):
+        """Test auth is required to check permissions."""
+        res = APIClient().post(AUTHORIZE_URL, {'checks': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateAuthorizationApiTests(TestCase):
+    """Test authenticated batch authorization requests."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user('user')
+        self.client.force_authenticate(self.user)
+        self.reader = create_user('reader')
+        role = Role.objects.create(name='reader')
+        role.permissions.add(Permission.objects.create(name='read'))
+        UserRole.objects.create(user=self.reader).roles.add(role)
+
+    def test_batch_check(self):
+        """Test answering several checks at once."""
+        inactive = create_user('inactive', is_active=False)
+        payload = {'checks': [
+            {'user': self.reader.id, 'permission': 'read'},
+            {'user': self.reader.id, 'permission': 'write'},
+            {'user': self.user.id, 'permission': 'read'},
+            {'user': inactive.id, 'permission': 'read'},
+        ]}
+
+        with self.assertNumQueries(2):
+            res = self.client.post(AUTHORIZE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result['allowed'] for result in res.data['results']],
+            [True, False, False, False],
+        )
+
+    def test_empty_batch_rejected(self):
+        """Test an empty batch returns an error."""
+        res = self.client.post(AUTHORIZE_URL, {'checks': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(AUTHORIZATION_BATCH_STREAM_THRESHOLD=1)
+    def test_large_batch_is_streamed(self):
+        """Test batches above the threshold are resolved as they stream."""
+        payload = {'checks': [
+            {'user': self.reader.id, 'permission': 'read'},
+            {'user': self.user.id, 'permission': 'read'},
+            {'user': self.reader.id, 'permission': 'write'},
+        ]}
+
+        with self.assertNumQueries(0):
+            res = self.client.post(AUTHORIZE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        with self.assertNumQueries(6):
+            body = json.loads(b''.join(res.streaming_content))
+        self.assertEqual(
+            [result['allowed'] for result in body['results']],
+            [True, False, False],
+        )
+
+    @override_settings(AUTHORIZATION_BATCH_STREAM_THRESHOLD=1)
+    def test_stream_reports_database_error(self):
+        """Test a database error mid-stream ends the JSON with an error."""
+        payload = {'checks': [
+            {'user': self.reader.id, 'permission': 'read'},
+            {'user': self.user.id, 'permission': 'read'},
+        ]}
+        res = self.client.post(AUTHORIZE_URL, payload, format='json')
+        allowed = [[True], DatabaseError('connection lost')]
+
+        with patch('user.views.check_permissions', side_effect=allowed):
+            body = json.loads(b''.join(res.streaming_content))
+
+        self.assertEqual(body['results'], [
+            {'user': self.reader.id, 'permission': 'read', 'allowed': True},
+        ])
+        self.assertEqual(body['error']['completed'], 1)
@@ -2,13 +2,17 @@
 Tests for recipe APIs.
 """
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Permission, Role
+from core.cache import permission_cache
+from core.models import Permission, Role, UserRole
+from core.testing import QueryBudgetMixin
 
 from user.serializers import (
     RoleSerializer,
@@ -86,7 +90,7 @@ class PrivateRecipeAPITests(TestCase):
         roles = Role.objects.all().order_by('id')
         serializer = RoleSerializer(roles, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_create_role(self):
         """Test creating a recipe."""
@@ -105,7 +109,7 @@ class PrivateRecipeAPITests(TestCase):
         permission = Permission.objects.all().order_by('id')
         serializer = PermissionsSerializer(permission, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_create_permission(self):
         """Test creating a permission."""
@@ -114,3 +118,313 @@ class PrivateRecipeAPITests(TestCase):
         }
         res = self.client.post(PERMISSION_URL, payload)
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    @override_settings(REQUIRED_ROLE_PERMISSIONS={
+        'RoleViewSet': {'create': 'roles.write'},
+    })
+    def test_create_role_requires_role_permission(self):
+        """Test creating a role requires the configured permission."""
+        permission_cache.clear()
+        payload = {'name': 'Sample role'}
+
+        res = self.client.post(ROLE_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+        role = create_role(name='Role admin')
+        role.permissions.add(create_permission(name='roles.write'))
+        UserRole.objects.create(user=self.user).roles.add(role)
+
+        res = self.client.post(ROLE_URL, payload)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.get(ROLE_URL).status_code,
+                         status.HTTP_200_OK)
+
+    def test_update_role_permissions_is_set_based(self):
+        """Test assigning permissions costs the same for any batch size."""
+        names = [f'permission {i}' for i in range(20)]
+        for name in names:
+            create_permission(name=name)
+
+        def count_queries(role, permission_names):
+            url = reverse('user:role-permissions', args=[role.id])
+            payload = {
+                'name': role.name,
+                'permissions': [{'name': name} for name in permission_names],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.put(url, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return len(ctx.captured_queries)
+
+        small_role = create_role(name='small')
+        large_role = create_role(name='large')
+        small = count_queries(small_role, names[:2])
+        large = count_queries(large_role, names)
+
+        self.assertEqual(small, large)
+        self.assertEqual(large_role.permissions.count(), len(names))
+
+    def test_update_role_unknown_permission(self):
+        """Test assigning an unknown permission returns an error."""
+        role = create_role()
+        url = reverse('user:role-permissions', args=[role.id])
+        payload = {'name': role.name, 'permissions': [{'name': 'missing'}]}
+
+        res = self.client.put(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_roles_query_count_is_constant(self):
+        """Test listing roles costs the same number of queries at scale."""
+        def count_queries(role_count):
+            for i in range(role_count):
+                role = create_role(name=f'{role_count} role {i}')
+                role.permissions.add(
+                    create_permission(name=f'{role_count} perm {i}')
+                )
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(ROLE_URL)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(1), count_queries(25))
+
+    def test_roles_are_cursor_paginated(self):
+        """Test roles are returned in pages linked by cursors."""
+        for i in range(3):
+            create_role(name=f'role {i}')
+
+        res = self.client.get(ROLE_URL, {'page_size': 2})
+
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertIsNone(res.data['previous'])
+        res_next = self.client.get(res.data['next'])
+        self.assertEqual(
+            [role['name'] for role in res_next.data['results']],
+            ['role 2'],
+        )
+        self.assertIsNone(res_next.data['next'])
+
+    def test_list_roles_with_selected_fields(self):
+        """Test roles can be listed without nested permissions."""
+        role = create_role()
+        role.permissions.add(create_permission())
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ROLE_URL, {'fields': 'id,name'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [
+            {'id': role.id, 'name': role.name},
+        ])
+
+    def test_create_duplicate_role_name(self):
+        """Test creating a role with an existing name returns an error."""
+        create_role(name='admin')
+
+        res = self.client.post(ROLE_URL, {'name': 'admin'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_add_and_remove_single_permission(self):
+        """Test adding and removing one permission of a role."""
+        role = create_role()
+        kept = create_permission(name='kept')
+        role.permissions.add(kept)
+        permission = create_permission(name='added')
+        url = reverse('user:role-permission', args=[role.id, permission.id])
+
+        res = self.client.post(url)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            set(role.permissions.all()), {kept, permission},
+        )
+
+        res = self.client.delete(url)
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(list(role.permissions.all()), [kept])
+
+    def test_add_permission_cost_independent_of_role_size(self):
+        """Test adding a permission does not rewrite existing rows."""
+        def count_queries(role, existing):
+            role.permissions.add(*[
+                create_permission(name=f'{role.name} {i}')
+                for i in range(existing)
+            ])
+            permission = create_permission(name=f'{role.name} new')
+            url = reverse(
+                'user:role-permission', args=[role.id, permission.id],
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(url)
+            self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(
+            count_queries(create_role(name='small'), 1),
+            count_queries(create_role(name='large'), 30),
+        )
+
+    def test_add_unknown_permission(self):
+        """Test adding a missing permission returns 404."""
+        role = create_role()
+        url = reverse('user:role-permission', args=[role.id, 999])
+
+        res = self.client.post(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_patch_role_permissions(self):
+        """Test applying add and remove operations to a role."""
+        role = create_role()
+        read = create_permission(name='read')
+        write = create_permission(name='write')
+        role.permissions.add(read)
+        url = reverse('user:role-permissions', args=[role.id])
+        payload = [
+            {'op': 'add', 'value': {'name': 'write'}},
+            {'op': 'remove', 'value': {'name': 'read'}},
+        ]
+
+        res = self.client.patch(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [p['name'] for p in res.data['permissions']], ['write'],
+        )
+        self.assertEqual(list(role.permissions.all()), [write])
+
+    def test_patch_role_permissions_invalid(self):
+        """Test invalid operations are rejected without changes."""
+        role = create_role()
+        role.permissions.add(create_permission(name='read'))
+        url = reverse('user:role-permissions', args=[role.id])
+
+        for payload in (
+            [{'op': 'replace', 'value': {'name': 'read'}}],
+            [{'op': 'remove', 'value': {'name': 'read'}},
+             {'op': 'add', 'value': {'name': 'missing'}}],
+            [],
+        ):
+            res = self.client.patch(url, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(role.permissions.count(), 1)
+
+    def test_delete_role_not_allowed(self):
+        """Test roles cannot be deleted or partially updated."""
+        role = create_role()
+        url = reverse('user:role-detail', args=[role.id])
+
+        self.assertEqual(self.client.delete(url).status_code,
+                         status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(self.client.patch(url, {}).status_code,
+                         status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertTrue(Role.objects.filter(pk=role.pk).exists())
+
+    def test_create_role_with_parents(self):
+        """Test a role can be created inheriting from other roles."""
+        parent = create_role(name='parent')
+        payload = {'name': 'child', 'parents': [{'name': 'parent'}]}
+
+        res = self.client.post(ROLE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['parents'],
+                         [{'id': parent.id, 'name': 'parent'}])
+        role = Role.objects.get(name='child')
+        self.assertEqual(list(role.parents.all()), [parent])
+
+    def test_update_role_parents_rejects_cycle(self):
+        """Test making a role inherit from its descendant returns an error."""
+        parent = create_role(name='parent')
+        child = create_role(name='child')
+        child.parents.add(parent)
+        url = reverse('user:role-permissions', args=[parent.id])
+        payload = {'name': 'parent', 'parents': [{'name': 'child'}]}
+
+        res = self.client.put(url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('parents', res.data)
+        self.assertFalse(parent.parents.exists())
+
+
+class RoleApiQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test role and permission endpoints keep a fixed query budget."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(create_user(
+            username='user', email='user@example.com', password='test123',
+        ))
+
+    def test_list_roles(self):
+        """Test listing roles."""
+        self.assertQueryBudget(
+            3, lambda pop: self.client.get(ROLE_URL), status.HTTP_200_OK,
+        )
+
+    def test_retrieve_role(self):
+        """Test retrieving a role."""
+        self.assertQueryBudget(3, lambda pop: self.client.get(
+            reverse('user:role-detail', args=[pop.role.id]),
+        ), status.HTTP_200_OK)
+
+    def test_get_role_permissions(self):
+        """Test reading a role's permissions."""
+        self.assertQueryBudget(3, lambda pop: self.client.get(
+            reverse('user:role-permissions', args=[pop.role.id]),
+        ), status.HTTP_200_OK)
+
+    def test_create_role_with_permissions(self):
+        """Test creating a role with every permission."""
+        self.assertQueryBudget(15, lambda pop: self.client.post(ROLE_URL, {
+            'name': f'new role {pop.size}',
+            'permissions': [{'name': p.name} for p in pop.permissions],
+        }, format='json'), status.HTTP_201_CREATED)
+
+    def test_replace_role_permissions(self):
+        """Test replacing a role's permissions."""
+        self.assertQueryBudget(26, lambda pop: self.client.put(
+            reverse('user:role-permissions', args=[pop.role.id]),
+            {
+                'name': pop.role.name,
+                'permissions': [
+                    {'name': p.name} for p in pop.permissions[1:]
+                ],
+            },
+            format='json',
+        ), status.HTTP_200_OK)
+
+    def test_patch_role_permissions(self):
+        """Test removing permissions with operations."""
+        self.assertQueryBudget(20, lambda pop: self.client.patch(
+            reverse('user:role-permissions', args=[pop.role.id]),
+            [
+                {'op': 'remove', 'value': {'name': p.name}}
+                for p in pop.permissions[:2]
+            ],
+            format='json',
+        ), status.HTTP_200_OK)
+
+    def test_remove_single_permission(self):
+        """Test removing one permission."""
+        self.assertQueryBudget(15, lambda pop: self.client.delete(
+            reverse('user:role-permission',
+                    args=[pop.role.id, pop.permissions[0].id]),
+        ), status.HTTP_204_NO_CONTENT)
+
+    def test_list_permissions(self):
+        """Test listing permissions."""
+        self.assertQueryBudget(
+            1, lambda pop: self.client.get(PERMISSION_URL),
+            status.HTTP_200_OK,
+        )
+
+    def test_create_permission(self):
+        """Test creating a permission."""
+        self.assertQueryBudget(5, lambda pop: self.client.post(
+            PERMISSION_URL, {'name': f'new permission {pop.size}'},
+        ), status.HTTP_201_CREATED)
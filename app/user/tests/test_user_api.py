@@ -2,19 +2,30 @@
 Tests for the user API.
 """
 import json
-from django.test import TestCase
+import random
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from core.models import Role, UserRole
+from core.bitsets import PermissionSet
+from core.cache import permission_cache
+from core.models import Permission, Role, UserRole
+from core.testing import QueryBudgetMixin
 
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 USER_URL = reverse('user:user-list')
+BULK_CREATE_URL = reverse('user:bulk-create')
+BULK_ASSIGN_URL = reverse('user:bulk-assign-roles')
 
 
 def create_user(**params):
@@ -107,6 +118,28 @@ class PublicUserApiTests(TestCase):
         self.assertNotIn('token', res.data)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_create_token_with_email(self):
+        """Test generates token when logging in with an email."""
+        payload = {
+            'username': 'test@example.com',
+            'password': 'test123',
+        }
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertIn('token', res.data)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_create_token_unknown_user(self):
+        """Test returns error if no user matches the login."""
+        payload = {
+            'username': 'missing',
+            'password': 'test123',
+        }
+        res = self.client.post(TOKEN_URL, payload)
+
+        self.assertNotIn('token', res.data)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_create_token_blank_password(self):
         """Test posting a blank password returns an error."""
         payload = {
@@ -137,7 +170,7 @@ class PrivateUserApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
-        self.assertEqual(dict(res.data[0]), {
+        self.assertEqual(dict(res.data['results'][0]), {
             'username': self.user.username,
             'email': self.user.email,
         })
@@ -162,3 +195,555 @@ class PrivateUserApiTests(TestCase):
         )
         res = json.loads(json.dumps(res_get.data))[0]
         self.assertEqual(res['name'], payload['roles'][0]['name'])
+
+    def test_get_effective_permissions(self):
+        """Test listing permissions merged across a user's roles."""
+        read = Permission.objects.create(name='read')
+        write = Permission.objects.create(name='write')
+        reader = create_roles(name='reader')
+        writer = create_roles(name='writer')
+        reader.permissions.add(read)
+        writer.permissions.add(read, write)
+        create_userroles(user=self.user).roles.add(reader, writer)
+
+        res = self.client.get(
+            reverse('user:user-permissions', args=[self.user.id])
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [
+            {'id': read.id, 'name': 'read', 'bit': read.bit},
+            {'id': write.id, 'name': 'write', 'bit': write.bit},
+        ])
+
+    def test_get_permissions_without_user_roles(self):
+        """Test listing permissions of a user without roles returns 404."""
+        res = self.client.get(
+            reverse('user:user-permissions', args=[self.user.id])
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_replace_roles_updates_permission_checks(self):
+        """Test replacing roles grants and revokes permission bits."""
+        read = Permission.objects.create(name='read')
+        reader = create_roles(name='reader')
+        reader.permissions.add(read)
+        create_userroles(user=self.user)
+        roles_url = reverse('user:user-roles', args=[self.user.id])
+        bits_url = reverse('user:user-permissions', args=[self.user.id])
+
+        res = self.client.put(roles_url, {'roles': [{'name': 'reader'}]},
+                              format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        permission_cache.clear()
+        self.assertTrue(self.user.has_role_permission('read'))
+        res = self.client.get(bits_url, {'as': 'bits'})
+        self.assertEqual(PermissionSet.decode(res.data['permission_bits']),
+                         PermissionSet.from_positions([read.bit]))
+
+        res = self.client.put(roles_url, {'roles': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        permission_cache.clear()
+        self.assertFalse(self.user.has_role_permission('read'))
+        res = self.client.get(bits_url, {'as': 'bits'})
+        self.assertEqual(res.data['permission_bits'], '')
+
+    def test_replace_roles_only_touches_changed_rows(self):
+        """Test replacing roles keeps unchanged assignments."""
+        user_role = create_userroles(user=self.user)
+        keep = create_roles(name='keep')
+        drop = create_roles(name='drop')
+        create_roles(name='new')
+        user_role.roles.add(keep, drop)
+        kept_row = UserRole.roles.through.objects.get(role=keep)
+        payload = {'roles': [{'name': 'keep'}, {'name': 'new'}]}
+
+        res = self.client.put(
+            reverse('user:user-roles', args=[self.user.id]),
+            payload,
+            format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(user_role.roles.values_list('name', flat=True)),
+            {'keep', 'new'},
+        )
+        self.assertTrue(
+            UserRole.roles.through.objects.filter(pk=kept_row.pk).exists()
+        )
+
+    def test_get_roles_query_count_is_constant(self):
+        """Test listing a user's roles costs the same at any role count."""
+        user_role = create_userroles(user=self.user)
+        url = reverse('user:user-roles', args=[self.user.id])
+
+        def count_queries(role_count):
+            user_role.roles.set([
+                create_roles(name=f'{role_count} role {i}')
+                for i in range(role_count)
+            ])
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(url)
+            self.assertEqual(len(res.data), role_count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(1), count_queries(25))
+
+
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicaReadTests(TestCase):
+    """Test routing role reads to replicas."""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(
+            username='test',
+            email='test@example.com',
+            password='test123',
+        )
+        self.client.force_authenticate(self.user)
+        self.role = create_roles(name='Admin')
+        self.user_role = create_userroles(user=self.user)
+        self.url = reverse('user:user-roles', args=[self.user.pk])
+
+    @patch('core.routers.random.choice', wraps=random.choice)
+    def test_get_roles_reads_replica(self, patched_choice):
+        """Test listing roles reads from a replica."""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(patched_choice.called)
+
+    @patch('core.routers.random.choice', wraps=random.choice)
+    def test_reads_after_update_use_primary(self, patched_choice):
+        """Test a user reads their own role update from the primary."""
+        res = self.client.put(
+            self.url, {'roles': [{'name': 'Admin'}]}, format='json',
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(self.url)
+
+        self.assertEqual([role['name'] for role in res.data], ['Admin'])
+        patched_choice.assert_not_called()
+
+    @patch('core.routers.random.choice', wraps=random.choice)
+    def test_other_clients_read_update_from_primary(self, patched_choice):
+        """Test an admin's update to a user's roles pins that user's reads
+        for every client, not only the admin."""
+        admin = create_user(
+            username='admin',
+            email='admin@example.com',
+            password='test123',
+        )
+        admin_client = APIClient()
+        admin_client.force_authenticate(admin)
+        res = admin_client.put(
+            self.url, {'roles': [{'name': 'Admin'}]}, format='json',
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.get(self.url)
+
+        self.assertEqual([role['name'] for role in res.data], ['Admin'])
+        patched_choice.assert_not_called()
+
+        other = create_user(
+            username='other',
+            email='other@example.com',
+            password='test123',
+        )
+        create_userroles(user=other)
+        self.client.get(reverse('user:user-roles', args=[other.pk]))
+        patched_choice.assert_called()
+
+    @patch('core.routers.random.choice', wraps=random.choice)
+    def test_user_detail_reads_primary(self, patched_choice):
+        """Test actions outside replica_actions read the primary."""
+        res = self.client.get(reverse('user:user-detail',
+                                      args=[self.user.pk]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        patched_choice.assert_not_called()
+
+
+class BulkCreateUserApiTests(TestCase):
+    """Test the bulk provisioning endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = create_user(
+            username='admin',
+            email='admin@example.com',
+            password='test123',
+            is_staff=True,
+        )
+        self.client.force_authenticate(self.admin)
+        create_roles(name='Admin')
+
+    def test_bulk_create_users(self):
+        """Test creating users with roles in one request."""
+        payload = {'users': [
+            {
+                'username': 'ann',
+                'email': 'ann@example.com',
+                'password': 'secret123',
+                'roles': ['Admin'],
+            },
+            {'username': 'admin', 'email': 'dup@example.com'},
+        ]}
+
+        res = self.client.post(BULK_CREATE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], 1)
+        self.assertEqual(res.data['errors'][0]['record'], 2)
+        ann = get_user_model().objects.get(username='ann')
+        self.assertEqual(
+            list(ann.userrole.roles.values_list('name', flat=True)),
+            ['Admin'],
+        )
+
+    def test_bulk_create_validates_records(self):
+        """Test malformed records reject the whole request."""
+        payload = {'users': [{'username': 'ann', 'email': 'not-an-email'}]}
+
+        res = self.client.post(BULK_CREATE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(
+            get_user_model().objects.filter(username='ann').exists()
+        )
+
+    def test_bulk_create_requires_staff(self):
+        """Test non-staff users cannot provision users."""
+        user = create_user(
+            username='user', email='user@example.com', password='test123',
+        )
+        self.client.force_authenticate(user)
+
+        res = self.client.post(BULK_CREATE_URL, {'users': []}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BulkRoleAssignmentApiTests(TestCase):
+    """Test the bulk role assignment endpoint."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = create_user(
+            username='admin',
+            email='admin@example.com',
+            password='test123',
+            is_staff=True,
+        )
+        self.client.force_authenticate(self.admin)
+        self.admin_role = create_roles(name='Admin')
+        self.editor_role = create_roles(name='Editor')
+        self.users = [
+            create_user(
+                username=f'user{i}',
+                email=f'user{i}@corp.example.com',
+                password='test123',
+            )
+            for i in range(3)
+        ]
+        for user in self.users:
+            create_userroles(user=user).roles.add(self.editor_role)
+
+    def test_assign_by_ids(self):
+        """Test granting a role to listed users."""
+        payload = {
+            'users': [user.pk for user in self.users[:2]],
+            'grant': [{'name': 'Admin'}],
+        }
+
+        res = self.client.post(BULK_ASSIGN_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'users': 2, 'granted': 2, 'revoked': 0})
+        self.assertFalse(
+            self.users[2].userrole.roles.filter(name='Admin').exists()
+        )
+
+    def test_assign_by_filter(self):
+        """Test revoking a role from users matching a filter."""
+        payload = {
+            'filter': {'email_domain': 'corp.example.com'},
+            'revoke': [{'name': 'Editor'}],
+        }
+
+        res = self.client.post(BULK_ASSIGN_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['revoked'], 3)
+        self.assertFalse(
+            UserRole.roles.through.objects.filter(
+                role=self.editor_role,
+            ).exists()
+        )
+
+    def test_invalid_requests(self):
+        """Test inconsistent requests are rejected."""
+        user_ids = [self.users[0].pk]
+        payloads = [
+            {'grant': [{'name': 'Admin'}]},
+            {'users': user_ids, 'filter': {'is_active': True},
+             'grant': [{'name': 'Admin'}]},
+            {'users': user_ids},
+            {'users': user_ids, 'grant': [{'name': 'Missing'}]},
+            {'users': user_ids, 'grant': [{'name': 'Admin'}],
+             'revoke': [{'name': 'Admin'}]},
+            {'filter': {}, 'grant': [{'name': 'Admin'}]},
+        ]
+        for payload in payloads:
+            res = self.client.post(BULK_ASSIGN_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PatchUserRolesApiTests(TestCase):
+    """Test incremental changes to a user's roles."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            username='test',
+            email='test@example.com',
+            password='test123',
+        )
+        self.client.force_authenticate(self.user)
+        self.admin = create_roles(name='Admin')
+        self.editor = create_roles(name='Editor')
+        self.user_role = create_userroles(user=self.user)
+        self.user_role.roles.add(self.editor)
+        self.url = reverse('user:user-roles', args=[self.user.pk])
+
+    def test_patch_roles(self):
+        """Test adding and removing roles with operations."""
+        payload = [
+            {'op': 'add', 'value': {'name': 'Admin'}},
+            {'op': 'remove', 'value': {'name': 'Editor'}},
+        ]
+
+        res = self.client.patch(self.url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [{'id': self.admin.id, 'name': 'Admin'}])
+        self.assertEqual(list(self.user_role.roles.all()), [self.admin])
+
+    def test_patch_roles_later_operations_win(self):
+        """Test operations on the same role apply in order."""
+        payload = [
+            {'op': 'remove', 'value': {'name': 'Editor'}},
+            {'op': 'add', 'value': {'name': 'Editor'}},
+        ]
+
+        res = self.client.patch(self.url, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(self.user_role.roles.all()), [self.editor])
+
+    def test_patch_user_not_allowed(self):
+        """Test users cannot be partially updated."""
+        url = reverse('user:user-detail', args=[self.user.pk])
+
+        res = self.client.patch(url, {'username': 'other'})
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class ConditionalReadTests(TestCase):
+    """Test ETags on role and permission reads."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(
+            username='test',
+            email='test@example.com',
+            password='test123',
+        )
+        self.client.force_authenticate(self.user)
+        self.role = create_roles(name='Admin')
+        self.role.permissions.add(Permission.objects.create(name='read'))
+        self.user_role = create_userroles(user=self.user)
+        self.user_role.roles.add(self.role)
+
+    def test_not_modified_without_membership_queries(self):
+        """Test a matching If-None-Match gets a 304 from one query."""
+        for name in ('user:user-roles', 'user:user-permissions'):
+            url = reverse(name, args=[self.user.pk])
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertIn('ETag', res)
+            self.assertIn('Last-Modified', res)
+
+            with self.assertNumQueries(1):
+                res_cached = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=res['ETag'],
+                )
+
+            self.assertEqual(res_cached.status_code,
+                             status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(res_cached['ETag'], res['ETag'])
+
+    def test_etag_changes_with_roles(self):
+        """Test changing roles or role permissions changes the ETags."""
+        roles_url = reverse('user:user-roles', args=[self.user.pk])
+        permissions_url = reverse('user:user-permissions',
+                                  args=[self.user.pk])
+        role_url = reverse('user:role-permissions', args=[self.role.pk])
+        etags = [
+            self.client.get(url)['ETag']
+            for url in (roles_url, permissions_url, role_url)
+        ]
+
+        self.role.permissions.add(Permission.objects.create(name='write'))
+
+        for url, etag in zip((roles_url, permissions_url, role_url), etags):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(res['ETag'], etag)
+
+    def test_role_permissions_not_modified(self):
+        """Test role permission reads honour If-None-Match."""
+        url = reverse('user:role-permissions', args=[self.role.pk])
+        res = self.client.get(url)
+        self.assertEqual(res.data['permissions'][0]['name'], 'read')
+
+        with self.assertNumQueries(1):
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_rename_through_api_changes_etags(self):
+        """Test renaming a role through the API invalidates its ETags."""
+        roles_url = reverse('user:user-roles', args=[self.user.pk])
+        role_url = reverse('user:role-permissions', args=[self.role.pk])
+
+        for url, name in (
+            (reverse('user:role-detail', args=[self.role.pk]), 'Manager'),
+            (role_url, 'Owner'),
+        ):
+            etags = [self.client.get(roles_url)['ETag'],
+                     self.client.get(role_url)['ETag']]
+
+            res = self.client.put(url, {'name': name}, format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+            for read_url, etag in zip((roles_url, role_url), etags):
+                res = self.client.get(read_url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(res.status_code, status.HTTP_200_OK)
+                self.assertIn(name, str(res.data))
+
+    def test_permissions_as_bits(self):
+        """Test a user's permissions can be read as encoded bits."""
+        write = Permission.objects.create(name='write')
+        self.role.permissions.add(write)
+        url = reverse('user:user-permissions', args=[self.user.pk])
+
+        res = self.client.get(url, {'as': 'bits'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            PermissionSet.decode(res.data['permission_bits']),
+            PermissionSet.from_positions(
+                self.role.permissions.values_list('bit', flat=True)
+            ),
+        )
+        self.assertNotEqual(res['ETag'], self.client.get(url)['ETag'])
+
+
+class UserApiQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Test user endpoints keep a fixed query budget."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(create_user(
+            username='admin',
+            email='admin@example.com',
+            password='test123',
+            is_staff=True,
+        ))
+
+    def test_list_users(self):
+        """Test listing users."""
+        self.assertQueryBudget(
+            1, lambda pop: self.client.get(USER_URL), status.HTTP_200_OK,
+        )
+
+    def test_retrieve_user(self):
+        """Test retrieving a user."""
+        self.assertQueryBudget(1, lambda pop: self.client.get(
+            reverse('user:user-detail', args=[pop.user.pk]),
+        ), status.HTTP_200_OK)
+
+    def test_update_user(self):
+        """Test updating a user."""
+        self.assertQueryBudget(7, lambda pop: self.client.put(
+            reverse('user:user-detail', args=[pop.user.pk]),
+            {
+                'username': f'renamed {pop.size}',
+                'email': pop.user.email,
+                'password': 'newpass123',
+            },
+        ), status.HTTP_200_OK)
+
+    def test_get_user_roles(self):
+        """Test reading a user's roles."""
+        self.assertQueryBudget(2, lambda pop: self.client.get(
+            reverse('user:user-roles', args=[pop.user.pk]),
+        ), status.HTTP_200_OK)
+
+    def test_replace_user_roles(self):
+        """Test replacing a user's roles."""
+        self.assertQueryBudget(14, lambda pop: self.client.put(
+            reverse('user:user-roles', args=[pop.user.pk]),
+            {'roles': [{'name': role.name} for role in pop.roles[1:]]},
+            format='json',
+        ), status.HTTP_200_OK)
+
+    def test_patch_user_roles(self):
+        """Test removing roles with operations."""
+        self.assertQueryBudget(12, lambda pop: self.client.patch(
+            reverse('user:user-roles', args=[pop.user.pk]),
+            [{'op': 'remove', 'value': {'name': pop.role.name}}],
+            format='json',
+        ), status.HTTP_200_OK)
+
+    def test_get_user_permissions(self):
+        """Test reading a user's effective permissions."""
+        self.assertQueryBudget(2, lambda pop: self.client.get(
+            reverse('user:user-permissions', args=[pop.user.pk]),
+        ), status.HTTP_200_OK)
+
+    def test_bulk_create_users(self):
+        """Test provisioning users with every role."""
+        self.assertQueryBudget(14, lambda pop: self.client.post(
+            BULK_CREATE_URL,
+            {'users': [
+                {
+                    'username': f'new {pop.size} {i}',
+                    'email': f'new{pop.size}.{i}@example.com',
+                    'roles': [role.name for role in pop.roles],
+                }
+                for i in range(pop.size)
+            ]},
+            format='json',
+        ), status.HTTP_200_OK)
+
+    def test_bulk_assign_roles(self):
+        """Test revoking a role from every user."""
+        self.assertQueryBudget(13, lambda pop: self.client.post(
+            BULK_ASSIGN_URL,
+            {
+                'users': [user.pk for user in pop.users],
+                'revoke': [{'name': pop.role.name}],
+            },
+            format='json',
+        ), status.HTTP_200_OK)
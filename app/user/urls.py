@@ -5,7 +5,7 @@ from django.urls import path, include
 
 from rest_framework.routers import DefaultRouter
 
-from user import views
+from user import async_urls, views
 
 
 router_users = DefaultRouter()
@@ -22,9 +22,26 @@ app_name = 'user'
 
 
 urlpatterns = [
+    path(
+        'users/bulk/',
+        views.BulkCreateUserView.as_view(),
+        name='bulk-create',
+    ),
+    path(
+        'users/roles/',
+        views.BulkRoleAssignmentView.as_view(),
+        name='bulk-assign-roles',
+    ),
     path('', include(router_users.urls)),
     path('', include(router_role.urls)),
     path('', include(router_permissions.urls)),
     path('signup/', views.CreateUserView.as_view(), name='create'),
     path('login/', views.CreateTokenView.as_view(), name='token'),
+    path(
+        'login/refresh/',
+        views.RefreshTokenView.as_view(),
+        name='token-refresh',
+    ),
+    path('authorize/', views.AuthorizationView.as_view(), name='authorize'),
+    *async_urls.urlpatterns,
 ]
@@ -1,32 +1,146 @@
 """
 Views for the user API.
 """
+import json
+
 from rest_framework.decorators import action
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from rest_framework import (
     viewsets,
 )
 from rest_framework import (
     generics,
-    authentication,
     permissions,
     status
 )
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.exceptions import MethodNotAllowed, NotFound
+from rest_framework.views import APIView
 from rest_framework.settings import api_settings
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 
+from user.authentication import (
+    CachedTokenAuthentication,
+    SignedTokenAuthentication,
+)
+from user.permissions import HasRolePermission
 from user.serializers import (
     UserSerializer,
     AuthTokenSerializer,
     RoleSerializer,
+    RoleSummarySerializer,
     UserRoleSerializer,
-    PermissionsSerializer
+    PermissionsSerializer,
+    BatchAuthorizationSerializer,
+    RefreshTokenSerializer,
+    BulkProvisionSerializer,
+    BulkRoleAssignmentSerializer,
+    MembershipOperationSerializer,
+    patch_members,
 )
 
+from core.assignments import assign_roles
+from core.authorization import check_permissions, effective_permissions
 from core.models import User, Role, UserRole, Permission
+from core.provisioning import provision_users
+from core.routers import (
+    is_pinned_to_primary,
+    pin_to_primary,
+    read_from_replicas,
+)
+from core.tokens import issue_access_token, issue_refresh_token
+
+
+class FieldSelectionMixin:
+    """Let list and retrieve requests pick fields with ``?fields=a,b``."""
+
+    def get_requested_fields(self):
+        """Return the fields requested for this action, if any."""
+        fields = self.request.query_params.get('fields')
+        if not fields or self.action not in ('list', 'retrieve'):
+            return None
+        return [field.strip() for field in fields.split(',')]
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.get_requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
+
+
+class ReplicaReadMixin:
+    """Serve safe requests from read replicas.
+
+    Set ``replica_actions`` to limit this to some actions. A successful
+    write pins the resources named by ``written_resources`` to the primary
+    for ``REPLICA_PIN_SECONDS``, and reads of any resource named by
+    ``read_resources`` that is pinned skip the replicas, so every client
+    reads the write, not only its author.
+    """
+    replica_actions = None
+    replica_resource = 'roles'
+
+    def written_resources(self):
+        """Return the resources a write through this view changes."""
+        return [self.replica_resource]
+
+    def read_resources(self):
+        """Return the resources a read through this view depends on."""
+        return [self.replica_resource]
+
+    def uses_replicas(self, request):
+        """Return whether this request may read from a replica."""
+        if request.method not in permissions.SAFE_METHODS:
+            return False
+        if (
+            self.replica_actions is not None
+            and self.action not in self.replica_actions
+        ):
+            return False
+        return not is_pinned_to_primary(self.read_resources())
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.uses_replicas(request):
+            self._replica_reads = read_from_replicas()
+            self._replica_reads.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica_reads = self.__dict__.pop('_replica_reads', None)
+        if replica_reads is not None:
+            replica_reads.__exit__(None, None, None)
+        if (
+            request.method not in permissions.SAFE_METHODS
+            and response.status_code < 400
+        ):
+            pin_to_primary(self.written_resources())
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def conditional_response(request, tag, modified_at, render):
+    """Answer a GET with 304 if the client's copy is current.
+
+    ``render`` builds the full response and is only called when needed.
+    Either way the response carries the resource's ETag and Last-Modified.
+    """
+    etag = quote_etag(tag)
+    last_modified = int(modified_at.timestamp())
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified,
+    )
+    if response is None:
+        response = render()
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 class CreateUserView(generics.CreateAPIView):
@@ -39,18 +153,84 @@ class CreateTokenView(ObtainAuthToken):
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        """Issue a database token, or signed tokens in signed mode."""
+        if settings.AUTH_TOKEN_MODE != 'signed':
+            return super().post(request, *args, **kwargs)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        return Response({
+            'token': issue_access_token(user),
+            'refresh': issue_refresh_token(user),
+        })
+
+
+class RefreshTokenView(generics.GenericAPIView):
+    """Exchange a refresh token for a new signed access token."""
+    serializer_class = RefreshTokenSerializer
+
+    def post(self, request):
+        """Issue a new access token."""
+        if settings.AUTH_TOKEN_MODE != 'signed':
+            raise NotFound()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = serializer.validated_data['user']
+        return Response({'token': issue_access_token(user)})
+
 
-class ManageUserView(viewsets.ModelViewSet):
+class ManageUserView(ReplicaReadMixin, FieldSelectionMixin,
+                     viewsets.ModelViewSet):
     """Manage the authenticated user."""
+    replica_actions = ('roles', 'permissions')
+    replica_resource = 'users'
     serializer_class = UserSerializer
-    queryset = User.objects.all()
-    authentication_classes = [authentication.TokenAuthentication]
-    permission_classes = [permissions.IsAuthenticated]
-    http_method_names = ['put', 'get']
+    queryset = User.objects.order_by('id')
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
+    permission_classes = [permissions.IsAuthenticated, HasRolePermission]
+    http_method_names = ['put', 'get', 'patch']
 
-    @action(detail=True, methods=['get', 'put'])
+    def written_resources(self):
+        """Pin the user written to, so any client reads their roles from
+        the primary while replicas catch up."""
+        if 'pk' in self.kwargs:
+            return [f'user:{self.kwargs["pk"]}']
+        return super().written_resources()
+
+    def read_resources(self):
+        """A user's roles and permissions also follow role changes and bulk
+        writes to users."""
+        return ['roles', *super().read_resources(), *self.written_resources()]
+
+    def partial_update(self, request, *args, **kwargs):
+        raise MethodNotAllowed(request.method)
+
+    def get_queryset(self):
+        """Load only the serialized columns for reads."""
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.only('id', 'username', 'email')
+        return queryset
+
+    @action(detail=True, methods=['get', 'put', 'patch'])
     def roles(self, request, pk=None):
         """Adding and getting roles to user."""
+        if request.method == 'PATCH':
+            user_role = get_object_or_404(UserRole.objects.all(), user=pk)
+            serializer = MembershipOperationSerializer(
+                data=request.data, many=True, allow_empty=False,
+            )
+            serializer.is_valid(raise_exception=True)
+            patch_members(user_role.roles, Role, serializer.validated_data)
+            roles = RoleSummarySerializer(
+                user_role.roles.only('id', 'name').order_by('id'),
+                many=True,
+            )
+            return Response(roles.data, status=status.HTTP_200_OK)
         if request.method == 'PUT':
             queryset = UserRole.objects.all()
             user_role = get_object_or_404(queryset, user=pk)
@@ -58,40 +238,112 @@ class ManageUserView(viewsets.ModelViewSet):
                                             data=request.data)
             if serializer.is_valid(raise_exception=True):
                 serializer.save()
-                roles = serializer.data['roles']
-                for role in roles:
-                    role.pop("permissions", None)
-                return Response(roles, status=status.HTTP_200_OK)
+                roles = RoleSummarySerializer(
+                    user_role.roles.only('id', 'name').order_by('id'),
+                    many=True,
+                )
+                return Response(roles.data, status=status.HTTP_200_OK)
             return Response(serializer.errors,
                             status=status.HTTP_400_BAD_REQUEST)
         if request.method == 'GET':
-            queryset = UserRole.objects.all()
-            user_role = get_object_or_404(queryset, user=pk)
-            serializer = UserRoleSerializer(instance=user_role, many=False)
-            roles = serializer.data['roles']
-            for role in roles:
-                role.pop("permissions", None)
-            return Response(roles, status=status.HTTP_200_OK)
+            user_role = get_object_or_404(
+                UserRole.objects.only('id', 'version', 'modified_at'),
+                user=pk,
+            )
+
+            def render():
+                serializer = RoleSummarySerializer(
+                    user_role.roles.only('id', 'name').order_by('id'),
+                    many=True,
+                )
+                return Response(serializer.data, status=status.HTTP_200_OK)
+
+            return conditional_response(
+                request,
+                f'user-{pk}-roles-{user_role.version}',
+                user_role.modified_at,
+                render,
+            )
 
     @action(detail=True, methods=['get'])
     def permissions(self, request, pk=None):
-        """Listing all the permissions of user."""
-        queryset = UserRole.objects.all()
-        user_role = get_object_or_404(queryset, user=pk)
-        serializers = UserRoleSerializer(instance=user_role, many=False)
-        roles = serializers.data['roles']
-        for role in roles:
-            role.pop("name", None)
-        return Response(roles, status=status.HTTP_200_OK)
+        """Listing all the permissions of user.
+
+        With ``?as=bits`` the permissions are returned as encoded permission
+        bits instead, read from the user's row without a join.
+        """
+        as_bits = request.query_params.get('as') == 'bits'
+        fields = ['id', 'version', 'modified_at']
+        if as_bits:
+            fields.append('permission_bits')
+        user_role = get_object_or_404(
+            UserRole.objects.only(*fields),
+            user=pk,
+        )
+
+        def render():
+            if as_bits:
+                return Response(
+                    {'permission_bits': user_role.permission_set.encode()},
+                    status=status.HTTP_200_OK,
+                )
+            serializer = PermissionsSerializer(
+                effective_permissions(pk), many=True,
+            )
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        return conditional_response(
+            request,
+            f'user-{pk}-permissions-{"bits-" if as_bits else ""}'
+            f'{user_role.version}',
+            user_role.modified_at,
+            render,
+        )
 
 
-class RoleViewSet(viewsets.ModelViewSet):
+class RoleViewSet(ReplicaReadMixin, FieldSelectionMixin,
+                  viewsets.ModelViewSet):
     """View for manage roles APIs."""
     serializer_class = RoleSerializer
-    queryset = Role.objects.all()
-    authentication_classes = [TokenAuthentication]
-    permission_classes = [IsAuthenticated]
-    http_method_names = ['put', 'get', 'post']
+    permissions_prefetch = Prefetch(
+        'permissions',
+        queryset=Permission.objects.only('id', 'name', 'bit')
+        .order_by('id'),
+    )
+    parents_prefetch = Prefetch(
+        'parents',
+        queryset=Role.objects.only('id', 'name').order_by('id'),
+    )
+    queryset = Role.objects.only('id', 'name').prefetch_related(
+        permissions_prefetch,
+        parents_prefetch,
+    ).order_by('id')
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
+    permission_classes = [IsAuthenticated, HasRolePermission]
+    http_method_names = ['put', 'get', 'post', 'patch', 'delete']
+
+    def partial_update(self, request, *args, **kwargs):
+        raise MethodNotAllowed(request.method)
+
+    def destroy(self, request, *args, **kwargs):
+        raise MethodNotAllowed(request.method)
+
+    def get_queryset(self):
+        """Skip loading permissions and parents when not requested."""
+        fields = self.get_requested_fields()
+        if fields is None:
+            return super().get_queryset()
+        prefetches = [
+            prefetch
+            for prefetch in (self.permissions_prefetch, self.parents_prefetch)
+            if prefetch.prefetch_to in fields
+        ]
+        return Role.objects.only('id', 'name').prefetch_related(
+            *prefetches,
+        ).order_by('id')
 
     def get_serializer_class(self):
         """Return the serializer class for request."""
@@ -100,12 +352,22 @@ class RoleViewSet(viewsets.ModelViewSet):
 
         return self.serializer_class
 
-    @action(detail=True, methods=['get', 'put'])
+    @action(detail=True, methods=['get', 'put', 'patch'])
     def permissions(self, request, pk=None):
         """Adding and getting permissions to role."""
+        if request.method == 'PATCH':
+            role = get_object_or_404(self.get_queryset(), pk=pk)
+            serializer = MembershipOperationSerializer(
+                data=request.data, many=True, allow_empty=False,
+            )
+            serializer.is_valid(raise_exception=True)
+            patch_members(
+                role.permissions, Permission, serializer.validated_data,
+            )
+            return Response(RoleSerializer(instance=role).data,
+                            status=status.HTTP_200_OK)
         if request.method == 'PUT':
-            queryset = Role.objects.all()
-            role = get_object_or_404(queryset, pk=pk)
+            role = get_object_or_404(self.get_queryset(), pk=pk)
             serializer = RoleSerializer(instance=role,
                                         data=request.data)
             if serializer.is_valid(raise_exception=True):
@@ -115,21 +377,160 @@ class RoleViewSet(viewsets.ModelViewSet):
             return Response(serializer.errors,
                             status=status.HTTP_400_BAD_REQUEST)
         if request.method == 'GET':
-            queryset = Role.objects.all()
-            role = get_object_or_404(queryset, pk=pk)
-            serializer = RoleSerializer(instance=role, many=False)
-            return Response(serializer.data,
-                            status=status.HTTP_200_OK)
+            role = get_object_or_404(
+                Role.objects.only('id', 'name', 'version', 'modified_at'),
+                pk=pk,
+            )
+
+            def render():
+                prefetch_related_objects(
+                    [role], self.permissions_prefetch, self.parents_prefetch,
+                )
+                serializer = RoleSerializer(instance=role, many=False)
+                return Response(serializer.data,
+                                status=status.HTTP_200_OK)
+
+            return conditional_response(
+                request,
+                f'role-{pk}-permissions-{role.version}',
+                role.modified_at,
+                render,
+            )
 
+    @action(
+        detail=True,
+        methods=['post', 'delete'],
+        url_path=r'permissions/(?P<permission_pk>\d+)',
+        url_name='permission',
+    )
+    def permission(self, request, pk=None, permission_pk=None):
+        """Add or remove a single permission of a role."""
+        role = get_object_or_404(Role.objects.only('id'), pk=pk)
+        permission = get_object_or_404(
+            Permission.objects.only('id'), pk=permission_pk,
+        )
+        if request.method == 'POST':
+            role.permissions.add(permission)
+        else:
+            role.permissions.remove(permission)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-class PermissionViewSet(viewsets.ModelViewSet):
+
+class PermissionViewSet(ReplicaReadMixin, FieldSelectionMixin,
+                        viewsets.ModelViewSet):
     """View for manage permissions APIs."""
     serializer_class = PermissionsSerializer
-    queryset = Permission.objects.all()
-    authentication_classes = [TokenAuthentication]
-    permission_classes = [IsAuthenticated]
+    queryset = Permission.objects.order_by('id')
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
+    permission_classes = [IsAuthenticated, HasRolePermission]
     http_method_names = ['put', 'get', 'post']
 
     def perform_create(self, serializer):
         """Create a new permission."""
         serializer.save()
+
+
+class AuthorizationView(APIView):
+    """Check many (user, permission) pairs in one request."""
+    serializer_class = BatchAuthorizationSerializer
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
+    permission_classes = [IsAuthenticated, HasRolePermission]
+
+    def post(self, request):
+        """Answer every check with a constant number of queries."""
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        checks = [
+            (check['user'], check['permission'])
+            for check in serializer.validated_data['checks']
+        ]
+
+        chunk_size = settings.AUTHORIZATION_BATCH_STREAM_THRESHOLD
+        if len(checks) > chunk_size:
+            return StreamingHttpResponse(
+                self._stream(checks, chunk_size),
+                content_type='application/json',
+            )
+        return Response({'results': self._resolve(checks)},
+                        status=status.HTTP_200_OK)
+
+    def _resolve(self, checks):
+        """Return the result of each check."""
+        return [
+            {'user': user_id, 'permission': name, 'allowed': allowed}
+            for (user_id, name), allowed in
+            zip(checks, check_permissions(checks))
+        ]
+
+    def _stream(self, checks, chunk_size):
+        """Yield the results as a JSON document, resolving the checks
+        chunk_size at a time as the response is sent.
+
+        This runs after the view has returned, outside the request
+        metrics, and the 200 status is already sent. A database error
+        therefore ends the document with an ``error`` member holding
+        the number of results sent, which clients must check for.
+        """
+        yield '{"results": ['
+        for start in range(0, len(checks), chunk_size):
+            try:
+                results = self._resolve(checks[start:start + chunk_size])
+            except DatabaseError:
+                yield '], "error": ' + json.dumps({
+                    'detail': 'Checks could not be resolved.',
+                    'completed': start,
+                }) + '}'
+                return
+            yield (',' if start else '') + ','.join(
+                json.dumps(result) for result in results
+            )
+        yield ']}'
+
+
+class BulkCreateUserView(APIView):
+    """Create many users with their initial roles in one request."""
+    serializer_class = BulkProvisionSerializer
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
+    permission_classes = [IsAdminUser, HasRolePermission]
+
+    def post(self, request):
+        """Provision the users and report the ones skipped."""
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = provision_users(
+            serializer.validated_data['users'],
+            hash_timeout=settings.PASSWORD_HASHING_BATCH_TIMEOUT,
+        )
+        pin_to_primary(['users'])
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class BulkRoleAssignmentView(APIView):
+    """Grant and revoke roles for many users in one request."""
+    serializer_class = BulkRoleAssignmentSerializer
+    authentication_classes = [
+        CachedTokenAuthentication,
+        SignedTokenAuthentication,
+    ]
+    permission_classes = [IsAdminUser, HasRolePermission]
+
+    def post(self, request):
+        """Apply the assignment and return a summary."""
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        summary = assign_roles(
+            serializer.get_users(),
+            grant=serializer.validated_data['grant'],
+            revoke=serializer.validated_data['revoke'],
+        )
+        pin_to_primary(['users'])
+        return Response(summary, status=status.HTTP_200_OK)